@@ -0,0 +1,224 @@
+"""Motion-driven decode rate per camera.
+
+Cameras with recent motion are decoded at full rate. Once a camera has been
+quiet for ``hold_seconds`` it drops to ``idle_fps``:
+
+* when FFmpeg is available the OpenCV session is swapped for a
+  ``KeyframeReader``, so FFmpeg decodes only I-frames (about 1 fps on
+  typical DVR GOPs) and the idle decode cost mostly disappears;
+* otherwise the capture is drained with ``grab()`` and a frame is only
+  retrieved, scaled and composited ``idle_fps`` times a second.
+
+Motion is scored by ``motion.MotionDetector`` on the frames that are
+actually retrieved, so idle cameras are checked at the idle rate.
+
+Every session an ``AdaptiveCapture`` opens is covered by a lease from the
+per-DVR budget (see ``sessions``). Switching streams opens the new one
+before closing the old one when the DVR has a spare session, and otherwise
+closes the old one first and reopens under its lease.
+"""
+import threading
+import time
+from typing import Dict, List, Optional
+
+from keyframe_reader import KeyframeReader, keyframes_available
+from lazy_imports import lazy_module
+from motion import MotionDetector
+from sessions import LIVE, sessions
+
+cv2 = lazy_module('cv2')
+
+
+class AdaptiveRateScheduler:
+    """Decides per camera whether it is active (full rate) or idle.
+
+    Also a pipeline stage: pass it in ``grid_play(stages=...)`` so it sees
+    the retrieved frames and updates motion state.
+    """
+
+    def __init__(self, idle_fps: float = 1.0, min_score: float = 0.01, hold_seconds: float = 5.0,
+                 detector: Optional[MotionDetector] = None, use_keyframes: bool = True,
+                 cell_size: tuple = (640, 360)):
+        self.idle_fps = idle_fps
+        self.min_score = min_score
+        self.hold_seconds = hold_seconds
+        self.detector = detector or MotionDetector(rate_hz=0)
+        self.use_keyframes = use_keyframes and keyframes_available()
+        self.cell_size = cell_size
+        self._last_motion: Dict[str, float] = {}
+
+    def is_active(self, name: str, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        last = self._last_motion.get(name)
+        return last is not None and now - last < self.hold_seconds
+
+    def mark_active(self, name: str):
+        """Force a camera to full rate, e.g. on an external event."""
+        self._last_motion[name] = time.monotonic()
+
+    def process(self, names: List[str], frames: List[object]):
+        self.detector.process(names, frames)
+        now = time.monotonic()
+        for name, frame in zip(names, frames):
+            if frame is not None and self.detector.scores.get(name, 0.0) >= self.min_score:
+                self._last_motion[name] = now
+
+    def wrap(self, name: str, url: str, cap, lease, active_url: Optional[str] = None,
+             priority: int = LIVE) -> 'AdaptiveCapture':
+        # New cameras start active so the first frames populate their tiles
+        self._last_motion.setdefault(name, time.monotonic())
+        return AdaptiveCapture(name, url, cap, lease, self, active_url=active_url, priority=priority)
+
+
+class AdaptiveCapture:
+    """Capture wrapper whose ``read()`` follows the scheduler.
+
+    Returns ``(True, None)`` when the camera is idle and has no new frame
+    this round; callers keep showing the previous tile. ``active_url``, if
+    given, is opened while active instead of ``url`` (e.g. the main stream).
+    Switching to full rate opens the capture on a background thread and
+    keeps serving idle frames until it is ready.
+
+    ``lease`` is the session lease of ``cap`` (or, with ``cap`` None, the
+    one reserved for the first open). The capture takes ownership of it and
+    releases whichever lease it holds in ``release()``.
+    """
+
+    def __init__(self, name: str, url: str, cap, lease, scheduler: AdaptiveRateScheduler,
+                 active_url: Optional[str] = None, priority: int = LIVE):
+        self.name = name
+        self.url = url
+        self.active_url = active_url or url
+        self.cap = cap
+        self.lease = lease
+        self.scheduler = scheduler
+        self.priority = priority
+        self.keyframes: Optional[KeyframeReader] = None
+        self._cap_url = url if cap is not None else None
+        self._opening: Optional[threading.Thread] = None
+        self._opened = None
+        self._retry_at = 0.0
+        self._last_retrieve = 0.0
+
+    def isOpened(self) -> bool:
+        return self.cap is not None or self.keyframes is not None
+
+    def _open_async(self, url: str):
+        lease = None
+        if self.isOpened():
+            # Both streams are open during the switch, so it needs a spare session
+            lease = sessions.acquire(url, self.priority, timeout=0)
+            if lease is None:
+                # None spare: close the current stream and reopen under its lease
+                self._swap_cap(None, None)
+
+        def opener():
+            self._opened = (url, cv2.VideoCapture(url, cv2.CAP_FFMPEG), lease)
+
+        self._opened = None
+        self._opening = threading.Thread(target=opener, name=f"open-{self.name}")
+        self._opening.daemon = True
+        self._opening.start()
+
+    def _swap_cap(self, url: str, cap, lease=None):
+        """Replace the current stream; ``lease`` is the new one's if it was admitted separately."""
+        if self.cap is not None:
+            self.cap.release()
+        if self.keyframes is not None:
+            self.keyframes.release()
+            self.keyframes = None
+        if lease is not None:
+            self.lease.release()
+            self.lease = lease
+        self.cap = cap
+        self._cap_url = url
+        # Different sources (letterboxed keyframes, main vs sub) don't diff cleanly
+        self.scheduler.detector.reset(self.name)
+
+    def _to_full(self) -> bool:
+        """Make sure a full-rate capture on ``active_url`` is in use; False while opening."""
+        if self.cap is not None and self._cap_url == self.active_url:
+            return True
+        if self._opening is None:
+            if time.monotonic() < self._retry_at:
+                return False
+            self._open_async(self.active_url)
+        if self._opening.is_alive():
+            return False
+        self._opening = None
+        url, cap, lease = self._opened
+        if not cap.isOpened():
+            cap.release()
+            if lease is not None:
+                lease.release()
+            if not self.isOpened():
+                # Nothing else to show: fall back to the idle URL synchronously, under the held lease
+                cap, url, lease = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG), self.url, None
+            else:
+                self._retry_at = time.monotonic() + 5.0
+                return False
+        self._swap_cap(url, cap, lease)
+        return True
+
+    def _drop_opened(self):
+        _, cap, lease = self._opened
+        cap.release()
+        if lease is not None:
+            lease.release()
+
+    def _to_idle(self):
+        if self._opening is not None:
+            if self._opening.is_alive():
+                # Let the full-rate open finish first: it may be using our lease
+                return
+            # A full-rate open finished after we went idle again
+            self._opening = None
+            self._drop_opened()
+        if self.keyframes is None and self.scheduler.use_keyframes:
+            w, h = self.scheduler.cell_size
+            self._swap_cap(None, None)
+            self.keyframes = KeyframeReader(self.url, w, h)
+        elif not self.scheduler.use_keyframes and self._cap_url != self.url:
+            # Close before reopening so both streams never run under one lease
+            self._swap_cap(None, None)
+            self._swap_cap(self.url, cv2.VideoCapture(self.url, cv2.CAP_FFMPEG))
+
+    def _read_idle(self, now: float, due: bool):
+        if not self.isOpened() and self._opening is not None:
+            # Reopening under the same lease: keep the previous tile meanwhile
+            return True, None
+        if self.keyframes is not None:
+            if not self.keyframes.isOpened():
+                return False, None
+            frame = self.keyframes.poll() if due else None
+        else:
+            # No FFmpeg binary: keep draining the session, retrieve at idle_fps
+            if self.cap is None or not self.cap.grab():
+                return False, None
+            frame = self.cap.retrieve()[1] if due else None
+        if frame is not None:
+            self._last_retrieve = now
+        return True, frame
+
+    def read(self):
+        now = time.monotonic()
+        due = now - self._last_retrieve >= 1.0 / max(self.scheduler.idle_fps, 0.01)
+        if self.scheduler.is_active(self.name, now):
+            if self._to_full():
+                return self.cap.read()
+            return self._read_idle(now, due)
+        self._to_idle()
+        return self._read_idle(now, due)
+
+    def release(self):
+        if self._opening is not None:
+            self._opening.join()
+            self._opening = None
+            self._drop_opened()
+        if self.keyframes is not None:
+            self.keyframes.release()
+            self.keyframes = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        self.lease.release()
@@ -0,0 +1,301 @@
+"""Timestamp index over locally recorded segments.
+
+Each camera directory written by ``recorder.SegmentRecorder`` gets:
+
+    segments.idx   one line per segment: filename,start_epoch,end_epoch
+    index.bin      fixed-size keyframe records sorted by wall-clock time:
+                   (wall_ts float64, segment id uint32, offset_s float64,
+                    byte offset uint64)
+
+``index.bin`` is memory-mapped and binary-searched, so seeking to a
+timestamp is O(log n) in the number of keyframes, however much footage the
+archive holds. ``open_index`` keeps one ``ArchiveIndex`` per directory.
+It remaps ``index.bin`` and reads only the new tail of ``segments.idx``
+when the files grow, so a seek never re-reads the whole archive.
+
+A segment's table row is written before its keyframe records, so a reader
+never finds a record for a segment it cannot name. Readers also ignore a
+partially written row or record at the end of either file.
+
+Playback goes through ffconcat playlists written next to the segments
+(FFmpeg resolves their relative paths from there). Each playlist gets a
+unique name, so concurrent readers never overwrite each other's. Pass it
+to ``release_source`` when done; FFmpeg reads a playlist whole when it
+opens it, so leftovers older than ``PLAYLIST_TTL`` are swept as well.
+"""
+import mmap
+import os
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from recorder import FORMATS, RUN_SEPARATOR, SEGMENT_TIME_FORMAT, find_ffmpeg
+
+INDEX_FILE = 'index.bin'
+SEGMENT_TABLE = 'segments.idx'
+RECORD = struct.Struct('<dIdQ')
+PLAYLIST_PREFIX = '.playback-'
+PLAYLIST_SUFFIX = '.ffconcat'
+PLAYLIST_TTL = 600.0
+
+_swept: Dict[str, float] = {}
+_swept_lock = threading.Lock()
+_indexes: Dict[str, 'ArchiveIndex'] = {}
+_indexes_lock = threading.Lock()
+
+
+class ArchiveHit(NamedTuple):
+    path: str
+    offset_s: float      # keyframe position inside the segment
+    byte_offset: int     # keyframe packet position inside the segment
+    keyframe_ts: float   # wall-clock time of that keyframe
+    segment_end: float
+    segment_id: int      # row in the segment table
+
+
+def segment_start(filename: str) -> Optional[float]:
+    """Wall-clock start of a segment from its strftime-generated name."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    # Drop the run number (names written before it was added have none)
+    stem = stem.split(RUN_SEPARATOR, 1)[0]
+    try:
+        return time.mktime(time.strptime(stem, SEGMENT_TIME_FORMAT))
+    except ValueError:
+        return None
+
+
+def probe_keyframes(path: str, ffprobe: Optional[str] = None) -> Tuple[List[Tuple[float, int]], float]:
+    """Return ([(pts_s, byte_pos), ...] for keyframes, duration_s) via ffprobe."""
+    if ffprobe is None:
+        ffmpeg = find_ffmpeg()
+        ffprobe = os.path.join(os.path.dirname(ffmpeg), 'ffprobe') if ffmpeg else 'ffprobe'
+    res = subprocess.run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v:0',
+         '-show_entries', 'packet=pts_time,pos,flags', '-of', 'compact=p=0', path],
+        capture_output=True, text=True,
+    )
+    keyframes = []
+    last_pts = 0.0
+    for line in res.stdout.splitlines():
+        fields = dict(kv.split('=', 1) for kv in line.split('|') if '=' in kv)
+        try:
+            pts = float(fields.get('pts_time', 'nan'))
+        except ValueError:
+            continue
+        if pts != pts:
+            continue
+        last_pts = max(last_pts, pts)
+        if 'K' in fields.get('flags', ''):
+            pos = fields.get('pos', 'N/A')
+            keyframes.append((pts, int(pos) if pos.isdigit() else 0))
+    return keyframes, last_pts
+
+
+class ArchiveIndex:
+    """Keyframe index for one camera's segment directory."""
+
+    def __init__(self, camera_dir: str):
+        self.camera_dir = camera_dir
+        self.index_path = os.path.join(camera_dir, INDEX_FILE)
+        self.table_path = os.path.join(camera_dir, SEGMENT_TABLE)
+        self._lock = threading.Lock()
+        self._segments: List[Tuple[str, float, float]] = []
+        self._table_size = 0
+        self._map: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+        with self._lock:
+            self._load_table()
+
+    def _load_table(self):
+        """Append the rows added to ``segments.idx`` since the last call (caller holds the lock)."""
+        try:
+            if os.path.getsize(self.table_path) == self._table_size:
+                return
+            with open(self.table_path, 'rb') as f:
+                f.seek(self._table_size)
+                tail = f.read()
+        except OSError:
+            return
+        # Only complete rows: the writer may be halfway through the last one
+        tail = tail[:tail.rfind(b'\n') + 1]
+        for line in tail.decode().splitlines():
+            name, start, end = line.rsplit(',', 2)
+            self._segments.append((name, float(start), float(end)))
+        self._table_size += len(tail)
+
+    def _remap(self):
+        try:
+            size = os.path.getsize(self.index_path)
+        except OSError:
+            size = 0
+        if size == self._mapped_size and (self._map is not None or size == 0):
+            return
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._mapped_size = size
+        if size:
+            with open(self.index_path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return self._mapped_size // RECORD.size
+
+    def _record(self, i: int):
+        return RECORD.unpack_from(self._map, i * RECORD.size)
+
+    def add_segment(self, path: str) -> int:
+        """Index a finished segment; returns the number of keyframes added."""
+        name = os.path.basename(path)
+        start = segment_start(name)
+        if start is None:
+            return 0
+        keyframes, duration = probe_keyframes(path)
+        if not keyframes:
+            return 0
+        with self._lock:
+            self._load_table()
+            if any(s[0] == name for s in self._segments):
+                return 0
+            if self._segments and start < self._segments[-1][1]:
+                # Records must stay sorted for the binary search
+                print(f"Skipping out-of-order segment {name}")
+                return 0
+            seg_id = len(self._segments)
+            # Table row first: readers look up a record's segment id in it
+            with open(self.table_path, 'ab') as f:
+                f.write(f"{name},{start},{start + duration}\n".encode())
+                self._table_size = f.tell()
+            self._segments.append((name, start, start + duration))
+            with open(self.index_path, 'ab') as f:
+                f.write(b''.join(RECORD.pack(start + pts, seg_id, pts, pos) for pts, pos in keyframes))
+        return len(keyframes)
+
+    def rebuild(self) -> int:
+        """Index any segments on disk that are not in the index yet."""
+        with self._lock:
+            self._load_table()
+            known = {s[0] for s in self._segments}
+        exts = tuple(ext for _, ext in FORMATS.values())
+        added = 0
+        for name in sorted(os.listdir(self.camera_dir)):
+            if name.endswith(exts) and name not in known:
+                added += self.add_segment(os.path.join(self.camera_dir, name))
+        return added
+
+    def lookup(self, ts: float) -> Optional[ArchiveHit]:
+        """Find the last keyframe at or before ``ts`` (epoch seconds)."""
+        with self._lock:
+            self._remap()
+            if self._map is None or not len(self):
+                return None
+            lo, hi = 0, len(self)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._record(mid)[0] <= ts:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo == 0:
+                return None
+            wall, seg_id, offset_s, pos = self._record(lo - 1)
+            if seg_id >= len(self._segments):
+                self._load_table()
+                if seg_id >= len(self._segments):
+                    # Written by an older recorder that appended records before the row
+                    return None
+            name, _, end = self._segments[seg_id]
+        if ts >= end:
+            return None
+        return ArchiveHit(os.path.join(self.camera_dir, name), offset_s, pos, wall, end, seg_id)
+
+    def covering(self, ts: float, duration_s: float) -> List[Tuple[str, float]]:
+        """Segments (path, inpoint_s) to play ``duration_s`` from ``ts``, stopping at a gap."""
+        hit = self.lookup(ts)
+        if hit is None:
+            return []
+        out = [(hit.path, hit.offset_s)]
+        end = ts + duration_s
+        prev_end = hit.segment_end
+        with self._lock:
+            segments = self._segments
+            for seg_id in range(hit.segment_id + 1, len(segments)):
+                name, start, seg_end = segments[seg_id]
+                if start >= end or start - prev_end > 5.0:
+                    break
+                out.append((os.path.join(self.camera_dir, name), 0.0))
+                prev_end = seg_end
+        return out
+
+    def playlist(self, ts: float, duration_s: float) -> Optional[str]:
+        """Write an ffconcat playlist starting at ``ts``; None if not archived."""
+        parts = self.covering(ts, duration_s)
+        if not parts:
+            return None
+        lines = ['ffconcat version 1.0']
+        for path, inpoint in parts:
+            lines.append(f"file '{os.path.basename(path)}'")
+            if inpoint > 0:
+                lines.append(f"inpoint {inpoint:.3f}")
+        _sweep_playlists(self.camera_dir)
+        fd, out = tempfile.mkstemp(prefix=f"{PLAYLIST_PREFIX}{int(ts)}-{int(duration_s)}-",
+                                   suffix=PLAYLIST_SUFFIX, dir=self.camera_dir)
+        with os.fdopen(fd, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return out
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+                self._mapped_size = 0
+
+
+def open_index(camera_dir: str) -> ArchiveIndex:
+    """The shared ``ArchiveIndex`` for ``camera_dir`` (kept open for the life of the process)."""
+    key = os.path.realpath(camera_dir)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = ArchiveIndex(camera_dir)
+        return index
+
+
+def _sweep_playlists(camera_dir: str):
+    """Remove playlists left behind by readers, at most once per ``PLAYLIST_TTL``."""
+    now = time.time()
+    with _swept_lock:
+        if now - _swept.get(camera_dir, 0.0) < PLAYLIST_TTL:
+            return
+        _swept[camera_dir] = now
+    for entry in os.scandir(camera_dir):
+        if entry.name.startswith(PLAYLIST_PREFIX) and entry.name.endswith(PLAYLIST_SUFFIX):
+            try:
+                if now - entry.stat().st_mtime > PLAYLIST_TTL:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def release_source(source: Optional[str]):
+    """Delete ``source`` if it is a playlist written by ``archive_source``."""
+    name = os.path.basename(source or '')
+    if name.startswith(PLAYLIST_PREFIX) and name.endswith(PLAYLIST_SUFFIX):
+        try:
+            os.remove(source)
+        except OSError:
+            pass
+
+
+def archive_source(archive_dir: Optional[str], camera_name: str, ts: float, duration_s: float) -> Optional[str]:
+    """Playable local source for a camera at ``ts``, or None to use the DVR."""
+    if not archive_dir:
+        return None
+    camera_dir = os.path.join(archive_dir, camera_name)
+    if not os.path.isdir(camera_dir):
+        return None
+    return open_index(camera_dir).playlist(ts, duration_s)
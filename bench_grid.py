@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Headless grid compositing benchmark.
+
+Runs ``scalable_player.grid_play`` with a ``NullSink``, so no window or X
+server is needed, and reports composited grid frames per second for each
+camera count. Every camera plays the same source. Without a source a
+synthetic 640x360 MJPEG clip is written to a temporary file first; pass an
+RTSP URL or a recording to measure real streams.
+
+Usage:
+    python bench_grid.py [source] [--cameras 1,4,9,16] [--frames 300] [--workers N]
+"""
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from scalable_player import _option, grid_play  # noqa: E402
+from sinks import NullSink  # noqa: E402
+
+
+def _synthetic_clip(frames: int, size=(640, 360), fps: float = 25.0) -> str:
+    import cv2
+    import numpy as np
+
+    fd, path = tempfile.mkstemp(suffix='.avi')
+    os.close(fd)
+    w, h = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (w, h))
+    frame = np.zeros((h, w, 3), dtype=np.uint8)
+    for i in range(frames):
+        frame[:] = (i % 256, 64, 128)
+        cv2.rectangle(frame, ((i * 7) % w, 60), ((i * 7) % w + 80, 200), (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def main():
+    args = [a for i, a in enumerate(sys.argv[1:], 1)
+            if not a.startswith('--') and not sys.argv[i - 1].startswith('--')]
+    counts = [int(n) for n in _option(sys.argv, '--cameras', '1,4,9,16').split(',')]
+    frames = int(_option(sys.argv, '--frames', 300))
+    workers = int(_option(sys.argv, '--workers', 0))
+    source = args[0] if args else None
+    clip = None
+    if source is None:
+        # Longer than the run so no camera reaches end of file
+        clip = source = _synthetic_clip(frames + 100)
+    print(f"Source: {source}; {frames} grid frames per run; workers={workers}")
+    print(f"{'cameras':>8} {'grid fps':>10} {'camera fps':>11}")
+    try:
+        for count in counts:
+            urls = [(f"cam{i + 1}", source) for i in range(count)]
+            sink = NullSink(max_frames=frames)
+            grid_play(urls, workers=workers, max_channels=count, sink=sink)
+            print(f"{count:>8} {sink.fps:>10.1f} {sink.fps * count:>11.1f}")
+    finally:
+        if clip:
+            os.remove(clip)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for the CLI entry modules.
+
+Each module is imported in a fresh interpreter several times and the median
+wall time (minus a bare interpreter start) is reported, together with any
+heavy modules (cv2, numpy, onvif, zeep) that were loaded as a side effect.
+
+Usage:
+    python bench_import_time.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = ['brands.factory', 'scalable_player', 'dvr_api', 'dvr_main', 'dvr_onvif']
+HEAVY = ('cv2', 'numpy', 'onvif', 'zeep')
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _time_code(code: str, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=HERE, check=False,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def _heavy_loaded(module: str) -> list:
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    res = subprocess.run([sys.executable, '-c', code], cwd=HERE, capture_output=True, text=True)
+    if res.returncode != 0:
+        return ['<import failed>']
+    return [m for m in res.stdout.strip().split(',') if m]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    baseline = _time_code('pass', runs)
+    print(f"Interpreter start: {baseline * 1000:.1f} ms (median of {runs})")
+    print(f"{'module':<20} {'import ms':>10}  heavy modules loaded")
+    for module in MODULES:
+        elapsed = _time_code(f'import {module}', runs) - baseline
+        heavy = _heavy_loaded(module)
+        print(f"{module:<20} {elapsed * 1000:>10.1f}  {', '.join(heavy) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,13 +10,69 @@ class DVRInfo:
     username: str
     password: str
     rtsp_url: str
+    brand: Optional[str] = None
+
+@dataclass(frozen=True)
+class BrandCapabilities:
+    """Per-brand hints used by the players to make cost decisions."""
+    mainstream_id: int = 1           # stream suffix in channel ids (101, 201, ...)
+    substream_id: int = 2            # 102, 202, ...
+    max_sessions: int = 8            # default RTSP session budget per DVR
+    keyframe_interval: float = 2.0   # typical seconds between I-frames; trick play never samples finer
+    snapshot_path: Optional[str] = None  # HTTP JPEG endpoint, formatted with channel/channel_id
 
 class DVRBrand:
+    capabilities = BrandCapabilities()
+
+    def live_url_template(self, dvr: DVRInfo) -> Optional[str]:
+        """Live URL of any channel as a format string, or None if the URL names no channel.
+
+        Placeholders: ``{channel}`` (1-based), ``{stream}`` (main/sub id) and
+        ``{channel_id}`` (channel * 100 + stream).
+        """
+        m = re.search(r"Streaming/Channels/(\d+)", dvr.rtsp_url)
+        if not m:
+            return None
+        escape = lambda part: part.replace('{', '{{').replace('}', '}}')
+        return escape(dvr.rtsp_url[:m.start(1)]) + '{channel_id}' + escape(dvr.rtsp_url[m.end(1):])
+
+    def channel_count(self, dvr: DVRInfo, max_channels: int = 16) -> int:
+        """Channels to expand for a DVR whose URL has a channel template."""
+        return max_channels
+
     def expand_channels(self, dvr: DVRInfo, max_channels: int = 16, use_substream: bool = True) -> List[DVRInfo]:
-        raise NotImplementedError
+        template = self.live_url_template(dvr)
+        if template is None:
+            return [dvr]
+        stream = self.stream_id(use_substream)
+        return [DVRInfo(name=f"{dvr.name}-CH{ch}", ip=dvr.ip, username=dvr.username, password=dvr.password,
+                        rtsp_url=template.format(channel=ch, stream=stream, channel_id=ch * 100 + stream),
+                        brand=dvr.brand)
+                for ch in range(1, self.channel_count(dvr, max_channels) + 1)]
 
     def build_live_url(self, dvr: DVRInfo) -> str:
         raise NotImplementedError
 
+    def stream_id(self, use_substream: bool = True) -> int:
+        caps = self.capabilities
+        return caps.substream_id if use_substream else caps.mainstream_id
+
+    def build_stream_url(self, dvr: DVRInfo, use_substream: bool = True) -> str:
+        """Same channel on the main (x01) or sub (x02) stream, per the expand_channels scheme."""
+        m = re.search(r"Streaming/Channels/(\d+)", dvr.rtsp_url)
+        if not m:
+            return dvr.rtsp_url
+        cid = int(m.group(1)) // 100 * 100 + self.stream_id(use_substream)
+        return re.sub(r"Streaming/Channels/\d+", f"Streaming/Channels/{cid}", dvr.rtsp_url)
+
     def build_playback_url(self, dvr: DVRInfo, start_time: datetime, duration: timedelta) -> str:
         raise NotImplementedError
+
+    def build_snapshot_url(self, dvr: DVRInfo) -> Optional[str]:
+        """HTTP JPEG snapshot URL for the camera, or None if the brand has none."""
+        path = self.capabilities.snapshot_path
+        m = re.search(r"Streaming/Channels/(\d+)", dvr.rtsp_url)
+        if not path or not m:
+            return None
+        cid = int(m.group(1))
+        return f"http://{dvr.ip}" + path.format(channel=cid // 100, channel_id=cid)
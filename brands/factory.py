@@ -1,24 +1,117 @@
+from importlib import import_module
+from typing import Dict, List, Optional, Union
 try:
     from .base import DVRBrand
-    from .hikvision import HikvisionBrand
-    from .cpplus import CPPlusBrand
 except ImportError:
     # Fallback when executed directly without package context
     from brands.base import DVRBrand
-    from brands.hikvision import HikvisionBrand
-    from brands.cpplus import CPPlusBrand
 
-_BRANDS = {
-    'hikvision': HikvisionBrand(),
-    'cpplus': CPPlusBrand(),
+# Third-party brands register under this entry-point group, e.g. in setup.cfg:
+#   [options.entry_points]
+#   dvr_system.brands =
+#       dahua = dvr_dahua:DahuaBrand
+ENTRY_POINT_GROUP = 'dvr_system.brands'
+
+# Built-in brands are imported on first use, like entry points
+_BUILTIN = {
+    'hikvision': 'hikvision:HikvisionBrand',
+    'cpplus': 'cpplus:CPPlusBrand',
 }
 
-def get_brand(name: str) -> DVRBrand:
+# Name fragments used to infer a brand when the config does not set one
+_NAME_HINTS = [
+    ('hik', 'hikvision'),
+    ('cpplus', 'cpplus'),
+    ('cp+', 'cpplus'),
+    ('cp plus', 'cpplus'),
+]
+
+DEFAULT_BRAND = 'hikvision'
+
+_specs: Dict[str, Union[str, object]] = dict(_BUILTIN)
+_loaded: Dict[str, DVRBrand] = {}
+_entry_points_scanned = False
+
+
+def register_brand(key: str, brand: Union[str, type, DVRBrand]):
+    """Register a brand by key: an instance, a class, or a 'module:Class' path."""
+    key = key.strip().lower()
+    _specs[key] = brand
+    _loaded.pop(key, None)
+
+
+def _scan_entry_points():
+    global _entry_points_scanned
+    if _entry_points_scanned:
+        return
+    _entry_points_scanned = True
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return
+    try:
+        eps = entry_points()
+        found = eps.select(group=ENTRY_POINT_GROUP) if hasattr(eps, 'select') else eps.get(ENTRY_POINT_GROUP, [])
+    except Exception as e:
+        print(f"Brand plugin discovery failed: {e}")
+        return
+    for ep in found:
+        # Explicit registrations win over installed plugins
+        _specs.setdefault(ep.name.strip().lower(), ep)
+
+
+def _resolve(spec) -> DVRBrand:
+    if isinstance(spec, str):
+        module_name, _, attr = spec.partition(':')
+        if spec in _BUILTIN.values():
+            module = import_module(f'.{module_name}', __package__) if __package__ else import_module(f'brands.{module_name}')
+        else:
+            module = import_module(module_name)
+        spec = getattr(module, attr)
+    elif hasattr(spec, 'load') and not isinstance(spec, (type, DVRBrand)):
+        spec = spec.load()
+    return spec() if isinstance(spec, type) else spec
+
+
+def _load(key: str) -> Optional[DVRBrand]:
+    brand = _loaded.get(key)
+    if brand is not None:
+        return brand
+    if key not in _specs:
+        _scan_entry_points()
+    spec = _specs.get(key)
+    if spec is None:
+        return None
+    brand = _resolve(spec)
+    _loaded[key] = brand
+    return brand
+
+
+def available_brands() -> List[str]:
+    _scan_entry_points()
+    return sorted(_specs)
+
+
+def get_brand(name: str, brand: Optional[str] = None) -> DVRBrand:
+    """Brand implementation for a DVR.
+
+    ``brand`` is the explicit key from the config; without it the brand is
+    inferred from the DVR name.
+    """
+    if brand:
+        impl = _load(brand.strip().lower())
+        if impl is None:
+            raise ValueError(f"Unknown DVR brand '{brand}', expected one of {available_brands()}")
+        return impl
     key = (name or '').strip().lower()
     # Fallback: try to infer by name contains
-    if 'hik' in key:
-        return _BRANDS['hikvision']
-    if 'cpplus' in key or 'cp+' in key or 'cp plus' in key:
-        return _BRANDS['cpplus']
+    for hint, brand_key in _NAME_HINTS:
+        if hint in key:
+            return _load(brand_key)
     # Default to Hikvision-like behavior
-    return _BRANDS['hikvision']
+    return _load(DEFAULT_BRAND)
+
+
+def brand_for(dvr) -> DVRBrand:
+    """Brand for a DVRInfo-like object, honouring its optional ``brand`` key."""
+    return get_brand(dvr.name, getattr(dvr, 'brand', None))
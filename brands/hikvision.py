@@ -2,22 +2,28 @@ from datetime import datetime, timedelta
 from typing import List
 import re
 try:
-    from .base import DVRBrand, DVRInfo
+    from .base import BrandCapabilities, DVRBrand, DVRInfo
 except ImportError:
     # Fallback when executed directly without package context
-    from brands.base import DVRBrand, DVRInfo
+    from brands.base import BrandCapabilities, DVRBrand, DVRInfo
 
 class HikvisionBrand(DVRBrand):
+    capabilities = BrandCapabilities(
+        max_sessions=16,
+        keyframe_interval=2.0,
+        snapshot_path='/ISAPI/Streaming/channels/{channel_id}/picture',
+    )
+
     def expand_channels(self, dvr: DVRInfo, max_channels: int = 16, use_substream: bool = True) -> List[DVRInfo]:
         m = re.search(r"Streaming/Channels/(\d+)", dvr.rtsp_url)
         if not m:
             return [dvr]
         chan_count = max_channels
-        chan_ids = [(i * 100 + (2 if use_substream else 1)) for i in range(1, chan_count + 1)]
+        chan_ids = [(i * 100 + self.stream_id(use_substream)) for i in range(1, chan_count + 1)]
         out: List[DVRInfo] = []
         for cid in chan_ids:
             url = re.sub(r"Streaming/Channels/\d+", f"Streaming/Channels/{cid}", dvr.rtsp_url)
-            out.append(DVRInfo(name=f"{dvr.name}-CH{cid//100}", ip=dvr.ip, username=dvr.username, password=dvr.password, rtsp_url=url))
+            out.append(DVRInfo(name=f"{dvr.name}-CH{cid//100}", ip=dvr.ip, username=dvr.username, password=dvr.password, rtsp_url=url, brand=dvr.brand))
         return out
 
     def build_live_url(self, dvr: DVRInfo) -> str:
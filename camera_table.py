@@ -0,0 +1,167 @@
+"""Compact camera registry for large fleets.
+
+``expand_all`` builds one ``DVRInfo`` per channel, each with a copy of the
+credentials and a regex-rewritten URL. ``CameraTable`` instead stores one
+slotted ``DVRRecord`` per DVR and three small column arrays per channel
+(DVR index, channel number, stream id). Names and URLs are derived on
+demand, and name lookups go through a dict built once.
+
+Rows are exposed as ``CameraRef`` views. They have the same attributes as
+``DVRInfo`` (name, ip, username, password, rtsp_url, brand), so brand URL
+builders and the players accept them unchanged.
+"""
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+from brands.factory import brand_for
+
+
+class DVRRecord:
+    """One DVR, shared by all of its channels.
+
+    Channel URLs come from the brand's ``live_url_template``.
+    """
+
+    __slots__ = ('name', 'ip', 'username', 'password', 'rtsp_url', 'brand', 'impl', '_template')
+
+    def __init__(self, dvr):
+        self.name = dvr.name
+        self.ip = dvr.ip
+        self.username = dvr.username
+        self.password = dvr.password
+        self.rtsp_url = dvr.rtsp_url
+        self.brand = getattr(dvr, 'brand', None)
+        self.impl = brand_for(dvr)
+        self._template = self.impl.live_url_template(dvr)
+
+    @property
+    def has_channels(self) -> bool:
+        return self._template is not None
+
+    def channel_url(self, channel: int, stream: int) -> str:
+        if self._template is None:
+            return self.rtsp_url
+        return self._template.format(channel=channel, stream=stream, channel_id=channel * 100 + stream)
+
+
+class CameraRef:
+    """Lightweight view of one table row with ``DVRInfo``'s attributes."""
+
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table: 'CameraTable', row: int):
+        self.table = table
+        self.row = row
+
+    @property
+    def dvr(self) -> DVRRecord:
+        return self.table.dvrs[self.table.dvr_index[self.row]]
+
+    @property
+    def channel(self) -> int:
+        return self.table.channels[self.row]
+
+    @property
+    def name(self) -> str:
+        return self.table.name(self.row)
+
+    @property
+    def ip(self) -> str:
+        return self.dvr.ip
+
+    @property
+    def username(self) -> str:
+        return self.dvr.username
+
+    @property
+    def password(self) -> str:
+        return self.dvr.password
+
+    @property
+    def brand(self) -> Optional[str]:
+        return self.dvr.brand
+
+    @property
+    def rtsp_url(self) -> str:
+        return self.table.url(self.row)
+
+    def __repr__(self):
+        return f"CameraRef({self.name!r})"
+
+
+class CameraTable:
+    def __init__(self):
+        self.dvrs: List[DVRRecord] = []
+        self.dvr_index = array('I')
+        self.channels = array('H')
+        self.streams = array('B')
+        self._names: Optional[List[str]] = None
+        self._by_name: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def from_dvrs(cls, dvrs, use_substream: bool = True, max_channels: int = 16) -> 'CameraTable':
+        """Same channels as ``expand_all`` without a per-channel object."""
+        table = cls()
+        for dvr in dvrs:
+            table.add_dvr(dvr, use_substream=use_substream, max_channels=max_channels)
+        return table
+
+    def add_dvr(self, dvr, use_substream: bool = True, max_channels: int = 16):
+        record = DVRRecord(dvr)
+        idx = len(self.dvrs)
+        self.dvrs.append(record)
+        if record.has_channels:
+            stream = record.impl.stream_id(use_substream)
+            count = record.impl.channel_count(dvr, max_channels)
+        else:
+            # No channel pattern: the DVR URL is the only camera
+            stream, count = 0, 1
+        self.dvr_index.extend([idx] * count)
+        self.channels.extend(range(1, count + 1) if record.has_channels else [0])
+        self.streams.extend([stream] * count)
+        self._names = None
+        self._by_name = None
+
+    def __len__(self) -> int:
+        return len(self.channels)
+
+    def __getitem__(self, row: int) -> CameraRef:
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return CameraRef(self, row)
+
+    def __iter__(self) -> Iterator[CameraRef]:
+        for row in range(len(self)):
+            yield CameraRef(self, row)
+
+    def name(self, row: int) -> str:
+        if self._names is not None:
+            return self._names[row]
+        dvr = self.dvrs[self.dvr_index[row]]
+        channel = self.channels[row]
+        return f"{dvr.name}-CH{channel}" if channel else dvr.name
+
+    def names(self) -> List[str]:
+        """All camera names, computed once per table."""
+        if self._names is None:
+            self._names = [self.name(row) for row in range(len(self))]
+        return self._names
+
+    def url(self, row: int) -> str:
+        return self.dvrs[self.dvr_index[row]].channel_url(self.channels[row], self.streams[row])
+
+    def find(self, name: str) -> Optional[CameraRef]:
+        """Case-insensitive lookup by camera name."""
+        if self._by_name is None:
+            self._by_name = {n.lower(): row for row, n in enumerate(self.names())}
+        row = self._by_name.get(name.lower())
+        return CameraRef(self, row) if row is not None else None
+
+    def urls_with_names(self, url_fn=None) -> List[tuple]:
+        """(name, url) pairs for the players; ``url_fn(ref)`` overrides the URL."""
+        names = self.names()
+        if url_fn is None:
+            return [(names[row], self.url(row)) for row in range(len(self))]
+        return [(names[row], url_fn(CameraRef(self, row))) for row in range(len(self))]
@@ -0,0 +1,154 @@
+"""Shared capture threads that keep the latest decoded frame per camera.
+
+One ``CameraStream`` owns a single DVR session no matter how many consumers
+read from it. Consumers either poll ``latest()`` or block in
+``wait_newer()`` for the next frame. Frames are decoded into a small ring of
+reused buffers (see ``frame_pool``), so a published frame stays valid while
+the next ones are decoded but is eventually overwritten. Consumers that
+work on a frame for longer (JPEG encoding, batching) read it inside
+``hold()``, which keeps the buffer out of the ring until the block exits.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from frame_pool import FramePool
+from latency import LiveLatencyController
+from sessions import LIVE, open_capture
+
+IDLE_TIMEOUT = 30.0
+# Published frame, frame being decoded, and one spare for slow consumers
+BUFFER_DEPTH = 3
+
+
+class CameraStream:
+    """Background reader for one camera URL.
+
+    The stream starts on first ``touch()`` and releases its DVR session
+    after ``idle_timeout`` seconds without any consumer touching it. A
+    stopped stream drops its frame, so consumers wait for a fresh one
+    after a restart; ``seq`` keeps counting up across restarts.
+    ``on_frame(name, frame)`` is called on the capture thread for every
+    decoded frame, e.g. ``FrameDeduper.feed`` in front of an analytics model.
+    The frame is safe to read during the call; copy it to keep it, or hand
+    it to another thread.
+    """
+
+    def __init__(self, name: str, url: str, idle_timeout: float = IDLE_TIMEOUT, max_latency: Optional[float] = 1.0,
+                 on_frame: Optional[Callable[[str, object], None]] = None):
+        self.name = name
+        self.url = url
+        self.idle_timeout = idle_timeout
+        self.max_latency = max_latency
+        self.on_frame = on_frame
+        self.frame = None
+        self.seq = 0
+        self.timestamp = 0.0
+        self._cond = threading.Condition()
+        self._pool = FramePool(BUFFER_DEPTH)
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._last_access = time.monotonic()
+
+    def touch(self):
+        """Mark the stream as in use, starting the capture thread if needed."""
+        self._last_access = time.monotonic()
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name=f"capture-{self.name}")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def latest(self):
+        """Return (seq, frame, timestamp) of the newest frame.
+
+        The frame is a pooled buffer: use ``hold()`` or copy it if it must be
+        kept for longer than the next couple of frames.
+        """
+        with self._cond:
+            return self.seq, self.frame, self.timestamp
+
+    @contextmanager
+    def hold(self):
+        """``latest()`` whose frame is not overwritten until the block exits."""
+        with self._cond:
+            seq, frame, ts = self.seq, self.frame, self.timestamp
+            if frame is not None:
+                self._pool.pin(frame)
+        try:
+            yield seq, frame, ts
+        finally:
+            if frame is not None:
+                self._pool.unpin(frame)
+
+    def wait_newer(self, seq: int, timeout: float = 5.0):
+        """Block until a frame newer than ``seq`` arrives or ``timeout`` passes."""
+        self.touch()
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != seq or not self._running, timeout=timeout)
+            return self.seq, self.frame, self.timestamp
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _publish(self, frame):
+        with self._cond:
+            self.frame = frame
+            self.seq += 1
+            self.timestamp = time.time()
+            self._cond.notify_all()
+
+    def _idle(self) -> bool:
+        return time.monotonic() - self._last_access > self.idle_timeout
+
+    def _run(self):
+        backoff = 1.0
+        pool = self._pool
+        while self._running and not self._idle():
+            cap, lease = open_capture(self.url, LIVE, timeout=backoff)
+            if cap is None:
+                print(f"Cannot open stream for {self.name}; retrying in {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            backoff = 1.0
+            latency = LiveLatencyController(self.max_latency) if self.max_latency else None
+            while self._running and not self._idle():
+                ret, frame = pool.read(cap, latency)
+                if not ret or frame is None:
+                    print(f"Failed to grab frame from {self.name}; reconnecting")
+                    break
+                self._publish(frame)
+                if self.on_frame is not None:
+                    self.on_frame(self.name, frame)
+            cap.release()
+            lease.release()
+        with self._cond:
+            self._running = False
+            self.frame = None
+            self._cond.notify_all()
+
+
+class StreamHub:
+    """Registry of shared ``CameraStream`` objects keyed by camera name."""
+
+    def __init__(self, urls_with_names: List[tuple], **stream_kwargs):
+        self.streams: Dict[str, CameraStream] = {
+            name: CameraStream(name, url, **stream_kwargs) for name, url in urls_with_names
+        }
+
+    def get(self, name: str) -> Optional[CameraStream]:
+        return self.streams.get(name)
+
+    def names(self) -> List[str]:
+        return list(self.streams)
+
+    def stop_all(self):
+        for stream in self.streams.values():
+            stream.stop()
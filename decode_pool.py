@@ -0,0 +1,210 @@
+"""Process-pool decode backend for the grid players.
+
+Cameras are sharded across worker processes. Each worker opens its own
+captures, decodes, scales and labels tiles and writes them into a shared
+memory block, so the display process only composites finished tiles and the
+per-frame Python work is no longer serialized on one GIL.
+
+Workers set a shared event after each new tile. The display process waits
+on it and copies only the tiles whose sequence number moved, so an idle
+grid costs nothing. A worker flips its double buffer and then bumps the
+sequence number, so a copy during which the number changed may have raced
+the next write into that buffer and is taken again (as
+``sinks.SharedFrameReader`` does). A worker that dies is reported and its
+cells are marked instead of freezing silently.
+"""
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import List, Optional
+
+import numpy as np
+
+
+def _tile_view(shm_name: str, count: int, cell_w: int, cell_h: int):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    # Two buffers per camera: the worker fills the back one and then flips
+    tiles = np.ndarray((count, 2, cell_h, cell_w, 3), dtype=np.uint8, buffer=shm.buf)
+    return shm, tiles
+
+
+def _camera_loop(slot, name, url, tiles, ready, seq, changed, stop_event):
+    import cv2
+    from frame_pool import FramePool
+    from scalable_player import fit_tile_into, placeholder_tile
+
+    cell_h, cell_w = tiles.shape[2:4]
+    cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+    if not cap.isOpened():
+        print(f"Cannot open stream for {name}")
+    pool = FramePool(depth=1)
+    misses = 0
+    while not stop_event.is_set():
+        ret, frame = pool.read(cap) if cap.isOpened() else (False, None)
+        back = 1 - ready[slot]
+        if ret and frame is not None:
+            misses = 0
+            # Scale straight into the shared-memory back buffer
+            fit_tile_into(tiles[slot, back], frame, name)
+        else:
+            misses += 1
+            tiles[slot, back] = placeholder_tile(name, cell_w, cell_h)
+            time.sleep(min(1.0, 0.1 * misses))
+        ready[slot] = back
+        seq[slot] += 1
+        changed.set()
+    cap.release()
+
+
+def _worker_main(shm_name, count, cell_w, cell_h, assignments, ready, seq, changed, stop_event):
+    """Decode the cameras in ``assignments`` (list of (slot, name, url))."""
+    shm, tiles = _tile_view(shm_name, count, cell_w, cell_h)
+    threads = []
+    for slot, name, url in assignments:
+        t = threading.Thread(target=_camera_loop, args=(slot, name, url, tiles, ready, seq, changed, stop_event))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    del tiles
+    shm.close()
+
+
+class ProcessDecodePool:
+    """Decode and pre-scale camera tiles in ``workers`` separate processes.
+
+    Workers open their captures without asking the session budget, so the
+    caller admits every stream first and holds its lease until ``stop()``.
+    """
+
+    def __init__(self, urls_with_names: List[tuple], workers: int, cell_w: int, cell_h: int):
+        self.names = [name for name, _ in urls_with_names]
+        self.urls = [url for _, url in urls_with_names]
+        self.workers = max(1, min(workers, len(self.urls)))
+        self.cell_w = cell_w
+        self.cell_h = cell_h
+        self._ctx = mp.get_context('spawn')
+        self._stop = self._ctx.Event()
+        self._changed = self._ctx.Event()
+        self._procs = []
+        self._shards = []
+        self._dead = set()
+        self._shm = None
+        self._tiles = None
+        self._canvas = None
+        self._shown: List[int] = []
+        self.updated: List[int] = []
+        self.ready = self._ctx.RawArray('i', len(self.urls))
+        self.seq = self._ctx.RawArray('Q', len(self.urls))
+
+    def start(self):
+        count = len(self.urls)
+        size = count * 2 * self.cell_h * self.cell_w * 3
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, size))
+        self._tiles = np.ndarray((count, 2, self.cell_h, self.cell_w, 3), dtype=np.uint8, buffer=self._shm.buf)
+        self._tiles[:] = 0
+        # Round-robin sharding keeps busy DVRs spread over all workers
+        shards = [[] for _ in range(self.workers)]
+        for slot, (name, url) in enumerate(zip(self.names, self.urls)):
+            shards[slot % self.workers].append((slot, name, url))
+        for shard in shards:
+            p = self._ctx.Process(
+                target=_worker_main,
+                args=(self._shm.name, count, self.cell_w, self.cell_h, shard, self.ready, self.seq, self._changed,
+                      self._stop),
+            )
+            p.daemon = True
+            p.start()
+            self._procs.append(p)
+        self._shards = shards
+        return self
+
+    def wait(self, timeout: float = 0.1) -> bool:
+        """Block until a worker has finished a new tile; False on timeout."""
+        fresh = self._changed.wait(timeout)
+        # Tiles that land after this are still seen: seq is bumped before the event is set
+        self._changed.clear()
+        return fresh
+
+    def check(self) -> List[str]:
+        """Names of cameras whose worker died since the last check (each reported once)."""
+        lost = []
+        for i, p in enumerate(self._procs):
+            if i in self._dead or p.is_alive():
+                continue
+            self._dead.add(i)
+            names = [name for _, name, _ in self._shards[i]]
+            print(f"Decode worker {i} exited with code {p.exitcode}; no longer updating {', '.join(names)}")
+            lost.extend(names)
+        return lost
+
+    def tile(self, slot: int):
+        """Latest finished tile for a camera (a view into shared memory; may be overwritten while read)."""
+        return self._tiles[slot, self.ready[slot]]
+
+    def _copy_tile(self, slot: int, dst, retries: int = 5) -> Optional[int]:
+        """Copy a tile into ``dst``; its seq, or None if the worker kept rewriting it during every try."""
+        for _ in range(retries):
+            seq = self.seq[slot]
+            dst[:] = self.tile(slot)
+            if self.seq[slot] == seq:
+                return seq
+        return None
+
+    def composite(self, rows: int, cols: int):
+        """Copy the tiles that changed since the last call into a reusable rows x cols canvas.
+
+        Their slots are listed in ``updated`` afterwards.
+        """
+        h, w = self.cell_h, self.cell_w
+        if self._canvas is None or self._canvas.shape[:2] != (rows * h, cols * w):
+            self._canvas = np.zeros((rows * h, cols * w, 3), dtype=np.uint8)
+            self._shown = [-1] * len(self.urls)
+        self.updated = []
+        for slot in range(min(len(self.urls), rows * cols)):
+            if self.seq[slot] == self._shown[slot]:
+                continue
+            seq = self._copy_tile(slot, self.cell(slot, cols))
+            if seq is not None:
+                # A torn copy leaves _shown behind, so the next call copies the tile again
+                self._shown[slot] = seq
+                self.updated.append(slot)
+        return self._canvas
+
+    def cell(self, slot: int, cols: int):
+        """The canvas cell of a camera (a view, valid until the next ``composite``)."""
+        h, w = self.cell_h, self.cell_w
+        r, c = divmod(slot, cols)
+        return self._canvas[r * h:(r + 1) * h, c * w:(c + 1) * w]
+
+    def mark_lost(self, rows: int, cols: int, names: List[str]):
+        """Replace the cells of ``names`` with a 'decoder stopped' placeholder."""
+        from scalable_player import placeholder_tile
+
+        h, w = self.cell_h, self.cell_w
+        for name in names:
+            slot = self.names.index(name)
+            if slot < rows * cols and self._canvas is not None:
+                r, c = divmod(slot, cols)
+                self._canvas[r * h:(r + 1) * h, c * w:(c + 1) * w] = placeholder_tile(f"{name} (decoder stopped)", w, h)
+
+    def stop(self):
+        self._stop.set()
+        for p in self._procs:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        self._procs = []
+        if self._shm is not None:
+            self._tiles = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,103 @@
+"""Near-duplicate frame suppression for analytics feeds.
+
+A static scene still delivers 25 frames a second, and an ML consumer would
+run inference on each of them. ``FrameDeduper`` reduces every frame to a
+tiny signature and forwards it only when it differs enough from the last
+*forwarded* frame of that camera. Comparing against the last forwarded
+frame, not the previous one, means slow drift (lighting, a creeping
+shadow) still adds up to a forward. A keepalive frame is forwarded every
+``keepalive`` seconds so consumers know the camera is alive.
+
+Two signatures are available:
+
+* ``'diff'``: a ``thumb_size`` grayscale thumbnail. The change is the mean
+  absolute gray-level difference.
+* ``'dhash'``: a 64-bit difference hash. The change is the Hamming
+  distance in bits. It is cheaper to store and more tolerant of noise and
+  exposure shifts.
+
+Use it as a grid stage (``stages=[deduper]``) or directly on the capture
+path with ``feed(name, frame)``, e.g. as a ``CameraStream`` ``on_frame``
+hook.
+"""
+import time
+from typing import Callable, Dict, List, Optional
+
+from lazy_imports import lazy_module
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+DEFAULT_THRESHOLDS = {'diff': 3.0, 'dhash': 6}
+
+
+class FrameDeduper:
+    """Forward a camera's frame only when it changed or a keepalive is due.
+
+    ``on_frame(name, frame)`` receives forwarded frames. ``stats[name]`` is
+    ``[seen, forwarded]``.
+    """
+
+    def __init__(self, on_frame: Optional[Callable[[str, object], None]] = None, method: str = 'diff',
+                 threshold: Optional[float] = None, keepalive: float = 10.0, thumb_size: tuple = (32, 18)):
+        if method not in DEFAULT_THRESHOLDS:
+            raise ValueError(f"Unknown dedupe method '{method}', expected one of {sorted(DEFAULT_THRESHOLDS)}")
+        self.on_frame = on_frame
+        self.method = method
+        self.threshold = DEFAULT_THRESHOLDS[method] if threshold is None else threshold
+        self.keepalive = keepalive
+        self.thumb_size = thumb_size
+        self.stats: Dict[str, List[int]] = {}
+        self._refs: Dict[str, object] = {}
+        self._sent: Dict[str, float] = {}
+
+    def signature(self, frame):
+        if self.method == 'dhash':
+            small = cv2.resize(frame, (9, 8), interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+            return np.packbits(gray[:, 1:] > gray[:, :-1])
+        small = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def distance(self, a, b) -> float:
+        if self.method == 'dhash':
+            return float(np.unpackbits(np.bitwise_xor(a, b)).sum())
+        return float(cv2.absdiff(a, b).mean())
+
+    def changed(self, name: str, frame, now: Optional[float] = None) -> bool:
+        """True (and update the reference) if ``frame`` should be forwarded."""
+        now = time.monotonic() if now is None else now
+        stats = self.stats.setdefault(name, [0, 0])
+        stats[0] += 1
+        sig = self.signature(frame)
+        ref = self._refs.get(name)
+        if (ref is not None and self.distance(sig, ref) <= self.threshold
+                and now - self._sent.get(name, 0.0) < self.keepalive):
+            return False
+        self._refs[name] = sig
+        self._sent[name] = now
+        stats[1] += 1
+        return True
+
+    def feed(self, name: str, frame) -> bool:
+        """Capture-path hook: call ``on_frame`` if the frame is forwarded."""
+        if frame is None or not self.changed(name, frame):
+            return False
+        if self.on_frame is not None:
+            self.on_frame(name, frame)
+        return True
+
+    def process(self, names: List[str], frames: List[object]):
+        now = time.monotonic()
+        for name, frame in zip(names, frames):
+            if frame is not None and self.changed(name, frame, now) and self.on_frame is not None:
+                self.on_frame(name, frame)
+
+    def reset(self, name: str):
+        """Forward the camera's next frame unconditionally, e.g. after a source switch."""
+        self._refs.pop(name, None)
+
+    def ratio(self, name: str) -> float:
+        """Fraction of the camera's frames that were forwarded."""
+        seen, sent = self.stats.get(name, (0, 0))
+        return sent / seen if seen else 0.0
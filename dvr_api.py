@@ -1,54 +1,60 @@
 import os
-import cv2
 import json
 import threading
 import time
 import re
 from datetime import datetime, timedelta
-import numpy as np
+
+from lazy_imports import lazy_module
+from brands.factory import brand_for
+from overlay import overlays
+from playback_clock import ClockedCapture, PlaybackClock
+from latency import DEFAULT_MAX_LATENCY, LiveLatencyController
+from sessions import LIVE, PLAYBACK, host_of, open_capture, sessions
+from sinks import HighGuiSink
+from trickplay import PlaybackSource, TrickPlayer, play_window
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+# Seconds to wait for a free DVR session before giving up on a stream
+SESSION_WAIT = 10.0
 
 # Prefer TCP transport for RTSP when using FFmpeg backend
 os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", "rtsp_transport;tcp")
 
 class DVR:
-    def __init__(self, name, ip, username, password, rtsp_url):
+    def __init__(self, name, ip, username, password, rtsp_url, brand=None):
         self.name = name
         self.ip = ip
         self.username = username
         self.password = password
         self.rtsp_url = rtsp_url
+        self.brand = brand
 
-    def play_stream(self, start_time=None):
+    def play_stream(self, start_time=None, max_latency=DEFAULT_MAX_LATENCY, sink=None):
+        """Play live (or recorded, with start_time) video in a window.
+
+        Live view drops stale frames to stay within max_latency seconds;
+        pass None to disable. Recorded playback supports fast-forward and
+        scrubbing (see trickplay.py). A ``sink`` replaces the window (see
+        sinks.py).
+        """
         url = self.rtsp_url
-        
-        # If timestamp is provided, modify URL for playback instead of live streaming
+        source = None
+
+        # If timestamp is provided, open the brand playback URL instead of live streaming
         if start_time:
-            # For Hikvision DVRs, playback URL format: rtsp://user:pass@ip:port/Streaming/tracks/101?starttime=YYYYMMDDTHHMMSSZ&endtime=YYYYMMDDTHHMMSSZ
-            # Convert timestamp to Hikvision format (YYYYMMDDTHHMMSSZ)
             if isinstance(start_time, str):
-                from datetime import datetime
-                dt = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                formatted_time = dt.strftime('%Y%m%dT%H%M%SZ')
-            else:
-                formatted_time = start_time.strftime('%Y%m%dT%H%M%SZ')
-            
-            # Calculate end time (1 hour later by default)
-            from datetime import datetime, timedelta
-            if isinstance(start_time, str):
-                dt = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                end_dt = dt + timedelta(hours=1)
-            else:
-                end_dt = start_time + timedelta(hours=1)
-            end_time = end_dt.strftime('%Y%m%dT%H%M%SZ')
-            
-            # Modify URL for playback
-            if "Streaming/Channels" in url:
-                url = url.replace("Streaming/Channels/101", f"Streaming/tracks/101?starttime={formatted_time}&endtime={end_time}")
+                start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+            # Play up to 1 hour; trick-play reopens the URL at later start times
+            source = PlaybackSource(self, start_time, timedelta(hours=1))
+            url, _ = source(0.0)
             print(f"Playing recorded footage from timestamp: {start_time}")
         
         print(f"Trying to open RTSP stream for {self.name}: {url}")
-        cap = cv2.VideoCapture(url)
-        if not cap.isOpened():
+        cap, lease = open_capture(url, PLAYBACK if start_time else LIVE, timeout=SESSION_WAIT)
+        if cap is None:
             print(f"Cannot open stream for {self.name}.")
             print("Possible reasons:")
             print("- RTSP URL is incorrect or unreachable")
@@ -62,26 +68,39 @@ class DVR:
         
         stream_type = "recorded footage" if start_time else "live stream"
         print(f"Successfully connected to {self.name} {stream_type}. Press 'q' to quit.")
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("Failed to grab frame. Stream may have ended or connection lost.")
-                break
-            cv2.imshow(f"{self.name} RTSP Stream", frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        if source is not None:
+            play_window(TrickPlayer(self.name, source, cap, lease), f"{self.name} RTSP Stream", sink=sink)
+            return
+        sink = sink or HighGuiSink(autosize=True)
+        sink.open(f"{self.name} RTSP Stream")
+        latency = LiveLatencyController(max_latency) if not start_time and max_latency else None
+        try:
+            while True:
+                ret, frame = latency.read(cap) if latency else cap.read()
+                if not ret:
+                    print("Failed to grab frame. Stream may have ended or connection lost.")
+                    break
+                if sink.show(frame) == ord('q'):
+                    break
+        except KeyboardInterrupt:
+            pass
         cap.release()
-        cv2.destroyAllWindows()
+        lease.release()
+        sink.close()
 
     @staticmethod
     def from_dict(d):
-        return DVR(d['name'], d['ip'], d['username'], d['password'], d['rtsp_url'])
+        return DVR(d['name'], d['ip'], d['username'], d['password'], d['rtsp_url'], d.get('brand'))
 
 class DVRManager:
     def __init__(self, config_path):
         with open(config_path, 'r') as f:
             config = json.load(f)
         self.dvrs = [DVR.from_dict(dvr) for dvr in config['dvrs']]
+        for dvr, d in zip(self.dvrs, config['dvrs']):
+            # Explicit max_sessions wins over the brand's default budget
+            limit = d.get('max_sessions') or brand_for(dvr).capabilities.max_sessions
+            sessions.set_limit(host_of(dvr.rtsp_url), limit)
 
     def get_dvr(self, name):
         for dvr in self.dvrs:
@@ -129,26 +148,28 @@ class MultiCameraPlayer:
         channel_count = detected if isinstance(detected, int) and detected > 0 else max_channels
         channel_count = min(channel_count, max_channels)
         # Use sub-streams to reduce bandwidth (102, 202, ...)
-        channel_ids = [i * 100 + 2 for i in range(1, channel_count + 1)]
+        stream = brand_for(dvr).stream_id(use_substream=True)
+        channel_ids = [i * 100 + stream for i in range(1, channel_count + 1)]
 
         expanded = []
         for channel_id in channel_ids:
             rtsp_url = re.sub(r"Streaming/Channels/\d+", f"Streaming/Channels/{channel_id}", dvr.rtsp_url)
             name = f"{dvr.name}-CH{channel_id//100}"
-            expanded.append(DVR(name, dvr.ip, dvr.username, dvr.password, rtsp_url))
+            expanded.append(DVR(name, dvr.ip, dvr.username, dvr.password, rtsp_url, dvr.brand))
         return expanded
 
     def _detect_channel_count(self, dvr):
         """Best-effort channel count detection using ONVIF profiles.
         Returns an integer or None when not available.
         """
+        from onvif_pool import get_pool
+        pool = get_pool()
         try:
-            from onvif import ONVIFCamera
-            cam = ONVIFCamera(dvr.ip, 80, dvr.username, dvr.password)
-            media = cam.create_media_service()
-            profiles = media.GetProfiles()
+            client = pool.get(dvr.ip, 80, dvr.username, dvr.password)
+            profiles = client.media.GetProfiles()
             return len(profiles) if profiles else None
         except Exception:
+            pool.invalidate(dvr.ip, 80, dvr.username, dvr.password)
             return None
     
     def get_playback_url(self, camera, start_time=None):
@@ -179,18 +200,18 @@ class MultiCameraPlayer:
         
         return url
     
-    def capture_camera(self, camera, start_time=None):
-        """Capture frames from a single camera"""
+    def capture_camera(self, camera, start_time=None, sink=None):
+        """Capture frames from a single camera into its own window (or ``sink``)"""
         url = self.get_playback_url(camera, start_time)
         print(f"Connecting to {camera.name}: {url}")
         
-        cap = cv2.VideoCapture(url)
-        if not cap.isOpened():
+        cap, lease = open_capture(url, PLAYBACK if start_time else LIVE, timeout=SESSION_WAIT)
+        if cap is None:
             print(f"Cannot open stream for {camera.name}")
             return
         
-        window_name = f"{camera.name} - {camera.ip}"
-        cv2.namedWindow(window_name, cv2.WINDOW_AUTOSIZE)
+        sink = sink or HighGuiSink(autosize=True)
+        sink.open(f"{camera.name} - {camera.ip}")
         
         while self.running:
             ret, frame = cap.read()
@@ -207,19 +228,57 @@ class MultiCameraPlayer:
                 new_height = int(height * scale)
                 frame = cv2.resize(frame, (new_width, new_height))
             
-            cv2.imshow(window_name, frame)
-            
             # Check for quit key
-            key = cv2.waitKey(1) & 0xFF
+            key = sink.show(frame)
             if key == ord('q'):
                 self.running = False
                 break
         
         cap.release()
-        cv2.destroyWindow(window_name)
+        lease.release()
+        sink.close()
     
-    def play_all_cameras(self, start_time=None):
-        """Play all cameras simultaneously"""
+    def record_camera(self, camera, out_dir, segment_seconds=300, max_segment_mb=None, fmt='ts'):
+        """Record a camera's encoded stream into rolling segments without decoding.
+
+        Returns the started SegmentRecorder; call stop() on it to finish.
+        """
+        from archive_index import open_index
+        from recorder import SegmentRecorder
+
+        max_bytes = int(max_segment_mb * 1024 * 1024) if max_segment_mb else None
+        camera_dir = os.path.join(out_dir, camera.name)
+        os.makedirs(camera_dir, exist_ok=True)
+        index = open_index(camera_dir)
+        return SegmentRecorder(camera.name, camera.rtsp_url, camera_dir,
+                               segment_seconds=segment_seconds, max_segment_bytes=max_bytes, fmt=fmt,
+                               on_segment=index.add_segment).start()
+
+    def record_all_cameras(self, out_dir, segment_seconds=300, max_segment_mb=None, fmt='ts'):
+        """Record every camera until Ctrl+C, one FFmpeg remux process per channel."""
+        if not self.cameras:
+            self.setup_cameras()
+        if not self.cameras:
+            print("No cameras available!")
+            return
+        recorders = [self.record_camera(camera, out_dir, segment_seconds, max_segment_mb, fmt)
+                     for camera in self.cameras]
+        print(f"Recording {len(recorders)} cameras to {out_dir}. Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        for recorder in recorders:
+            recorder.stop()
+        print("All recordings stopped.")
+
+    def play_all_cameras(self, start_time=None, sink=None):
+        """Play all cameras simultaneously, one window each.
+
+        ``sink`` is a callable returning the sink for a camera (see
+        sinks.py), e.g. ``lambda camera: NullSink()`` on a headless node.
+        """
         if not self.cameras:
             self.setup_cameras()
         
@@ -238,7 +297,8 @@ class MultiCameraPlayer:
         
         # Start capture thread for each camera
         for camera in self.cameras:
-            thread = threading.Thread(target=self.capture_camera, args=(camera, start_time))
+            thread = threading.Thread(target=self.capture_camera,
+                                      args=(camera, start_time, sink(camera) if sink else None))
             thread.daemon = True
             thread.start()
             self.capture_threads.append(thread)
@@ -247,13 +307,18 @@ class MultiCameraPlayer:
         for thread in self.capture_threads:
             thread.join()
         
-        cv2.destroyAllWindows()
         print("All camera streams stopped.")
 
-    def play_all_cameras_grid(self, start_time=None):
+    def play_all_cameras_grid(self, start_time=None, layout=None, sink=None):
         """Play streams from all cameras in a single window arranged in a grid.
 
         If start_time is provided, attempts recorded playback; otherwise live.
+        Recorded streams share a playback clock so every cell shows the same
+        moment (keys 1/2/4/8 change speed, space pauses).
+        A live layout of '1+5' or '1+7' enlarges the most active camera and
+        switches it to its main stream (see focus.py).
+        A ``sink`` receives the grid instead of a window, e.g. a NullSink on
+        a headless node (see sinks.py).
         """
         if not self.cameras:
             self.setup_cameras()
@@ -262,26 +327,38 @@ class MultiCameraPlayer:
             print("No cameras available!")
             return
 
+        if layout and not start_time:
+            from focus import focus_play
+            focus_play(self.cameras, layout=layout, sink=sink)
+            return
+
         # Open a capture for each camera (limit to first 4 to avoid bandwidth issues)
         captures = []
+        leases = []
+        clock = PlaybackClock() if start_time else None
+        if isinstance(start_time, str):
+            start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
         for camera in self.cameras[:4]:
             # Use playback URL if timestamp, otherwise live
-            url = self.get_playback_url(camera, start_time) if start_time else camera.rtsp_url
-            cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
-            if not cap.isOpened():
+            source = None
+            url = camera.rtsp_url
+            if start_time:
+                # Faster speeds reopen the recording further on (the DVR serves it at 1x)
+                source = PlaybackSource(camera, start_time, timedelta(hours=1))
+                url, _ = source(0.0)
+            cap, lease = open_capture(url, PLAYBACK if start_time else LIVE, timeout=SESSION_WAIT)
+            if cap is None:
                 print(f"Cannot open stream for {camera.name}")
+                continue
+            if start_time:
+                cap = ClockedCapture(camera.name, url, clock, cap=cap, source_at=source)
             captures.append((camera, cap))
+            leases.append(lease)
 
-        # Filter to only opened caps
-        captures = [(cam, cap) for cam, cap in captures if cap.isOpened()]
         if not captures:
             print("No camera streams could be opened.")
             return
 
-        window_name = "All Cameras - Grid"
-        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-        cv2.resizeWindow(window_name, 1280, 720)
-
         # Determine grid size (up to 2x2, 3x3, etc.)
         num_streams = len(captures)
         # Simple heuristic for rows/cols close to square
@@ -292,63 +369,53 @@ class MultiCameraPlayer:
         target_cell_width = 640
         target_cell_height = 360
 
+        from frame_pool import FramePool
+        from scalable_player import fit_tile_into
+
         print(f"Showing {num_streams} cameras in a {rows}x{cols} grid. Press 'q' to quit.")
+        sink = sink or HighGuiSink()
+        sink.open("All Cameras - Grid")
 
-        while True:
-            frames = []
-            for cam, cap in captures:
-                ret, frame = cap.read()
-                if not ret or frame is None:
-                    frame_padded = np.zeros((target_cell_height, target_cell_width, 3), dtype=np.uint8)
-                    cv2.putText(frame_padded, f"No Frame: {cam.name}", (10, target_cell_height // 2), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2, cv2.LINE_AA)
-                    frames.append(frame_padded)
-                    continue
-                # Resize to cell size keeping aspect
-                h, w = frame.shape[:2]
-                scale = min(target_cell_width / max(w, 1), target_cell_height / max(h, 1))
-                new_w = max(1, int(w * scale))
-                new_h = max(1, int(h * scale))
-                frame_resized = cv2.resize(frame, (new_w, new_h))
-                # Pad to cell size
-                top = (target_cell_height - new_h) // 2
-                bottom = target_cell_height - new_h - top
-                left = (target_cell_width - new_w) // 2
-                right = target_cell_width - new_w - left
-                frame_padded = cv2.copyMakeBorder(frame_resized, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(20, 20, 20))
-                # Add a small label
-                cv2.putText(frame_padded, cam.name, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2, cv2.LINE_AA)
-                frames.append(frame_padded)
-
-            # Build grid canvas
-            # Fill missing cells with black frames if needed
-            try:
-                import numpy as np
-                while len(frames) < rows * cols:
-                    frames.append(np.zeros((target_cell_height, target_cell_width, 3), dtype=np.uint8))
-            except Exception:
-                pass
-
-            # Assemble rows
-            grid_rows = []
-            idx = 0
-            for r in range(rows):
-                row_frames = frames[idx:idx + cols]
-                idx += cols
-                row = cv2.hconcat(row_frames)
-                grid_rows.append(row)
-            grid = cv2.vconcat(grid_rows)
-
-            cv2.imshow(window_name, grid)
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                break
+        # Decode into per-camera buffers and scale straight into the grid cells
+        pools = [FramePool(depth=1) for _ in captures]
+        grid = np.zeros((rows * target_cell_height, cols * target_cell_width, 3), dtype=np.uint8)
+        cells = [grid[r * target_cell_height:(r + 1) * target_cell_height,
+                      c * target_cell_width:(c + 1) * target_cell_width]
+                 for r in range(rows) for c in range(cols)]
+        if clock is not None:
+            clock.start()
+
+        try:
+            while True:
+                for i, (cam, cap) in enumerate(captures):
+                    ret, frame = pools[i].read(cap)
+                    if ret and frame is None and clock is not None:
+                        # Ahead of the playback clock: keep the previous tile
+                        continue
+                    if not ret or frame is None:
+                        cells[i][:] = overlays.placeholder(cam.name, target_cell_width, target_cell_height)
+                        continue
+                    fit_tile_into(cells[i], frame, cam.name)
+
+                key = sink.show(grid)
+                if key == ord('q'):
+                    break
+                if clock is not None:
+                    clock.handle_key(key)
+        except KeyboardInterrupt:
+            pass
 
         for _, cap in captures:
             cap.release()
-        cv2.destroyWindow(window_name)
+        for lease in leases:
+            lease.release()
+        sink.close()
+
+    def play_single_camera_live(self, camera_name=None, max_latency=DEFAULT_MAX_LATENCY, sink=None):
+        """Play a single camera live stream in one window (or ``sink``).
 
-    def play_single_camera_live(self, camera_name=None):
-        """Play a single camera live stream in one window."""
+        Stale frames are skipped to keep the view within max_latency seconds.
+        """
         if not self.cameras:
             self.setup_cameras()
         cams = self.cameras
@@ -368,22 +435,28 @@ class MultiCameraPlayer:
 
         url = cam.rtsp_url
         print(f"Opening live stream for {cam.name}: {url}")
-        cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
-        if not cap.isOpened():
+        cap, lease = open_capture(url, LIVE, timeout=SESSION_WAIT)
+        if cap is None:
             print(f"Cannot open stream for {cam.name}")
             return
-        window_name = f"{cam.name} - Live"
-        cv2.namedWindow(window_name, cv2.WINDOW_AUTOSIZE)
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("Failed to grab frame.")
-                break
-            cv2.imshow(window_name, frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        sink = sink or HighGuiSink(autosize=True)
+        sink.open(f"{cam.name} - Live")
+        latency = LiveLatencyController(max_latency) if max_latency else None
+        try:
+            while True:
+                ret, frame = latency.read(cap) if latency else cap.read()
+                if not ret:
+                    print("Failed to grab frame.")
+                    break
+                if sink.show(frame) == ord('q'):
+                    break
+        except KeyboardInterrupt:
+            pass
+        if latency and latency.dropped:
+            print(f"Dropped {latency.dropped} stale frames to stay within {max_latency}s of live.")
         cap.release()
-        cv2.destroyWindow(window_name)
+        lease.release()
+        sink.close()
     
     def show_day_highlights(self, date_str):
         """Show highlights from all cameras for a specific day"""
@@ -425,7 +498,33 @@ class MultiCameraPlayer:
         except ValueError:
             print("Invalid date format! Use YYYY-MM-DD (e.g., 2025-01-11)")
     
+    def serve_http(self, host='0.0.0.0', port=8080, hls_cache='hls_cache'):
+        """Serve every camera as /snapshot/<name> and /mjpeg/<name> over HTTP.
+
+        Recorded clips play in a browser at /play/<name>/<start>/<seconds>
+        (HLS, cached under hls_cache; see hls.py).
+        """
+        from hls import HlsCache, HlsSegmenter
+        from mjpeg_server import serve
+
+        if not self.cameras:
+            self.setup_cameras()
+        serve([(camera.name, camera.rtsp_url) for camera in self.cameras], host=host, port=port,
+              hls=HlsSegmenter(self.cameras, HlsCache(hls_cache)))
+
+    def frame_batches(self, size=(640, 360), color='bgr', fps=10.0, **kwargs):
+        """``FrameBatcher`` over every camera, for batched ML inference.
+
+        Iterate it (``for batch in player.frame_batches()``) or pass a
+        callback to its ``start()``; call ``stop()`` when done.
+        """
+        from frame_batch import FrameBatcher
+
+        if not self.cameras:
+            self.setup_cameras()
+        return FrameBatcher([(camera.name, camera.rtsp_url) for camera in self.cameras],
+                            size=size, color=color, fps=fps, **kwargs)
+
     def stop_all(self):
-        """Stop all camera streams"""
+        """Stop all camera streams (each closes its own window or sink)"""
         self.running = False
-        cv2.destroyAllWindows()
@@ -1,4 +1,5 @@
 from dvr_api import DVRManager, MultiCameraPlayer
+from sinks import make_sink
 from datetime import datetime
 import sys
 
@@ -33,17 +34,31 @@ if __name__ == "__main__":
     print("Available DVRs:", manager.list_dvrs())
     multi_player.setup_cameras()
     
+    # --headless / --sink SPEC send the video to a sink instead of a window (see sinks.py);
+    # --output TARGET [--output-fps N] [--output-bitrate B] also encode it as one stream
+    options = {}
+    for flag in ('--sink', '--output', '--output-fps', '--output-bitrate'):
+        if flag in sys.argv:
+            idx = sys.argv.index(flag)
+            options[flag] = sys.argv[idx + 1] if idx + 1 < len(sys.argv) else None
+            del sys.argv[idx:idx + 2]
+    headless = '--headless' in sys.argv
+    if headless:
+        sys.argv.remove('--headless')
+    sink = make_sink(options.get('--sink'), headless=headless, output=options.get('--output'),
+                     fps=float(options.get('--output-fps') or 15), bitrate=options.get('--output-bitrate') or '4M')
+
     # Command line mode
     if len(sys.argv) > 1:
         if sys.argv[1] == "live":
             print("Playing live stream from all cameras (grid)...")
-            multi_player.play_all_cameras_grid()
+            multi_player.play_all_cameras_grid(sink=sink)
         elif sys.argv[1] == "timestamp" and len(sys.argv) > 2:
             timestamp_str = sys.argv[2]
             start_time = parse_timestamp(timestamp_str)
             if start_time:
                 print(f"Playing recorded footage from all cameras at {start_time} (grid)...")
-                multi_player.play_all_cameras_grid(start_time)
+                multi_player.play_all_cameras_grid(start_time, sink=sink)
         elif sys.argv[1] == "highlights" and len(sys.argv) > 2:
             date_str = sys.argv[2]
             multi_player.show_day_highlights(date_str)
@@ -67,7 +82,7 @@ if __name__ == "__main__":
             else:
                 print(f"Playing live stream for {dvr.name}")
             
-            dvr.play_stream(start_time)
+            dvr.play_stream(start_time, sink=sink)
     else:
         # Interactive mode
         while True:
@@ -1,13 +1,27 @@
-from onvif import ONVIFCamera
 import datetime
-import cv2
+
+from lazy_imports import lazy_module
+from onvif_pool import get_client
+
+cv2 = lazy_module('cv2')
 
 class DVR_ONVIF:
     def __init__(self, ip, port, username, password):
-        self.camera = ONVIFCamera(ip, port, username, password)
-        self.media_service = self.camera.create_media_service()
-        self.replay_service = self.camera.create_replay_service()
-        self.search_service = self.camera.create_search_service()
+        # Clients (and their WSDL-backed service proxies) are shared per DVR
+        self.client = get_client(ip, port, username, password)
+        self.camera = self.client.camera
+
+    @property
+    def media_service(self):
+        return self.client.media
+
+    @property
+    def replay_service(self):
+        return self.client.replay
+
+    @property
+    def search_service(self):
+        return self.client.search
 
     def get_playback_uri(self, channel=1, start_time=None):
         # This is a simplified example. Actual ONVIF search may require more parameters.
@@ -0,0 +1,230 @@
+"""Event-triggered focus layouts (1+5, 1+7) for the live grid.
+
+The focused camera fills the large cell and is switched to its main (x01)
+stream, as named by the brand channel scheme. Every other camera stays on
+its sub-stream at a low rate (keyframes only when FFmpeg is available).
+The stream that matters gets full detail while the total decode cost
+stays about the same as a plain sub-stream grid.
+
+Focus follows the motion scores from the batched detector, or an external
+event passed to ``FocusScheduler.trigger(name)`` (e.g. from an ML model).
+
+Only as many cameras as the layout has cells are opened (6 for 1+5, 8 for
+1+7), so a 16-channel DVR is not asked for 16 sessions. The rest take turns:
+every ``rotate_seconds`` the small cell that has been quiet longest is
+closed and the next waiting camera is opened in its place. A triggered
+camera that is not open is swapped in straight away.
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from adaptive_rate import AdaptiveCapture, AdaptiveRateScheduler
+from brands.factory import brand_for
+from lazy_imports import lazy_module
+from sessions import LIVE, host_of, sessions
+from sinks import HighGuiSink
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+# layout -> (grid units per side, units spanned by the focus cell, small cells as (row, col))
+LAYOUTS = {
+    '1+5': (3, 2, [(0, 2), (1, 2), (2, 0), (2, 1), (2, 2)]),
+    '1+7': (4, 3, [(0, 3), (1, 3), (2, 3), (3, 0), (3, 1), (3, 2), (3, 3)]),
+}
+ROTATE_SECONDS = 10.0
+SESSION_WAIT = 10.0
+SWAP_WAIT = 2.0
+
+
+class FocusScheduler(AdaptiveRateScheduler):
+    """Keeps exactly one camera (the focus) at full rate on its main stream.
+
+    An external ``trigger`` takes over immediately. Otherwise focus moves to
+    the camera with the strongest motion once the current focus has been
+    held for ``hold_seconds``.
+    """
+
+    def __init__(self, idle_fps: float = 2.0, min_score: float = 0.02, hold_seconds: float = 10.0, **kwargs):
+        super().__init__(idle_fps=idle_fps, min_score=min_score, hold_seconds=hold_seconds, **kwargs)
+        self.focused: Optional[str] = None
+        self._focus_since = 0.0
+        self._triggers: Dict[str, float] = {}
+        # trigger() runs on the caller's thread, the rest on the grid loop
+        self._triggers_lock = threading.Lock()
+
+    def trigger(self, name: str):
+        """Promote ``name`` to focus, e.g. when an ML event fires for it (from any thread)."""
+        with self._triggers_lock:
+            self._triggers[name] = time.monotonic()
+
+    def _triggered(self) -> List[tuple]:
+        """(time, name) of triggers since the last focus change."""
+        with self._triggers_lock:
+            return [(t, n) for n, t in self._triggers.items() if t > self._focus_since]
+
+    def is_active(self, name: str, now: Optional[float] = None) -> bool:
+        return name == self.focused
+
+    def _set_focus(self, name: str, now: float):
+        if name != self.focused:
+            print(f"Focus: {name}")
+        self.focused = name
+        self._focus_since = now
+
+    def process(self, names: List[str], frames: List[object]):
+        super().process(names, frames)
+        now = time.monotonic()
+        if self.focused is None and names:
+            self._set_focus(names[0], now)
+        triggered = [(t, n) for t, n in self._triggered() if n in names]
+        if triggered:
+            self._set_focus(max(triggered)[1], now)
+            return
+        if now - self._focus_since < self.hold_seconds:
+            return
+        scores = {n: s for n, s in self.detector.scores.items() if s >= self.min_score}
+        if scores:
+            best = max(scores, key=scores.get)
+            if best != self.focused and scores[best] > scores.get(self.focused, 0.0):
+                self._set_focus(best, now)
+
+    def ranking(self, names: List[str]) -> List[str]:
+        """Non-focused cameras, most recently active first."""
+        others = [n for n in names if n != self.focused]
+        return sorted(others, key=lambda n: -self._last_motion.get(n, 0.0))
+
+    def last_active(self, name: str) -> float:
+        return self._last_motion.get(name, 0.0)
+
+    def pending(self, names: List[str]) -> List[str]:
+        """Cameras triggered since the last focus change that are not in ``names``, newest first."""
+        waiting = [(t, n) for t, n in self._triggered() if n not in names]
+        return [n for _, n in sorted(waiting, reverse=True)]
+
+    def drop_trigger(self, name: str):
+        with self._triggers_lock:
+            self._triggers.pop(name, None)
+
+
+def focus_play(cameras: List, layout: str = '1+5', scheduler: Optional[FocusScheduler] = None,
+               canvas_size: tuple = (1920, 1080), sink=None, rotate_seconds: float = ROTATE_SECONDS):
+    """Show cameras in a focus layout until 'q' is pressed.
+
+    ``cameras`` are DVRInfo-like objects on their sub-stream URL. Pass your
+    own ``scheduler`` to call ``scheduler.trigger(name)`` from other threads.
+    ``sink`` replaces the window (see ``sinks``). Cameras beyond the
+    layout's cells are rotated in every ``rotate_seconds``.
+    """
+    from scalable_player import fit_tile, placeholder_tile
+
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}', expected one of {sorted(LAYOUTS)}")
+    if not cameras:
+        print("No cameras available!")
+        return
+    units, span, small_cells = LAYOUTS[layout]
+    width, height = canvas_size
+    unit_w, unit_h = width // units, height // units
+    big_w, big_h = unit_w * span, unit_h * span
+    scheduler = scheduler or FocusScheduler(cell_size=(unit_w, unit_h))
+    slots = 1 + len(small_cells)
+
+    by_name = {cam.name: cam for cam in cameras}
+    caps: Dict[str, tuple] = {}  # name -> (capture, opened at)
+    names: List[str] = []
+    waiting = deque()
+    busy = set()
+    latest: Dict[str, object] = {}
+    tiles: Dict[tuple, object] = {}
+
+    def open_camera(cam, timeout: float) -> bool:
+        # One session per camera, owned by its capture as it moves between sub and main stream
+        lease = sessions.acquire(cam.rtsp_url, LIVE, timeout=timeout)
+        if lease is None:
+            return False
+        main = brand_for(cam).build_stream_url(cam, use_substream=False)
+        caps[cam.name] = (scheduler.wrap(cam.name, cam.rtsp_url, None, lease, active_url=main), time.monotonic())
+        names.append(cam.name)
+        return True
+
+    def close_camera(name: str):
+        cap, _ = caps.pop(name)
+        names.remove(name)
+        cap.release()
+        latest.pop(name, None)
+        for key in [k for k in tiles if k[0] == name]:
+            del tiles[key]
+
+    for cam in cameras:
+        if len(caps) >= slots:
+            waiting.append(cam)
+            continue
+        # Don't wait again on a DVR that already had no free session
+        host = host_of(cam.rtsp_url)
+        if not open_camera(cam, 0.0 if host in busy else SESSION_WAIT):
+            busy.add(host)
+            print(f"No free session for {cam.name}; it will be rotated in later")
+            waiting.append(cam)
+
+    sink = sink or HighGuiSink()
+    sink.open(f"All Cameras - Focus {layout}")
+    canvas = np.zeros((unit_h * units, unit_w * units, 3), dtype=np.uint8)
+    print(f"Showing {len(caps)} of {len(cameras)} cameras in a {layout} focus layout"
+          + (f", rotating every {rotate_seconds:g}s" if waiting else '') + ". Press 'q' to quit.")
+
+    def tile(name: str, w: int, h: int, label: str):
+        key = (name, w, h)
+        if key not in tiles:
+            frame = latest.get(name)
+            tiles[key] = fit_tile(frame, label, w, h) if frame is not None else placeholder_tile(name, w, h)
+        return tiles[key]
+
+    def rotate(cam):
+        """Swap the quietest small cell (shown longest without motion) for ``cam``."""
+        waiting.remove(cam)
+        others = scheduler.ranking(names)
+        if len(caps) >= slots and others:
+            quiet = min(others, key=lambda n: max(scheduler.last_active(n), caps[n][1]))
+            close_camera(quiet)
+            waiting.append(by_name[quiet])
+        if not open_camera(cam, SWAP_WAIT):
+            print(f"No free session for {cam.name}; it will be rotated in later")
+            scheduler.drop_trigger(cam.name)
+            waiting.append(cam)
+
+    rotate_at = time.monotonic() + rotate_seconds
+    try:
+        while True:
+            raw = []
+            for name in names:
+                ret, frame = caps[name][0].read()
+                raw.append(frame if ret else None)
+                if ret and frame is not None:
+                    latest[name] = frame
+                    # Drop cached tiles so they are rebuilt from the new frame
+                    for key in [k for k in tiles if k[0] == name]:
+                        del tiles[key]
+            scheduler.process(names, raw)
+
+            now = time.monotonic()
+            triggered = [n for n in scheduler.pending(names) if n in by_name]
+            if triggered or (waiting and now >= rotate_at):
+                rotate(by_name[triggered[0]] if triggered else waiting[0])
+                rotate_at = now + rotate_seconds
+
+            canvas[:] = 0
+            focused = scheduler.focused
+            if focused is not None and focused in caps:
+                canvas[:big_h, :big_w] = tile(focused, big_w, big_h, f"{focused} (main)")
+            for (r, c), name in zip(small_cells, scheduler.ranking(names)):
+                canvas[r * unit_h:(r + 1) * unit_h, c * unit_w:(c + 1) * unit_w] = tile(name, unit_w, unit_h, name)
+            if sink.show(canvas) == ord('q'):
+                break
+    except KeyboardInterrupt:
+        pass
+    for name in list(caps):
+        close_camera(name)
+    sink.close()
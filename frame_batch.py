@@ -0,0 +1,180 @@
+"""Batched frame delivery for ML consumers.
+
+Detectors run best on batches, and building ``(N, H, W, 3)`` arrays from
+per-camera frames in Python costs copies and loops. ``FrameBatcher`` keeps
+one shared ``CameraStream`` per camera and, for every batch, scales each
+camera's newest frame straight into its slot of a preallocated array.
+Colour conversion happens in place in that slot. Batches come from a ring
+of ``buffers`` arrays, so a consumer can work on one batch while the next
+is filled.
+
+Use it as an iterator (``for batch in batcher``) or with a callback
+(``batcher.start(callback)`` ... ``batcher.stop()``).
+"""
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from capture import StreamHub
+from frame_pool import resize_into
+from lazy_imports import lazy_module
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+COLORS = ('bgr', 'rgb', 'gray')
+
+
+class FrameBatch:
+    """One batch across cameras.
+
+    ``frames[i]`` belongs to camera ``names[i]`` (id ``ids[i]``) and was
+    captured at wall time ``timestamps[i]``. ``fresh[i]`` is False when
+    the camera had no new frame since the previous batch and the slot
+    repeats its last frame (or is zero if it never had one).
+    """
+
+    __slots__ = ('frames', 'timestamps', 'ids', 'names', 'fresh', 'seq')
+
+    def __init__(self, frames, timestamps, ids, names: List[str], fresh, seq: int):
+        self.frames = frames
+        self.timestamps = timestamps
+        self.ids = ids
+        self.names = names
+        self.fresh = fresh
+        self.seq = seq
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class FrameBatcher:
+    """Deliver the latest frame of every camera as one ``(N, H, W, C)`` array.
+
+    ``size`` is (width, height) of each slot. With ``letterbox`` frames keep
+    their aspect ratio and are padded, otherwise they are stretched.
+    ``color`` is 'bgr', 'rgb' or 'gray' (gray batches are ``(N, H, W)``).
+    At most ``fps`` batches are produced per second, and only once
+    ``min_fresh`` cameras have a new frame.
+    """
+
+    def __init__(self, urls_with_names: List[tuple], size: Tuple[int, int] = (640, 360), color: str = 'bgr',
+                 letterbox: bool = True, fps: float = 10.0, min_fresh: int = 1, buffers: int = 2,
+                 hub: Optional[StreamHub] = None):
+        if color not in COLORS:
+            raise ValueError(f"Unknown color '{color}', expected one of {COLORS}")
+        self.names = [name for name, _ in urls_with_names]
+        self.size = size
+        self.color = color
+        self.letterbox = letterbox
+        self.fps = fps
+        self.min_fresh = max(1, min_fresh)
+        self.hub = hub or StreamHub(urls_with_names)
+        n, (w, h) = len(self.names), size
+        shape = (n, h, w) if color == 'gray' else (n, h, w, 3)
+        self._frames = [np.zeros(shape, dtype=np.uint8) for _ in range(max(1, buffers))]
+        self._timestamps = [np.zeros(n, dtype=np.float64) for _ in self._frames]
+        self._fresh = [np.zeros(n, dtype=bool) for _ in self._frames]
+        self._ids = np.arange(n, dtype=np.int32)
+        # Gray slots need a colour scratch tile to scale into first
+        self._scratch = np.empty((h, w, 3), dtype=np.uint8) if color == 'gray' else None
+        self._seen = [0] * n
+        # Camera seq held by each slot of each ring buffer
+        self._held = [[0] * n for _ in self._frames]
+        self._seq = 0
+        self._last = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def _scale(self, frame, dst):
+        if self.letterbox:
+            return resize_into(dst, frame)
+        return cv2.resize(frame, (dst.shape[1], dst.shape[0]), dst=dst)
+
+    def _fill(self, slot: int, frame, buf: int):
+        dst = self._frames[buf][slot]
+        if self.color == 'gray':
+            tile = self._scale(frame, self._scratch)
+            cv2.cvtColor(tile, cv2.COLOR_BGR2GRAY, dst=dst)
+            return
+        self._scale(frame, dst)
+        if self.color == 'rgb':
+            cv2.cvtColor(dst, cv2.COLOR_BGR2RGB, dst=dst)
+
+    def _collect(self) -> List[tuple]:
+        """(slot, seq, frame, ts) for every camera with a frame newer than the last batch."""
+        fresh = []
+        for i, name in enumerate(self.names):
+            stream = self.hub.get(name)
+            stream.touch()
+            seq, frame, ts = stream.latest()
+            if frame is not None and seq != self._seen[i]:
+                fresh.append((i, seq, frame, ts))
+        return fresh
+
+    def next_batch(self, timeout: Optional[float] = None) -> Optional[FrameBatch]:
+        """Block until a batch is due; None if ``timeout`` passes first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self.fps > 0:
+            wait = self._last + 1.0 / self.fps - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        while True:
+            fresh = self._collect()
+            if len(fresh) >= min(self.min_fresh, len(self.names)):
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(0.005)
+        self._last = time.monotonic()
+        prev = self._seq % len(self._frames)
+        self._seq += 1
+        buf = self._seq % len(self._frames)
+        frames, timestamps, mask, held = self._frames[buf], self._timestamps[buf], self._fresh[buf], self._held[buf]
+        mask[:] = False
+        for slot, _, _, _ in fresh:
+            # Held so the capture thread cannot decode into the frame while it is scaled
+            with self.hub.get(self.names[slot]).hold() as (seq, frame, ts):
+                if frame is None:
+                    continue
+                self._fill(slot, frame, buf)
+            timestamps[slot] = ts
+            mask[slot] = True
+            self._seen[slot] = held[slot] = seq
+        if buf != prev:
+            # Cameras without a new frame repeat their newest one, copied
+            # from the previous batch only if this buffer holds an older one
+            for slot in range(len(self.names)):
+                if not mask[slot] and held[slot] != self._seen[slot]:
+                    frames[slot] = self._frames[prev][slot]
+                    timestamps[slot] = self._timestamps[prev][slot]
+                    held[slot] = self._seen[slot]
+        return FrameBatch(frames, timestamps, self._ids, self.names, mask, self._seq)
+
+    def __iter__(self):
+        while True:
+            batch = self.next_batch()
+            if batch is not None:
+                yield batch
+
+    def start(self, callback: Callable[[FrameBatch], None]):
+        """Call ``callback(batch)`` for every batch on a background thread."""
+        self._running = True
+
+        def run():
+            while self._running:
+                batch = self.next_batch(timeout=1.0)
+                if batch is not None and self._running:
+                    callback(batch)
+
+        self._thread = threading.Thread(target=run, name='frame-batcher')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.hub.stop_all()
@@ -0,0 +1,101 @@
+"""Preallocated frame buffers for capture and tile scaling.
+
+``cap.read()``, ``cv2.resize`` and ``copyMakeBorder`` allocate a new array
+for every frame of every camera. ``FramePool`` keeps a small ring of frames
+per camera and decodes into them with ``cap.read(image=buf)``, and
+``resize_into`` letterboxes a frame straight into a destination view (a
+grid cell of the canvas, or a shared-memory tile), so steady-state
+playback allocates no frame-sized arrays.
+
+A frame returned by ``FramePool.read`` is reused ``depth`` reads later.
+With the default depth of 3 a consumer thread can work on the published
+frame while the capture thread decodes into the next buffer. A consumer
+that may take longer ``pin()``s the frame: when the ring comes round to a
+pinned buffer it is left to the consumer and a new one takes its place.
+"""
+import threading
+from typing import Dict, List, Optional
+
+from lazy_imports import lazy_module
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+BORDER_COLOR = (20, 20, 20)
+
+
+class FramePool:
+    """Ring of ``depth`` reusable frames for one camera."""
+
+    def __init__(self, depth: int = 3):
+        self.depth = max(1, depth)
+        self._frames: List[Optional[object]] = [None] * self.depth
+        self._idx = 0
+        self._pinned: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.allocations = 0
+
+    def pin(self, frame):
+        """Keep ``frame`` from being decoded into until ``unpin``."""
+        with self._lock:
+            self._pinned[id(frame)] = self._pinned.get(id(frame), 0) + 1
+
+    def unpin(self, frame):
+        with self._lock:
+            count = self._pinned.pop(id(frame), 0) - 1
+            if count > 0:
+                self._pinned[id(frame)] = count
+
+    def read(self, cap, latency=None):
+        """``cap.read()`` into the next buffer; returns (ok, frame).
+
+        ``latency`` is an optional ``LiveLatencyController`` to read through.
+        Captures other than ``cv2.VideoCapture`` (keyframe readers, adaptive
+        wrappers) are read normally and their frames are passed through.
+        """
+        with self._lock:
+            buf = self._frames[self._idx]
+            if buf is not None and id(buf) in self._pinned:
+                # Still held by a consumer: hand it over and decode into a new buffer
+                self._frames[self._idx] = buf = None
+        if not isinstance(cap, cv2.VideoCapture):
+            return latency.read(cap) if latency else cap.read()
+        if latency is not None:
+            ok, frame = latency.read(cap, image=buf)
+        elif buf is not None:
+            ok, frame = cap.read(image=buf)
+        else:
+            ok, frame = cap.read()
+        if not ok or frame is None:
+            return ok, frame
+        if frame is not buf:
+            # First frame, or the stream changed resolution: adopt the new array
+            self._frames[self._idx] = frame
+            self.allocations += 1
+        self._idx = (self._idx + 1) % self.depth
+        return ok, frame
+
+
+def resize_into(dst, frame, fill: tuple = BORDER_COLOR):
+    """Scale ``frame`` to fit ``dst`` keeping aspect, padding with ``fill``.
+
+    Writes in place into ``dst`` (which may be a view into a larger canvas)
+    and returns it.
+    """
+    cell_h, cell_w = dst.shape[:2]
+    h, w = frame.shape[:2]
+    scale = min(cell_w / max(w, 1), cell_h / max(h, 1))
+    nw = min(cell_w, max(1, int(w * scale))); nh = min(cell_h, max(1, int(h * scale)))
+    top = (cell_h - nh) // 2
+    left = (cell_w - nw) // 2
+    # Only the border strips are filled; the image area is written by resize
+    if top:
+        dst[:top] = fill
+    if top + nh < cell_h:
+        dst[top + nh:] = fill
+    if left:
+        dst[top:top + nh, :left] = fill
+    if left + nw < cell_w:
+        dst[top:top + nh, left + nw:] = fill
+    cv2.resize(frame, (nw, nh), dst=dst[top:top + nh, left:left + nw])
+    return dst
@@ -0,0 +1,363 @@
+"""Continuous channel health from cheap RTSP control requests.
+
+``run_list`` opens FFmpeg and decodes frames to decide whether a camera is
+alive. That costs a media session and a decoder per channel, which is fine
+once but not every few seconds for a thousand channels. ``HealthMonitor``
+uses the RTSP control channel instead:
+
+* one keep-alive TCP connection per DVR, reused across rounds
+* an ``OPTIONS`` request per DVR per round (is the DVR answering at all?)
+* a ``DESCRIBE`` request per channel on that connection (does the channel
+  exist, and does its SDP offer video?), timed as the channel's latency
+
+Digest (or Basic) challenges are answered once and then pre-emptively (see
+``snapshot.HostAuth``). DVRs are checked concurrently; channels of one DVR
+go one after another over its connection, which is what DVRs cope with
+best. No media is set up, so no session from the per-DVR budget is used.
+
+Only a change escalates to a full decode probe: a channel seen up for the
+first time, or going up or down, is opened once at PROBE priority (giving
+way to viewers) and its state is confirmed from real frames. A channel that
+answers ``DESCRIBE`` but does not decode is reported as ``no-video``. A
+probe that cannot run because viewers hold every session is retried next
+round, and a change that arrives while a probe runs is probed again.
+"""
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from brands.factory import brand_for
+from lazy_imports import lazy_module
+from sessions import PROBE, sessions
+from snapshot import HostAuth
+
+cv2 = lazy_module('cv2')
+
+RTSP_PORT = 554
+DEFAULT_INTERVAL = 5.0
+DEFAULT_TIMEOUT = 3.0
+USER_AGENT = 'dvr-health'
+PROBE_WAIT = 10.0
+
+UNKNOWN = 'unknown'
+UP = 'up'
+DOWN = 'down'
+NO_VIDEO = 'no-video'
+
+
+class RtspError(Exception):
+    pass
+
+
+class RtspConnection:
+    """Keep-alive RTSP control connection to one DVR (no media is set up)."""
+
+    def __init__(self, host: str, port: int, auth: HostAuth, timeout: float = DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.auth = auth
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+        self._cseq = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _send(self, method: str, url: str) -> Tuple[int, Dict[str, str], bytes]:
+        if self._sock is None:
+            self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self._file = self._sock.makefile('rb')
+        self._cseq += 1
+        lines = [f"{method} {url} RTSP/1.0", f"CSeq: {self._cseq}", f"User-Agent: {USER_AGENT}"]
+        if method == 'DESCRIBE':
+            lines.append('Accept: application/sdp')
+        authorization = self.auth.header(method, url)
+        if authorization:
+            lines.append(f"Authorization: {authorization}")
+        self._sock.sendall(('\r\n'.join(lines) + '\r\n\r\n').encode())
+        status_line = self._file.readline().decode('latin-1').strip()
+        parts = status_line.split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('RTSP/') or not parts[1].isdigit():
+            raise RtspError(f"Bad RTSP response: {status_line!r}")
+        headers: Dict[str, str] = {}
+        while True:
+            line = self._file.readline().decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0) or 0)
+        body = self._file.read(length) if length else b''
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return int(parts[1]), headers, body
+
+    def request(self, method: str, url: str) -> Tuple[int, Dict[str, str], bytes]:
+        """Send one request; returns (status, lower-cased headers, body).
+
+        A stale keep-alive connection is reopened once. A 401 is answered
+        once with the new challenge.
+        """
+        with self.lock:
+            for attempt in (0, 1):
+                try:
+                    status, headers, body = self._send(method, url)
+                    break
+                except (OSError, RtspError):
+                    # Never reuse a connection that may hold a late response
+                    self.close()
+                    if attempt:
+                        raise
+            if status == 401 and 'www-authenticate' in headers:
+                self.auth.update(headers['www-authenticate'])
+                status, headers, body = self._send(method, url)
+            return status, headers, body
+
+
+@dataclass
+class ChannelHealth:
+    name: str
+    url: str
+    state: str = UNKNOWN
+    rtsp_state: str = UNKNOWN
+    latency: Optional[float] = None
+    error: str = ''
+    checked: float = 0.0
+    changed: float = 0.0
+    decoded: Optional[bool] = None
+    probe_pending: bool = False
+
+
+def _split_url(url: str, username: str = '', password: str = ''):
+    """(host, port, url without credentials, username, password) for an RTSP URL."""
+    parts = urlsplit(url)
+    host = parts.hostname or ''
+    port = parts.port or RTSP_PORT
+    clean = f"rtsp://{host}:{port}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else '')
+    return host, port, clean, unquote(parts.username or '') or username, unquote(parts.password or '') or password
+
+
+class HealthMonitor:
+    """Up/down/latency table for ``cameras`` (expanded DVRInfo, one per channel).
+
+    ``on_change(health)`` is called from the monitor thread whenever a
+    channel's state changes.
+    """
+
+    def __init__(self, cameras, interval: float = DEFAULT_INTERVAL, timeout: float = DEFAULT_TIMEOUT,
+                 workers: int = 32, decode_probe: bool = True, probe_workers: int = 4,
+                 on_change: Optional[Callable[[ChannelHealth], None]] = None):
+        self.interval = interval
+        self.timeout = timeout
+        self.decode_probe = decode_probe
+        self.on_change = on_change
+        self.rounds = 0
+        self.channels: Dict[str, ChannelHealth] = {}
+        # (host, port) -> [(health, clean url)]
+        self._hosts: Dict[Tuple[str, int], List[Tuple[ChannelHealth, str]]] = {}
+        self._connections: Dict[Tuple[str, int], RtspConnection] = {}
+        for cam in cameras:
+            url = brand_for(cam).build_live_url(cam)
+            host, port, clean, username, password = _split_url(url, cam.username, cam.password)
+            health = ChannelHealth(cam.name, url)
+            self.channels[cam.name] = health
+            self._hosts.setdefault((host, port), []).append((health, clean))
+            if (host, port) not in self._connections:
+                self._connections[(host, port)] = RtspConnection(host, port, HostAuth(username, password), timeout)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(self._hosts))),
+                                        thread_name_prefix='health')
+        self._probes = ThreadPoolExecutor(max_workers=probe_workers, thread_name_prefix='health-probe')
+        self._probing = set()
+        self._rerun = set()
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    # -- checks --------------------------------------------------------------
+
+    def _check_host(self, key: Tuple[str, int]) -> List[tuple]:
+        """[(health, rtsp state, latency, error)] for every channel of one DVR."""
+        conn = self._connections[key]
+        channels = self._hosts[key]
+        results = []
+        try:
+            conn.request('OPTIONS', channels[0][1])
+        except (OSError, RtspError) as e:
+            # The DVR itself is unreachable: every channel is down
+            return [(health, DOWN, None, f"DVR unreachable: {e}") for health, _ in channels]
+        for health, url in channels:
+            start = time.monotonic()
+            try:
+                status, _, body = conn.request('DESCRIBE', url)
+            except (OSError, RtspError) as e:
+                results.append((health, DOWN, None, str(e)))
+                continue
+            latency = time.monotonic() - start
+            if status == 200 and b'm=video' in body:
+                results.append((health, UP, latency, ''))
+            elif status == 200:
+                results.append((health, NO_VIDEO, latency, 'no video in SDP'))
+            else:
+                results.append((health, DOWN, latency, f"RTSP {status}"))
+        return results
+
+    def check_once(self) -> List[ChannelHealth]:
+        """Run one round over every DVR; returns the channels whose state changed."""
+        changed = []
+        for results in self._pool.map(self._check_host, list(self._hosts)):
+            for health, rtsp_state, latency, error in results:
+                health.checked = time.time()
+                health.latency = latency
+                health.error = error
+                previous = health.rtsp_state
+                health.rtsp_state = rtsp_state
+                if previous == UNKNOWN:
+                    # First observation is not a change; an answering channel is still confirmed
+                    health.state = rtsp_state
+                    health.changed = health.checked
+                    if self.decode_probe and rtsp_state == UP:
+                        self._escalate(health)
+                elif rtsp_state != previous:
+                    changed.append(health)
+                    if self.decode_probe:
+                        self._escalate(health)
+                    else:
+                        self._set_state(health, rtsp_state)
+                elif health.probe_pending:
+                    self._escalate(health)
+        self.rounds += 1
+        return changed
+
+    def _set_state(self, health: ChannelHealth, state: str):
+        if state == health.state:
+            return
+        health.state = state
+        health.changed = time.time()
+        if self.on_change is not None:
+            self.on_change(health)
+
+    def _escalate(self, health: ChannelHealth):
+        with self._lock:
+            if health.name in self._probing:
+                # Probe again once the running one is done
+                self._rerun.add(health.name)
+                return
+            self._probing.add(health.name)
+        try:
+            self._probes.submit(self._decode_probe, health)
+        except RuntimeError:
+            # Stopped
+            with self._lock:
+                self._probing.discard(health.name)
+
+    @staticmethod
+    def _decode(url: str) -> Optional[bool]:
+        """Whether ``url`` decodes a frame, as ``run_list`` checks; None if the probe could not run."""
+        lease = sessions.acquire(url, PROBE, timeout=PROBE_WAIT)
+        if lease is None:
+            return None
+        try:
+            cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+            try:
+                if not cap.isOpened():
+                    return False
+                for _ in range(3):
+                    if lease.yield_requested:
+                        return None
+                    ret, frame = cap.read()
+                    if ret and frame is not None:
+                        return True
+                return False
+            finally:
+                cap.release()
+        finally:
+            lease.release()
+
+    def _decode_probe(self, health: ChannelHealth):
+        """Confirm the control channel's state from real frames."""
+        probed = health.rtsp_state
+        ok = None
+        try:
+            ok = self._decode(health.url)
+            # Viewers hold every session: keep the state and retry next round
+            health.probe_pending = ok is None
+            if ok is not None:
+                health.decoded = ok
+                if ok:
+                    self._set_state(health, UP)
+                else:
+                    self._set_state(health, NO_VIDEO if health.rtsp_state in (UP, NO_VIDEO) else DOWN)
+        finally:
+            with self._lock:
+                self._probing.discard(health.name)
+                again = health.name in self._rerun or health.rtsp_state != probed
+                self._rerun.discard(health.name)
+            if again and ok is not None:
+                self._escalate(health)
+
+    def settle(self, timeout: float = 60.0):
+        """Wait for running decode probes, e.g. before printing a one-off table."""
+        deadline = time.monotonic() + timeout
+        while self._probing and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+    # -- monitor thread ------------------------------------------------------
+
+    def _run(self):
+        while self._running:
+            started = time.monotonic()
+            self.check_once()
+            delay = self.interval - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='health-monitor')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + self.timeout * 2)
+            self._thread = None
+        self._pool.shutdown(wait=False)
+        self._probes.shutdown(wait=False)
+        for conn in self._connections.values():
+            conn.close()
+
+    # -- reporting -----------------------------------------------------------
+
+    def table(self) -> List[ChannelHealth]:
+        return sorted(self.channels.values(), key=lambda h: h.name)
+
+    def summary(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for health in self.channels.values():
+            counts[health.state] = counts.get(health.state, 0) + 1
+        return counts
+
+
+def format_table(rows: List[ChannelHealth]) -> str:
+    now = time.time()
+    width = max([len(r.name) for r in rows] + [7])
+    lines = [f"{'channel':<{width}}  {'state':<8}  {'latency':>8}  {'since':>7}  error"]
+    for r in rows:
+        latency = f"{r.latency * 1000:.0f} ms" if r.latency is not None else '-'
+        since = f"{now - r.changed:.0f}s" if r.changed else '-'
+        error = '; '.join(filter(None, [r.error, 'decode probe pending' if r.probe_pending else '']))
+        lines.append(f"{r.name:<{width}}  {r.state:<8}  {latency:>8}  {since:>7}  {error}")
+    return '\n'.join(lines)
@@ -0,0 +1,250 @@
+"""HLS remux of recorded clips for browser playback.
+
+Browsers cannot play RTSP. ``HlsSegmenter`` remuxes a camera's recording
+for a (start, duration) window into HLS: MPEG-TS (or fMP4) segments plus an
+``index.m3u8`` playlist. FFmpeg copies the packets (``-c copy``), so
+nothing is decoded or re-encoded. The source is the local archive when it
+covers the window (see ``archive_index``), otherwise the brand playback URL.
+
+Clips are cached on disk by (camera, start, duration). When several people
+review the same ML event, the DVR is asked for the footage once and later
+views are plain file reads. Concurrent requests for the same clip share one
+remux job. The playlist is written as an EVENT playlist while FFmpeg runs,
+so playback can start after the first segment, even though the DVR serves
+the recording at 1x. A ``.complete`` marker is written once the clip is
+finished. An unfinished clip that has no job is redone.
+
+A remux from the DVR holds a PLAYBACK-priority session from the per-DVR
+budget until it finishes.
+
+Note that browsers other than Safari only play H.264 in HLS. Choose
+``segment_type='fmp4'`` for H.265 sources that Safari should play.
+"""
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from archive_index import release_source
+from recorder import find_ffmpeg
+from sessions import PLAYBACK, sessions
+from trickplay import PlaybackSource
+
+PLAYLIST = 'index.m3u8'
+COMPLETE = '.complete'
+SEGMENT_SECONDS = 4
+SESSION_WAIT = 30.0
+READY_WAIT = 30.0
+# A clip is remuxed at 1x, so waiting for a whole one takes its duration plus this
+COMPLETE_MARGIN = 120.0
+# Longest clip a request may ask for; each one holds a DVR session for its duration
+MAX_CLIP_SECONDS = 3600
+# segment type -> (ffmpeg hls_segment_type, segment file pattern)
+SEGMENT_TYPES = {
+    'ts': ('mpegts', 'seg_%05d.ts'),
+    'fmp4': ('fmp4', 'seg_%05d.m4s'),
+}
+CONTENT_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4',
+}
+_FILE_RE = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+
+def parse_start(value: str) -> datetime:
+    """Clip start from a URL or CLI: ISO 8601 or epoch seconds."""
+    if value.isdigit():
+        return datetime.fromtimestamp(int(value))
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+class HlsCache:
+    """HLS clip directories on disk, addressed by a hash of (camera, start, duration).
+
+    With ``max_bytes`` the oldest finished clips are removed after each new
+    one so the cache stays under that size.
+    """
+
+    def __init__(self, root: str = 'hls_cache', max_bytes: Optional[int] = None):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(camera: str, start: datetime, duration: int) -> str:
+        return hashlib.sha1(f"{camera}|{int(start.timestamp())}|{int(duration)}".encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def complete(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.path(key), COMPLETE))
+
+    def prune(self, keep: Optional[str] = None):
+        if not self.max_bytes or not os.path.isdir(self.root):
+            return
+        clips = []
+        total = 0
+        for entry in os.scandir(self.root):
+            if not entry.is_dir() or entry.name == keep or not self.complete(entry.name):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            clips.append((os.path.getmtime(os.path.join(entry.path, COMPLETE)), entry.path, size))
+            total += size
+        for _, path, size in sorted(clips):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+class _Job:
+    """One FFmpeg remux into a cache directory."""
+
+    def __init__(self, key: str, out_dir: str):
+        self.key = key
+        self.out_dir = out_dir
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+
+class HlsSegmenter:
+    """Serve recorded windows of ``cameras`` as cached HLS clips."""
+
+    def __init__(self, cameras: Iterable, cache: Optional[HlsCache] = None, archive_dir: Optional[str] = None,
+                 segment_seconds: int = SEGMENT_SECONDS, segment_type: str = 'ts', ffmpeg: Optional[str] = None,
+                 max_duration: int = MAX_CLIP_SECONDS):
+        if segment_type not in SEGMENT_TYPES:
+            raise ValueError(f"Unknown segment type '{segment_type}', expected one of {sorted(SEGMENT_TYPES)}")
+        self.cameras = {c.name: c for c in cameras}
+        self.cache = cache or HlsCache()
+        self.archive_dir = archive_dir
+        self.segment_seconds = segment_seconds
+        self.segment_type = segment_type
+        self.ffmpeg = ffmpeg
+        self.max_duration = max_duration
+        self._jobs: Dict[str, _Job] = {}
+        self._lock = threading.Lock()
+
+    def command(self, binary: str, url: str, out_dir: str, duration: int):
+        seg_type, pattern = SEGMENT_TYPES[self.segment_type]
+        cmd = [binary, '-hide_banner', '-nostdin', '-loglevel', 'error']
+        if url.startswith('rtsp://'):
+            cmd += ['-rtsp_transport', 'tcp']
+        cmd += ['-i', url, '-t', str(duration), '-map', '0:v:0', '-c', 'copy',
+                '-f', 'hls', '-hls_time', str(self.segment_seconds), '-hls_list_size', '0',
+                '-hls_playlist_type', 'event', '-hls_flags', 'temp_file',
+                '-hls_segment_type', seg_type, '-hls_segment_filename', os.path.join(out_dir, pattern)]
+        if self.segment_type == 'fmp4':
+            cmd += ['-hls_fmp4_init_filename', 'init.mp4']
+        return cmd + [os.path.join(out_dir, PLAYLIST)]
+
+    def check_duration(self, duration: int):
+        """Raise ``ValueError`` unless ``duration`` is a clip length this segmenter accepts."""
+        if not 0 < duration <= self.max_duration:
+            raise ValueError(f"Clip length must be 1 to {self.max_duration} seconds, got {duration}")
+
+    def clip(self, camera_name: str, start: datetime, duration: int, wait: float = READY_WAIT,
+             complete: bool = False) -> str:
+        """Directory of the clip, with its playlist ready to serve.
+
+        The clip is remuxed on first request. This waits up to ``wait``
+        seconds for the first segment, or with ``complete`` until the whole
+        clip is done (up to its duration plus ``COMPLETE_MARGIN``). Raises
+        ``KeyError`` for an unknown camera, ``ValueError`` for a duration
+        outside 1..``max_duration`` seconds and ``RuntimeError`` when the
+        clip cannot be produced in time.
+        """
+        camera = self.cameras.get(camera_name)
+        if camera is None:
+            raise KeyError(camera_name)
+        self.check_duration(duration)
+        key = self.cache.key(camera_name, start, duration)
+        out_dir = self.cache.path(key)
+        if self.cache.complete(key):
+            return out_dir
+        job = self._job(key, camera, start, duration)
+        if complete and not job.done.wait(duration + COMPLETE_MARGIN):
+            raise RuntimeError(f"HLS clip for {camera_name} not finished after {duration + COMPLETE_MARGIN:.0f}s")
+        playlist = os.path.join(out_dir, PLAYLIST)
+        # The playlist appears with the first finished segment
+        waited = 0.0
+        while not os.path.exists(playlist) and not job.done.is_set() and waited < wait:
+            job.done.wait(0.2)
+            waited += 0.2
+        if job.error:
+            raise RuntimeError(job.error)
+        if not os.path.exists(playlist):
+            raise RuntimeError(f"No HLS segment for {camera_name} after {wait:.0f}s")
+        return out_dir
+
+    def _job(self, key: str, camera, start: datetime, duration: int) -> _Job:
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                return job
+            if self.cache.complete(key):
+                # Finished while the caller was checking
+                job = _Job(key, self.cache.path(key))
+                job.done.set()
+                return job
+            binary = find_ffmpeg(self.ffmpeg)
+            if binary is None:
+                raise RuntimeError("ffmpeg not found on PATH (set FFMPEG_BINARY to override)")
+            job = _Job(key, self.cache.path(key))
+            # Leftovers of an interrupted remux are redone from scratch
+            shutil.rmtree(job.out_dir, ignore_errors=True)
+            os.makedirs(job.out_dir)
+            self._jobs[key] = job
+        thread = threading.Thread(target=self._run, args=(job, binary, camera, start, duration),
+                                  name=f"hls-{camera.name}")
+        thread.daemon = True
+        thread.start()
+        return job
+
+    def _run(self, job: _Job, binary: str, camera, start: datetime, duration: int):
+        lease = None
+        url = None
+        try:
+            url, _ = PlaybackSource(camera, start, timedelta(seconds=duration), self.archive_dir)(0.0)
+            lease = sessions.acquire(url, PLAYBACK, timeout=SESSION_WAIT)
+            if lease is None:
+                job.error = f"No free DVR session for {camera.name}"
+                return
+            proc = subprocess.run(self.command(binary, url, job.out_dir, duration),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            if proc.returncode != 0 or not os.path.exists(os.path.join(job.out_dir, PLAYLIST)):
+                err = proc.stderr.decode('utf-8', 'replace').strip().splitlines()
+                job.error = f"HLS remux failed for {camera.name}: {err[-1] if err else 'no output'}"
+                return
+            open(os.path.join(job.out_dir, COMPLETE), 'w').close()
+        except Exception as e:
+            # Waiters must always be released, whatever went wrong
+            job.error = f"HLS remux failed for {camera.name}: {e}"
+        finally:
+            if lease is not None:
+                lease.release()
+            release_source(url)
+            if job.error:
+                shutil.rmtree(job.out_dir, ignore_errors=True)
+            with self._lock:
+                self._jobs.pop(job.key, None)
+            job.done.set()
+            if not job.error:
+                self.cache.prune(keep=job.key)
+
+    def file(self, camera_name: str, start: datetime, duration: int, name: str):
+        """(path, content type, finished) of a clip file, or None if it does not exist."""
+        if not _FILE_RE.match(name) or name.startswith('.'):
+            return None
+        out_dir = self.clip(camera_name, start, duration)
+        path = os.path.join(out_dir, name)
+        if not os.path.isfile(path):
+            return None
+        ext = os.path.splitext(name)[1]
+        return path, CONTENT_TYPES.get(ext, 'application/octet-stream'), self.cache.complete(os.path.basename(out_dir))
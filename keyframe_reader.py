@@ -0,0 +1,155 @@
+"""Keyframe-only decoding through an FFmpeg pipe.
+
+OpenCV exposes no way to ask FFmpeg to skip non-key frames, so ``grab()``
+still decodes every frame. ``KeyframeReader`` runs ``ffmpeg -skip_frame
+nokey`` and reads scaled BGR frames from its stdout, so only I-frames are
+decoded (typically one or two per second). Presentation timestamps come
+from the ``showinfo`` filter on stderr.
+
+The reader mimics the parts of ``cv2.VideoCapture`` the players use:
+``isOpened()``, ``read()`` and ``release()``, plus ``pts`` for the last frame.
+"""
+import collections
+import re
+import subprocess
+import threading
+from typing import Optional
+
+from lazy_imports import lazy_module
+from recorder import find_ffmpeg
+
+np = lazy_module('numpy')
+
+_SHOWINFO_RE = re.compile(r'\bn:\s*(\d+).*?pts_time:\s*([-\d.]+)')
+
+
+def keyframes_available() -> bool:
+    return find_ffmpeg() is not None
+
+
+class KeyframeReader:
+    """Decode keyframes of ``url`` letterboxed to ``width`` x ``height``.
+
+    Frames are read on a background thread into a queue of ``buffer``
+    entries. With ``drop`` (live use) the oldest entry is discarded when the
+    queue is full. Without it the reader blocks FFmpeg, which suits playback.
+    """
+
+    def __init__(self, url: str, width: int, height: int, start_offset: float = 0.0,
+                 buffer: int = 2, drop: bool = True, ffmpeg: Optional[str] = None):
+        self.url = url
+        self.width = width
+        self.height = height
+        self.start_offset = start_offset
+        self.drop = drop
+        self.pts = 0.0
+        self._binary = find_ffmpeg(ffmpeg)
+        self._frames = collections.deque()
+        self._buffer = max(1, buffer)
+        self._pts = {}
+        self._cond = threading.Condition()
+        self._proc: Optional[subprocess.Popen] = None
+        self._eof = False
+        self._open()
+
+    def _command(self):
+        w, h = self.width, self.height
+        vf = (f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+              f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2:color=0x141414,showinfo")
+        cmd = [self._binary, '-hide_banner', '-nostdin', '-loglevel', 'info']
+        if self.url.startswith('rtsp://'):
+            cmd += ['-rtsp_transport', 'tcp']
+        if self.start_offset > 0:
+            cmd += ['-ss', f"{self.start_offset:.3f}"]
+        cmd += ['-skip_frame', 'nokey', '-i', self.url, '-an', '-vsync', '0',
+                '-vf', vf, '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1']
+        return cmd
+
+    def _open(self):
+        if self._binary is None:
+            self._eof = True
+            return
+        self._proc = subprocess.Popen(self._command(), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                      bufsize=0)
+        for target in (self._read_frames, self._read_log):
+            t = threading.Thread(target=target)
+            t.daemon = True
+            t.start()
+
+    def _read_log(self):
+        for raw in iter(self._proc.stderr.readline, b''):
+            m = _SHOWINFO_RE.search(raw.decode('utf-8', 'replace'))
+            if m:
+                with self._cond:
+                    self._pts[int(m.group(1))] = float(m.group(2))
+                    self._cond.notify_all()
+
+    def _read_frames(self):
+        size = self.width * self.height * 3
+        stdout = self._proc.stdout
+        index = 0
+        while True:
+            buf = bytearray(size)
+            view = memoryview(buf)
+            got = 0
+            while got < size:
+                n = stdout.readinto(view[got:])
+                if not n:
+                    break
+                got += n
+            if got < size:
+                break
+            frame = np.frombuffer(buf, dtype=np.uint8).reshape(self.height, self.width, 3)
+            with self._cond:
+                if not self.drop:
+                    self._cond.wait_for(lambda: len(self._frames) < self._buffer or self._proc is None)
+                self._frames.append((index, frame))
+                index += 1
+                while len(self._frames) > self._buffer:
+                    self._frames.popleft()
+                self._cond.notify_all()
+        with self._cond:
+            self._eof = True
+            self._cond.notify_all()
+
+    def _pop(self):
+        index, frame = self._frames.popleft()
+        # stderr and stdout are separate pipes, so the showinfo line for this
+        # frame may trail the pixels slightly
+        self._cond.wait_for(lambda: index in self._pts or self._eof, timeout=0.5)
+        self.pts = self._pts.pop(index, self.pts)
+        for stale in [n for n in self._pts if n < index]:
+            del self._pts[stale]
+        self._cond.notify_all()
+        return frame
+
+    def isOpened(self) -> bool:
+        return self._proc is not None and not (self._eof and not self._frames)
+
+    def read(self, timeout: Optional[float] = None):
+        """Next keyframe as (ok, frame); blocks up to ``timeout`` seconds."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._frames or self._eof, timeout=timeout)
+            if not self._frames:
+                return False, None
+            return True, self._pop()
+
+    def poll(self):
+        """Newest queued keyframe or None, without blocking."""
+        with self._cond:
+            if not self._frames:
+                return None
+            while len(self._frames) > 1:
+                self._pop()
+            return self._pop()
+
+    def release(self):
+        proc = self._proc
+        if proc is None:
+            return
+        with self._cond:
+            self._proc = None
+            self._cond.notify_all()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
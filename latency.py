@@ -0,0 +1,75 @@
+"""Live-view latency control.
+
+OpenCV's FFmpeg backend queues decoded frames, so a slow display loop drifts
+further and further behind real time. ``LiveLatencyController`` estimates the
+age of each frame and skips stale ones with ``grab()`` (no retrieve/colour
+conversion) until the view is back inside the latency bound.
+"""
+import time
+
+DEFAULT_MAX_LATENCY = 1.0
+
+
+class LiveLatencyController:
+    """Keep a live capture within ``max_latency`` seconds of real time.
+
+    Frame age is measured from the stream PTS against the wall clock. The
+    anchor is the freshest (pts, wall) pair seen so far, so the estimate is
+    the extra delay accumulated since then. Streams without usable PTS fall
+    back to grab timing: a grab that returns faster than ``fast_grab`` came
+    from the buffer rather than the network.
+    """
+
+    def __init__(self, max_latency: float = DEFAULT_MAX_LATENCY, max_skip: int = 100, fast_grab: float = 0.005):
+        self.max_latency = max_latency
+        self.max_skip = max_skip
+        self.fast_grab = fast_grab
+        self.dropped = 0
+        self.last_age = 0.0
+        self._anchor = None
+        self._last_pts = None
+
+    def reset(self):
+        self._anchor = None
+        self._last_pts = None
+
+    def _grab(self, cap):
+        start = time.monotonic()
+        ok = cap.grab()
+        now = time.monotonic()
+        if not ok:
+            return False, now - start
+        pts = cap.get(0) / 1000.0  # cv2.CAP_PROP_POS_MSEC
+        if pts > 0 and (self._last_pts is None or pts > self._last_pts):
+            self._last_pts = pts
+            if self._anchor is None:
+                self._anchor = (pts, now)
+            age = (now - self._anchor[1]) - (pts - self._anchor[0])
+            if age < 0:
+                # Frame is fresher than the anchor assumed: move the anchor
+                self._anchor = (pts, now)
+                age = 0.0
+            self.last_age = age
+        else:
+            self.last_age = None
+        return True, now - start
+
+    def _stale(self, grab_time: float) -> bool:
+        if self.last_age is not None:
+            return self.last_age > self.max_latency
+        return grab_time < self.fast_grab
+
+    def read(self, cap, image=None):
+        """Drop-in replacement for ``cap.read()`` that skips stale frames.
+
+        ``image`` is an optional preallocated frame to decode into.
+        """
+        ok, grab_time = self._grab(cap)
+        skipped = 0
+        while ok and skipped < self.max_skip and self._stale(grab_time):
+            ok, grab_time = self._grab(cap)
+            skipped += 1
+        self.dropped += skipped
+        if not ok:
+            return False, None
+        return cap.retrieve() if image is None else cap.retrieve(image=image)
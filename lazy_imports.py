@@ -0,0 +1,39 @@
+"""Deferred imports for heavy optional modules (cv2, numpy, onvif).
+
+``cv2 = lazy_module('cv2')`` binds a placeholder that imports the real module
+on first attribute access, so CLI paths that never touch video (listing,
+config validation, URL generation) start without paying for OpenCV/NumPy.
+"""
+import importlib
+import threading
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with self.__dict__['_lock']:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    return LazyModule(name)
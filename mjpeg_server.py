@@ -0,0 +1,293 @@
+"""HTTP snapshot/MJPEG server over shared capture streams.
+
+Routes:
+    /                      camera index
+    /snapshot/<camera>     latest frame as JPEG (ETag, 304 when unchanged)
+    /mjpeg/<camera>        multipart MJPEG stream
+    /play/<camera>/<start>/<seconds>         recorded clip in an HTML5 player
+    /hls/<camera>/<start>/<seconds>/<file>   the clip's HLS playlist and segments
+
+The recorded-clip routes need an ``hls.HlsSegmenter``. ``start`` is ISO
+8601 (e.g. 2025-01-11T10:15:00) or epoch seconds.
+
+Every camera is decoded once by a shared ``CameraStream``. Each frame is
+JPEG-encoded at most once per quality tier and the bytes are shared by all
+viewers. Viewers that cannot keep up are moved to a lower tier.
+"""
+import html
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+from capture import StreamHub
+from lazy_imports import lazy_module
+
+cv2 = lazy_module('cv2')
+
+QUALITY_TIERS = (85, 65, 45)
+BOUNDARY = 'frame'
+
+
+class JpegEncoder:
+    """Per-camera cache of the current frame's JPEG bytes by quality."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = -1
+        self._cache: Dict[int, bytes] = {}
+
+    def encode(self, seq: int, frame, quality: int) -> Optional[bytes]:
+        with self._lock:
+            if seq != self._seq:
+                self._seq = seq
+                self._cache = {}
+            data = self._cache.get(quality)
+            if data is None:
+                ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                if not ok:
+                    return None
+                data = buf.tobytes()
+                self._cache[quality] = data
+            return data
+
+
+class _ClientQuality:
+    """Step a viewer down a tier when sends lag, back up when they recover."""
+
+    def __init__(self, tier: int = 0):
+        self.tier = tier
+        self._fast = 0
+
+    @property
+    def quality(self) -> int:
+        return QUALITY_TIERS[self.tier]
+
+    def record(self, send_time: float, frame_interval: float):
+        if send_time > frame_interval * 0.8 and self.tier < len(QUALITY_TIERS) - 1:
+            self.tier += 1
+            self._fast = 0
+        elif send_time < frame_interval * 0.3:
+            self._fast += 1
+            if self._fast >= 50 and self.tier > 0:
+                self.tier -= 1
+                self._fast = 0
+
+
+def _snap_quality(value: str) -> int:
+    q = int(value)
+    # Snap to a shared tier so explicit requests still hit the cache
+    return min(QUALITY_TIERS, key=lambda t: abs(t - q))
+
+
+class FrameServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], hub: StreamHub, hls=None):
+        super().__init__(address, _Handler)
+        self.hub = hub
+        self.hls = hls
+        self.encoders = {name: JpegEncoder() for name in hub.names()}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FrameServer
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        parts = [unquote(p) for p in parsed.path.strip('/').split('/', 1)]
+        if parsed.path in ('', '/'):
+            self._index()
+        elif len(parts) == 2 and parts[0] == 'snapshot':
+            self._snapshot(parts[1], query)
+        elif len(parts) == 2 and parts[0] == 'mjpeg':
+            self._mjpeg(parts[1], query)
+        elif parts[0] in ('hls', 'play') and self.server.hls is not None:
+            self._recorded(parts[0], [unquote(p) for p in parsed.path.strip('/').split('/')[1:]])
+        else:
+            self.send_error(404)
+
+    def _stream(self, name: str):
+        stream = self.server.hub.get(name)
+        if stream is None:
+            self.send_error(404, f"Unknown camera {name}")
+        return stream
+
+    def _index(self):
+        items = ''.join(
+            f'<li>{html.escape(n)}: <a href="/snapshot/{quote(n)}">snapshot</a> '
+            f'<a href="/mjpeg/{quote(n)}">live</a></li>'
+            for n in self.server.hub.names()
+        )
+        body = f"<html><body><h1>Cameras</h1><ul>{items}</ul></body></html>".encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _snapshot(self, name: str, query):
+        stream = self._stream(name)
+        if stream is None:
+            return
+        try:
+            quality = _snap_quality(query['q'][0]) if 'q' in query else QUALITY_TIERS[0]
+        except ValueError:
+            self.send_error(400, "q must be an integer")
+            return
+        seq, frame, ts = stream.latest()
+        if frame is None:
+            stream.wait_newer(seq, timeout=10.0)
+        stream.touch()
+        # Held so the capture thread cannot decode into the frame while it is encoded
+        with stream.hold() as (seq, frame, ts):
+            if frame is None:
+                self.send_error(503, f"No frame from {name}")
+                return
+            etag = f'"{seq}-{quality}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            data = self.server.encoders[name].encode(seq, frame, quality)
+        if data is None:
+            self.send_error(500, "JPEG encoding failed")
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', self.date_time_string(int(ts)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _recorded(self, route: str, args: List[str]):
+        from hls import parse_start
+
+        if len(args) != (4 if route == 'hls' else 3):
+            self.send_error(404)
+            return
+        try:
+            start, seconds = parse_start(args[1]), int(args[2])
+        except ValueError:
+            self.send_error(400, "Expected /<camera>/<start>/<seconds>")
+            return
+        try:
+            # Before anything starts a remux: it holds a DVR session for the clip's length
+            self.server.hls.check_duration(seconds)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        if route == 'play':
+            self._player(args[0], args[1], seconds)
+            return
+        try:
+            found = self.server.hls.file(args[0], start, seconds, args[3])
+        except KeyError:
+            self.send_error(404, f"Unknown camera {args[0]}")
+            return
+        except RuntimeError as e:
+            self.send_error(503, str(e))
+            return
+        if found is None:
+            self.send_error(404)
+            return
+        path, content_type, finished = found
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        # Segments never change; the playlist grows until the clip is finished
+        immutable = finished or not path.endswith('.m3u8')
+        self.send_header('Cache-Control', 'max-age=86400' if immutable else 'no-cache')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _player(self, name: str, start: str, seconds: int):
+        src = f"/hls/{quote(name)}/{quote(start)}/{seconds}/index.m3u8"
+        title = html.escape(f"{name} {start} +{seconds}s")
+        # Safari plays HLS natively; other browsers use hls.js
+        body = f"""<html><head><title>{title}</title></head><body>
+<h1>{title}</h1>
+<video id="v" controls autoplay muted style="max-width:100%"></video>
+<script src="https://cdn.jsdelivr.net/npm/hls.js@1"></script>
+<script>
+var v = document.getElementById('v'), src = {json.dumps(src)};
+if (v.canPlayType('application/vnd.apple.mpegurl')) {{ v.src = src; }}
+else if (window.Hls && Hls.isSupported()) {{ var h = new Hls(); h.loadSource(src); h.attachMedia(v); }}
+</script></body></html>""".encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _mjpeg(self, name: str, query):
+        stream = self._stream(name)
+        if stream is None:
+            return
+        try:
+            client = _ClientQuality(QUALITY_TIERS.index(_snap_quality(query['q'][0])) if 'q' in query else 0)
+            max_fps = float(query['fps'][0]) if 'fps' in query else 0.0
+        except ValueError:
+            self.send_error(400, "q must be an integer and fps a number")
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        encoder = self.server.encoders[name]
+        seq = -1
+        last_ts = 0.0
+        idle = 0
+        try:
+            while True:
+                new_seq, frame, ts = stream.wait_newer(seq)
+                if new_seq == seq or frame is None:
+                    # Stopped or reconnecting stream: back off instead of spinning
+                    idle += 1
+                    time.sleep(min(2.0, 0.05 * idle))
+                    seq = new_seq
+                    continue
+                idle = 0
+                with stream.hold() as (seq, frame, ts):
+                    data = encoder.encode(seq, frame, client.quality) if frame is not None else None
+                interval = (ts - last_ts) if last_ts else 0.04
+                last_ts = ts
+                if data is None:
+                    continue
+                start = time.monotonic()
+                self.wfile.write(
+                    f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+                )
+                self.wfile.write(data)
+                self.wfile.write(b"\r\n")
+                self.wfile.flush()
+                client.record(time.monotonic() - start, max(interval, 0.001))
+                if max_fps > 0:
+                    time.sleep(max(0.0, 1.0 / max_fps - (time.monotonic() - start)))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def serve(urls_with_names: List[tuple], host: str = '0.0.0.0', port: int = 8080, hls=None):
+    """Serve the given cameras until interrupted; ``hls`` enables the recorded-clip routes."""
+    hub = StreamHub(urls_with_names)
+    server = FrameServer((host, port), hub, hls=hls)
+    print(f"Serving {len(hub.names())} cameras on http://{host}:{port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        hub.stop_all()
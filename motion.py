@@ -0,0 +1,112 @@
+"""Batched motion detection for the grid capture loops.
+
+Every camera's frame is reduced to a small grayscale thumbnail written into
+one stacked ``(N, h, w)`` array. Frame differencing, thresholding and the
+per-camera and per-region scores then run as single NumPy operations over
+all cameras instead of one OpenCV pipeline per tile.
+
+Stages plug into ``scalable_player.grid_play`` through ``stages=[...]``. A
+stage is any object with ``process(names, frames)``, called once per loop
+iteration with a list of frames (None for cameras without a new frame).
+"""
+import time
+from typing import Callable, Dict, List, Optional
+
+from lazy_imports import lazy_module
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+THUMB_W = 64
+THUMB_H = 36
+
+
+class MotionDetector:
+    """Per-camera and per-region motion scores from stacked thumbnails.
+
+    ``scores[name]`` is the fraction of thumbnail pixels whose gray level
+    changed by more than ``threshold`` since the previous sample.
+    ``regions[name]`` is the same fraction over a ``grid`` of regions.
+    Scores are recomputed at most ``rate_hz`` times per second.
+    """
+
+    def __init__(self, threshold: int = 25, grid: tuple = (4, 4), rate_hz: float = 5.0,
+                 thumb_size: tuple = (THUMB_W, THUMB_H),
+                 on_scores: Optional[Callable[[Dict[str, float], Dict[str, object]], None]] = None):
+        self.threshold = threshold
+        self.grid = grid
+        self.rate_hz = rate_hz
+        self.thumb_w, self.thumb_h = thumb_size
+        self.on_scores = on_scores
+        self.scores: Dict[str, float] = {}
+        self.regions: Dict[str, object] = {}
+        self._names: List[str] = []
+        self._stack = None
+        self._prev = None
+        self._valid = None
+        self._last = 0.0
+
+    def _ensure(self, names: List[str]):
+        if names == self._names and self._stack is not None:
+            return
+        gy, gx = self.grid
+        # Trim so the thumbnail divides evenly into regions
+        self.thumb_h -= self.thumb_h % gy
+        self.thumb_w -= self.thumb_w % gx
+        shape = (len(names), self.thumb_h, self.thumb_w)
+        self._names = list(names)
+        self._stack = np.zeros(shape, dtype=np.uint8)
+        self._prev = np.zeros(shape, dtype=np.uint8)
+        self._valid = np.zeros(len(names), dtype=bool)
+
+    def thumbnail(self, frame, out):
+        """Downsample ``frame`` into the grayscale ``out`` slot."""
+        small = cv2.resize(frame, (self.thumb_w, self.thumb_h), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=out)
+        else:
+            out[:] = small
+
+    def due(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        return self.rate_hz <= 0 or now - self._last >= 1.0 / self.rate_hz
+
+    def process(self, names: List[str], frames: List[object]):
+        now = time.monotonic()
+        if not self.due(now):
+            return
+        self._last = now
+        self._ensure(names)
+        fresh = np.zeros(len(names), dtype=bool)
+        for i, frame in enumerate(frames):
+            if frame is not None:
+                self.thumbnail(frame, self._stack[i])
+                fresh[i] = True
+        self.update(fresh)
+
+    def update(self, fresh):
+        """Score the stacked thumbnails; ``fresh`` marks slots written this round."""
+        gy, gx = self.grid
+        n, h, w = self._stack.shape
+        # One batched diff/threshold over every camera
+        diff = cv2.absdiff(self._stack.reshape(n * h, w), self._prev.reshape(n * h, w)).reshape(n, h, w)
+        moving = diff > self.threshold
+        compare = fresh & self._valid
+        cam_scores = np.where(compare, moving.mean(axis=(1, 2)), 0.0)
+        region_scores = moving.reshape(n, gy, h // gy, gx, w // gx).mean(axis=(2, 4))
+        region_scores[~compare] = 0.0
+        self._prev[fresh] = self._stack[fresh]
+        self._valid |= fresh
+        self.scores = {name: float(cam_scores[i]) for i, name in enumerate(self._names)}
+        self.regions = {name: region_scores[i] for i, name in enumerate(self._names)}
+        if self.on_scores is not None:
+            self.on_scores(self.scores, self.regions)
+
+    def reset(self, name: str):
+        """Forget a camera's previous thumbnail, e.g. after its source changed."""
+        if self._valid is not None and name in self._names:
+            self._valid[self._names.index(name)] = False
+
+    def active(self, min_score: float = 0.01) -> List[str]:
+        """Names of cameras whose last score reached ``min_score``."""
+        return [name for name, score in self.scores.items() if score >= min_score]
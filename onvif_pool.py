@@ -0,0 +1,140 @@
+"""Shared ONVIF clients, one per (ip, port, user, password).
+
+Building an ``ONVIFCamera`` parses WSDLs and sets up a SOAP session, and each
+``create_*_service`` call builds another proxy. The pool keeps initialized
+cameras and their service proxies alive on a keep-alive HTTP session and
+re-creates them only when a health check fails. The health check is an
+authenticated call, so a client whose password is no longer valid is
+rebuilt rather than reused. The password is part of the pool key only as
+a hash.
+"""
+import hashlib
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+HEALTH_CHECK_INTERVAL = 60.0
+
+
+def _pool_key(ip: str, port: int, username: str, password: str) -> Tuple[str, int, str, str]:
+    return ip, port, username, hashlib.sha256(password.encode()).hexdigest()
+
+
+def _keepalive_transport():
+    """zeep transport backed by a persistent requests session, if available."""
+    try:
+        import requests
+        from zeep.transports import Transport
+    except ImportError:
+        return None
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return Transport(session=session, timeout=10, operation_timeout=10)
+
+
+class ONVIFClient:
+    """An initialized ``ONVIFCamera`` with cached service proxies."""
+
+    def __init__(self, ip: str, port: int, username: str, password: str):
+        from onvif import ONVIFCamera
+
+        transport = _keepalive_transport()
+        if transport is not None:
+            try:
+                self.camera = ONVIFCamera(ip, port, username, password, transport=transport)
+            except TypeError:
+                # Older onvif-zeep releases do not accept a transport
+                self.camera = ONVIFCamera(ip, port, username, password)
+        else:
+            self.camera = ONVIFCamera(ip, port, username, password)
+        self.key = _pool_key(ip, port, username, password)
+        self._services = {}
+        self._lock = threading.Lock()
+        self.last_ok = time.monotonic()
+
+    def service(self, kind: str):
+        """Return the cached proxy for ``kind`` ('media', 'replay', 'search', ...)."""
+        with self._lock:
+            svc = self._services.get(kind)
+            if svc is None:
+                svc = getattr(self.camera, f'create_{kind}_service')()
+                self._services[kind] = svc
+            return svc
+
+    @property
+    def media(self):
+        return self.service('media')
+
+    @property
+    def replay(self):
+        return self.service('replay')
+
+    @property
+    def search(self):
+        return self.service('search')
+
+    def is_healthy(self, interval: float = HEALTH_CHECK_INTERVAL) -> bool:
+        """Cheap authenticated round trip, at most once per ``interval``."""
+        if time.monotonic() - self.last_ok < interval:
+            return True
+        try:
+            # Not GetSystemDateAndTime: ONVIF answers that without authentication
+            self.camera.devicemgmt.GetDeviceInformation()
+        except Exception:
+            return False
+        self.last_ok = time.monotonic()
+        return True
+
+
+class ONVIFClientPool:
+    def __init__(self, health_interval: float = HEALTH_CHECK_INTERVAL):
+        self.health_interval = health_interval
+        self._clients: Dict[Tuple[str, int, str, str], ONVIFClient] = {}
+        self._key_locks: Dict[Tuple[str, int, str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, ip: str, port: int, username: str, password: str) -> ONVIFClient:
+        """Return a healthy client for the DVR, creating it on first use."""
+        key = _pool_key(ip, port, username, password)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Per-key lock so two threads don't both load WSDLs for the same DVR
+        with key_lock:
+            client = self._clients.get(key)
+            if client is not None and client.is_healthy(self.health_interval):
+                return client
+            client = ONVIFClient(ip, port, username, password)
+            self._clients[key] = client
+            return client
+
+    def invalidate(self, ip: str, port: int, username: str, password: Optional[str] = None):
+        """Drop a client after a failed call so the next ``get`` reconnects.
+
+        Without ``password`` every client for that user is dropped.
+        """
+        with self._lock:
+            for key in [k for k in self._clients if k[:3] == (ip, port, username)]:
+                if password is None or key == _pool_key(ip, port, username, password):
+                    del self._clients[key]
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+
+_default_pool: Optional[ONVIFClientPool] = None
+_default_lock = threading.Lock()
+
+
+def get_pool() -> ONVIFClientPool:
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = ONVIFClientPool()
+        return _default_pool
+
+
+def get_client(ip: str, port: int, username: str, password: str) -> ONVIFClient:
+    return get_pool().get(ip, port, username, password)
@@ -0,0 +1,107 @@
+"""Pre-rendered labels and placeholder tiles for the grid players.
+
+``cv2.putText`` rasterizes the glyphs again on every call, and the players
+label every tile on every frame. ``OverlayCache`` renders each distinct
+label once into a tight alpha mask and writes it in place into the tile,
+touching only the label's bounding box. By default the mask is
+alpha-blended, which gives the same pixels as ``putText`` with
+``LINE_AA``. With ``antialias=False`` the label is instead a masked copy of
+a solid colour patch: hard edges, but several times cheaper than
+``putText``. "No Frame" placeholders
+are built once per (name, size) and returned as read-only arrays that
+callers copy into their canvas.
+"""
+import threading
+from typing import Dict, Tuple
+
+from lazy_imports import lazy_module
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+LABEL_COLOR = (0, 255, 0)
+MISSING_COLOR = (0, 0, 255)
+FONT_SCALE = 0.7
+THICKNESS = 2
+
+
+class Overlay:
+    """One rendered label: a solid colour patch and its coverage masks."""
+
+    __slots__ = ('patch', 'mask', 'alpha', 'inv_alpha', 'ascent', 'pad')
+
+    def __init__(self, coverage, color: tuple, ascent: int, pad: int):
+        self.patch = np.empty(coverage.shape + (3,), dtype=np.uint8)
+        self.patch[:] = color
+        self.mask = (coverage >= 128).astype(np.uint8)
+        self.alpha = coverage.astype(np.float32) / 255.0
+        self.inv_alpha = 1.0 - self.alpha
+        self.ascent = ascent  # pixels above the baseline, as passed to putText
+        self.pad = pad
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.mask.shape
+
+
+class OverlayCache:
+    def __init__(self, font_scale: float = FONT_SCALE, thickness: int = THICKNESS, antialias: bool = True):
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self.antialias = antialias
+        self._labels: Dict[tuple, Overlay] = {}
+        self._tiles: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def label(self, text: str, color: tuple = LABEL_COLOR) -> Overlay:
+        key = (text, color)
+        overlay = self._labels.get(key)
+        if overlay is None:
+            font = cv2.FONT_HERSHEY_SIMPLEX
+            (w, h), baseline = cv2.getTextSize(text, font, self.font_scale, self.thickness)
+            pad = self.thickness
+            mask = np.zeros((h + baseline + 2 * pad, w + 2 * pad), dtype=np.uint8)
+            cv2.putText(mask, text, (pad, pad + h), font, self.font_scale, 255, self.thickness, cv2.LINE_AA)
+            overlay = Overlay(mask, color, h, pad)
+            with self._lock:
+                self._labels[key] = overlay
+        return overlay
+
+    def draw_label(self, dst, text: str, org: tuple = (10, 25), color: tuple = LABEL_COLOR):
+        """Blend ``text`` into ``dst`` in place, with ``org`` as in ``cv2.putText``."""
+        overlay = self.label(text, color)
+        oh, ow = overlay.shape
+        y0 = org[1] - overlay.ascent - overlay.pad
+        x0 = org[0] - overlay.pad
+        # Clip the label box to the destination
+        dy0, dx0 = max(y0, 0), max(x0, 0)
+        dy1, dx1 = min(y0 + oh, dst.shape[0]), min(x0 + ow, dst.shape[1])
+        if dy0 >= dy1 or dx0 >= dx1:
+            return dst
+        src = (slice(dy0 - y0, dy1 - y0), slice(dx0 - x0, dx1 - x0))
+        roi = dst[dy0:dy1, dx0:dx1]
+        if self.antialias:
+            roi[:] = cv2.blendLinear(overlay.patch[src], roi, overlay.alpha[src], overlay.inv_alpha[src])
+        else:
+            cv2.copyTo(overlay.patch[src], overlay.mask[src], roi)
+        return dst
+
+    def placeholder(self, name: str, width: int, height: int):
+        """Cached read-only "No Frame" tile."""
+        key = ('missing', name, width, height)
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = np.zeros((height, width, 3), dtype=np.uint8)
+            self.draw_label(tile, f"No Frame: {name}", (10, height // 2), MISSING_COLOR)
+            tile.flags.writeable = False
+            with self._lock:
+                self._tiles[key] = tile
+        return tile
+
+    def clear(self):
+        with self._lock:
+            self._labels.clear()
+            self._tiles.clear()
+
+
+overlays = OverlayCache()
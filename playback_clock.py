@@ -0,0 +1,248 @@
+"""Shared clock for synchronized multi-camera playback.
+
+Each playback capture otherwise runs at its own decode speed, so the grid
+drifts apart and stops showing the same moment. A ``PlaybackClock`` holds
+the media position for all cameras (seconds since the requested start
+time, at a chosen speed). ``ClockedCapture`` paces one capture against it
+by frame PTS. A camera ahead of the clock holds its last frame; one behind
+drops frames with ``grab()`` until it is back within ``tolerance``. Each
+read spends at most ``CATCHUP_SECONDS`` of wall time on that, since a
+stream paced by its server blocks in ``grab()`` and would stall the grid.
+
+Above ``KEYFRAME_SPEED`` (2x) decoding every frame cannot keep up, so the
+capture switches to a ``KeyframeReader`` (I-frames only) from its current
+position and back to full decoding when the speed drops again.
+
+Note that DVRs pace RTSP playback at 1x themselves. Faster speeds make real
+progress on local archive sources (see ``archive_index``). Over RTSP they
+progress only where the source can be reopened at a later position (see
+``source_at``).
+"""
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from keyframe_reader import KeyframeReader, keyframes_available
+from lazy_imports import lazy_module
+
+cv2 = lazy_module('cv2')
+
+SPEEDS = (1.0, 2.0, 4.0, 8.0)
+KEYFRAME_SPEED = 2.0
+DEFAULT_TOLERANCE = 0.2
+# A gap larger than this between a camera and the clock is a seek, not drift
+SEEK_THRESHOLD = 10.0
+# Wall time one read may spend dropping frames to catch up with the clock
+CATCHUP_SECONDS = 0.005
+
+
+class PlaybackClock:
+    """Media position shared by every camera in a playback view."""
+
+    def __init__(self, speed: float = 1.0, tolerance: float = DEFAULT_TOLERANCE):
+        self.speed = speed
+        self.tolerance = tolerance
+        self.paused = False
+        self._media0 = 0.0
+        self._wall0: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def start(self, position: float = 0.0):
+        with self._lock:
+            self._media0 = position
+            self._wall0 = time.monotonic()
+
+    def _now(self) -> float:
+        if self._wall0 is None or self.paused:
+            return self._media0
+        return self._media0 + (time.monotonic() - self._wall0) * self.speed
+
+    def now(self) -> float:
+        """Current media position in seconds."""
+        with self._lock:
+            return self._now()
+
+    def _rebase(self):
+        self._media0 = self._now()
+        self._wall0 = time.monotonic()
+
+    def set_speed(self, speed: float):
+        with self._lock:
+            self._rebase()
+            self.speed = speed
+        print(f"Playback speed {speed:g}x")
+
+    def pause(self, paused: bool = True):
+        with self._lock:
+            self._rebase()
+            self.paused = paused
+
+    def seek(self, position: float):
+        with self._lock:
+            self._media0 = max(0.0, position)
+            self._wall0 = time.monotonic()
+
+    def media_tolerance(self) -> float:
+        """Allowed drift in media seconds; looser at high speed where only keyframes show."""
+        return self.tolerance * max(1.0, self.speed)
+
+    def handle_key(self, key: int) -> bool:
+        """Playback keys: 1/2/4/8 set the speed, space pauses. True if handled."""
+        if key == ord(' '):
+            self.pause(not self.paused)
+            return True
+        for speed in SPEEDS:
+            if key == ord(str(int(speed))):
+                self.set_speed(speed)
+                return True
+        return False
+
+
+class ClockedCapture:
+    """One playback capture paced by a shared ``PlaybackClock``.
+
+    ``read()`` follows the ``cap.read()`` contract used by the grid players.
+    It returns ``(True, None)`` while the camera is ahead of the clock, in
+    which case the caller keeps showing the previous frame.
+
+    ``source_at(position)`` returns ``(url, base)`` for reopening the source
+    at a media position, where ``base`` is the media position of the new
+    source's PTS 0. By default the same URL is reopened and FFmpeg seeks to
+    the position itself. That only works for files, so RTSP sources without
+    ``source_at`` never seek or switch to keyframes. An already opened
+    ``cap`` starts at media ``position``.
+    """
+
+    def __init__(self, name: str, url: str, clock: PlaybackClock, cap=None,
+                 keyframe_size: Tuple[int, int] = (640, 360), max_skip: int = 250,
+                 source_at: Optional[Callable[[float], Tuple[str, float]]] = None, position: float = 0.0,
+                 max_catchup: float = CATCHUP_SECONDS):
+        self.name = name
+        self.url = url
+        self.clock = clock
+        self.keyframe_size = keyframe_size
+        self.max_skip = max_skip
+        self.max_catchup = max_catchup
+        self.seekable = source_at is not None or not url.startswith('rtsp://')
+        self.source_at = source_at or (lambda position: (url, 0.0))
+        self.position = position
+        self.dropped = 0
+        self._cap = cap
+        self._base = position
+        self._keyframes: Optional[KeyframeReader] = None
+        self._pending = None  # (pts, frame) read ahead of the clock; frame is None for grabbed-only
+        self._count = 0
+        self._fps = None
+        if self._cap is None:
+            self._open_capture(position)
+
+    def isOpened(self) -> bool:
+        source = self._keyframes or self._cap
+        return source is not None and source.isOpened()
+
+    # -- sources -----------------------------------------------------------
+
+    def _close(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        if self._keyframes is not None:
+            self._keyframes.release()
+            self._keyframes = None
+        self._pending = None
+
+    def _open_capture(self, position: float):
+        self._close()
+        url, base = self.source_at(position)
+        cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+        if cap.isOpened() and position > base:
+            cap.set(cv2.CAP_PROP_POS_MSEC, (position - base) * 1000.0)
+        self._cap = cap
+        self._base = base
+        self._count = 0
+        self._fps = None
+
+    def _open_keyframes(self, position: float):
+        self._close()
+        url, base = self.source_at(position)
+        w, h = self.keyframe_size
+        self._keyframes = KeyframeReader(url, w, h, start_offset=max(0.0, position - base), drop=False)
+        self._base = max(base, position)
+
+    def seek(self, position: float):
+        """Reopen the current source at ``position``."""
+        if self._keyframes is not None:
+            self._open_keyframes(position)
+        else:
+            self._open_capture(position)
+        self.position = position
+
+    def _sync_mode(self):
+        fast = self.clock.speed > KEYFRAME_SPEED and self.seekable and keyframes_available()
+        if fast and self._keyframes is None:
+            self._open_keyframes(self.position)
+        elif not fast and self._keyframes is not None:
+            self._open_capture(self.position)
+
+    # -- pacing ------------------------------------------------------------
+
+    def _frame_pts(self) -> float:
+        pts = self._cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        self._count += 1
+        if pts <= 0 and self._count > 1:
+            # No usable timestamps: fall back to frame counting
+            if self._fps is None:
+                self._fps = self._cap.get(cv2.CAP_PROP_FPS) or 25.0
+            pts = (self._count - 1) / self._fps
+        return self._base + pts
+
+    def _next(self) -> bool:
+        """Advance to the next frame as the pending one; False at end of stream."""
+        if self._keyframes is not None:
+            ok, frame = self._keyframes.read(timeout=0)
+            if not ok:
+                if not self._keyframes.isOpened():
+                    return False
+                self._pending = None
+                return True
+            self._pending = (self._base + self._keyframes.pts, frame)
+            return True
+        if not self._cap.grab():
+            return False
+        self._pending = (self._frame_pts(), None)
+        return True
+
+    def read(self):
+        self._sync_mode()
+        if not self.isOpened():
+            return False, None
+        target = self.clock.now()
+        tolerance = self.clock.media_tolerance()
+        if self.seekable and abs(target - self.position) > SEEK_THRESHOLD + tolerance:
+            self.seek(target)
+        if self._pending is None and not self._next():
+            return False, None
+        if self._pending is None or self._pending[0] > target:
+            # Ahead of the clock (or nothing decoded yet): hold the last frame
+            return True, None
+        skipped = 0
+        deadline = time.monotonic() + self.max_catchup
+        while self._pending[0] < target - tolerance and skipped < self.max_skip:
+            if time.monotonic() >= deadline:
+                # Still behind: show this frame and carry on next read (or seek once far enough behind)
+                break
+            if not self._next():
+                return False, None
+            if self._pending is None:
+                return True, None
+            skipped += 1
+        self.dropped += skipped
+        pts, frame = self._pending
+        self._pending = None
+        self.position = pts
+        if frame is None:
+            return self._cap.retrieve()
+        return True, frame
+
+    def release(self):
+        self._close()
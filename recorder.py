@@ -0,0 +1,224 @@
+"""Passthrough recording of RTSP streams into rolling segment files.
+
+The encoded H.264/H.265 packets are remuxed by an FFmpeg child process
+(``-c copy``) and never decoded, so recording costs a socket and a bit of
+disk I/O per channel instead of a decoder. Segments rotate by time through
+FFmpeg's segment muxer. A size limit is enforced by the supervisor, which
+restarts FFmpeg and so starts a new segment.
+
+Segments are named by their start time (one-second resolution) plus the
+number of the FFmpeg run that wrote them, e.g. ``20250111T101500-003.ts``.
+A restart within the same second therefore never overwrites the previous
+segment. Finished segments are picked up from FFmpeg's segment list. When
+a run ends, any segment it left on disk without listing it (FFmpeg was
+killed) is indexed as well.
+
+Recorders hold RECORD-priority sessions (see ``sessions``). When a viewer
+is waiting for a session on a full DVR, a recorder closes its segment,
+hands the session over and resumes once one is free again.
+"""
+import os
+import shutil
+import subprocess
+import threading
+import time
+from typing import Callable, List, Optional
+
+from sessions import RECORD, sessions
+
+# container key -> (ffmpeg segment format, file extension)
+FORMATS = {
+    'ts': ('mpegts', '.ts'),
+    'mkv': ('matroska', '.mkv'),
+    'mp4': ('mp4', '.mp4'),
+}
+SEGMENT_LIST = 'segments.csv'
+SEGMENT_TIME_FORMAT = '%Y%m%dT%H%M%S'
+# Separates the start time from the run number in segment names
+RUN_SEPARATOR = '-'
+
+
+def find_ffmpeg(ffmpeg: Optional[str] = None) -> Optional[str]:
+    return shutil.which(ffmpeg or os.environ.get('FFMPEG_BINARY', 'ffmpeg'))
+
+
+class SegmentRecorder:
+    """Record one camera into ``out_dir`` as time/size-bounded segments.
+
+    ``on_segment(path)`` is called from the supervisor thread for every
+    segment that FFmpeg has finished writing.
+    """
+
+    def __init__(self, name: str, url: str, out_dir: str, segment_seconds: int = 300,
+                 max_segment_bytes: Optional[int] = None, fmt: str = 'ts', ffmpeg: Optional[str] = None,
+                 on_segment: Optional[Callable[[str], None]] = None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown segment format '{fmt}', expected one of {sorted(FORMATS)}")
+        self.name = name
+        self.url = url
+        self.out_dir = out_dir
+        self.segment_seconds = segment_seconds
+        self.max_segment_bytes = max_segment_bytes
+        self.fmt = fmt
+        self.ffmpeg = ffmpeg
+        self.on_segment = on_segment
+        self.segments: List[str] = []
+        self._seen = set()
+        self._run = 0
+        self._proc: Optional[subprocess.Popen] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        # stop() and the supervisor may both end the same FFmpeg
+        self._terminate_lock = threading.Lock()
+
+    def command(self, ffmpeg: str) -> List[str]:
+        seg_format, ext = FORMATS[self.fmt]
+        cmd = [ffmpeg, '-hide_banner', '-loglevel', 'error']
+        if self.url.startswith('rtsp://'):
+            cmd += ['-rtsp_transport', 'tcp']
+        cmd += [
+            '-i', self.url,
+            '-map', '0:v:0', '-c', 'copy',
+            '-f', 'segment',
+            '-segment_time', str(self.segment_seconds),
+            '-segment_format', seg_format,
+            '-segment_list', os.path.join(self.out_dir, SEGMENT_LIST),
+            '-segment_list_type', 'csv',
+            '-reset_timestamps', '1',
+            '-strftime', '1',
+            os.path.join(self.out_dir, f'{SEGMENT_TIME_FORMAT}{RUN_SEPARATOR}{self._run:03d}{ext}'),
+        ]
+        return cmd
+
+    def start(self):
+        binary = find_ffmpeg(self.ffmpeg)
+        if binary is None:
+            raise RuntimeError("ffmpeg not found on PATH (set FFMPEG_BINARY to override)")
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._running = True
+        self._thread = threading.Thread(target=self._supervise, args=(binary,), name=f"record-{self.name}")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._terminate()
+        if self._thread is not None:
+            self._thread.join(timeout=15)
+        self._collect_segments()
+
+    def _terminate(self):
+        with self._terminate_lock:
+            proc = self._proc
+            if proc is None or proc.poll() is not None:
+                return
+            try:
+                # 'q' lets FFmpeg close the current segment cleanly
+                proc.stdin.write(b'q')
+                proc.stdin.flush()
+                proc.wait(timeout=10)
+            except Exception:
+                proc.kill()
+                proc.wait()
+
+    def _current_segment_size(self) -> int:
+        ext = FORMATS[self.fmt][1]
+        newest = None
+        for entry in os.scandir(self.out_dir):
+            if entry.name.endswith(ext) and entry.name not in self._seen:
+                if newest is None or entry.name > newest.name:
+                    newest = entry
+        return newest.stat().st_size if newest is not None else 0
+
+    def _collect_segments(self):
+        path = os.path.join(self.out_dir, SEGMENT_LIST)
+        try:
+            with open(path, 'r') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            self._add_segment(line.split(',', 1)[0].strip())
+
+    def _collect_unlisted(self, since: float):
+        """Add segments written since ``since`` (epoch) that FFmpeg never listed, e.g. after a kill."""
+        ext = FORMATS[self.fmt][1]
+        unlisted = []
+        for entry in os.scandir(self.out_dir):
+            if entry.name.endswith(ext) and entry.name not in self._seen:
+                try:
+                    if entry.stat().st_mtime >= since and entry.stat().st_size > 0:
+                        unlisted.append(entry.name)
+                except OSError:
+                    pass
+        for filename in sorted(unlisted):
+            self._add_segment(filename)
+
+    def _add_segment(self, filename: str):
+        if not filename or filename in self._seen:
+            return
+        self._seen.add(filename)
+        seg_path = os.path.join(self.out_dir, filename)
+        self.segments.append(seg_path)
+        if self.on_segment is not None:
+            try:
+                self.on_segment(seg_path)
+            except Exception as e:
+                print(f"Segment callback failed for {seg_path}: {e}")
+
+    def _supervise(self, binary: str):
+        backoff = 1.0
+        while self._running:
+            lease = sessions.acquire(self.url, RECORD, timeout=backoff)
+            if lease is None:
+                print(f"No free session for recording {self.name}; retrying")
+                backoff = min(backoff * 2, 60.0)
+                continue
+            print(f"Recording {self.name} -> {self.out_dir}")
+            self._proc = subprocess.Popen(self.command(binary), stdin=subprocess.PIPE)
+            self._run += 1
+            run_started = time.time()
+            started = time.monotonic()
+            yielded = False
+            while self._running and self._proc.poll() is None:
+                time.sleep(1.0)
+                self._collect_segments()
+                if lease.yield_requested:
+                    print(f"Pausing recording of {self.name}: a viewer needs the DVR session")
+                    yielded = True
+                    self._terminate()
+                elif self.max_segment_bytes and self._current_segment_size() >= self.max_segment_bytes:
+                    # Restarting FFmpeg closes the oversized segment and opens a new one
+                    self._terminate()
+            lease.release()
+            self._collect_segments()
+            self._collect_unlisted(run_started - 1.0)
+            if not self._running:
+                break
+            if yielded:
+                backoff = 1.0
+            elif time.monotonic() - started < 5.0:
+                print(f"Recorder for {self.name} exited early; retrying in {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+            else:
+                backoff = 1.0
+
+
+def record_cameras(urls_with_names: List[tuple], out_root: str, index: bool = True, **kwargs) -> List[SegmentRecorder]:
+    """Start a recorder per camera under ``out_root/<camera name>``.
+
+    With ``index`` each finished segment is added to the camera's
+    ``archive_index.ArchiveIndex``.
+    """
+    from archive_index import open_index
+
+    recorders = []
+    for name, url in urls_with_names:
+        camera_dir = os.path.join(out_root, name)
+        os.makedirs(camera_dir, exist_ok=True)
+        if index:
+            kwargs['on_segment'] = open_index(camera_dir).add_segment
+        recorders.append(SegmentRecorder(name, url, camera_dir, **kwargs).start())
+    return recorders
@@ -1,19 +1,30 @@
 import os
-import cv2
 import json
 import math
-import numpy as np
+import time
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, List, Optional
 
 from brands.base import DVRInfo
-from brands.factory import get_brand
+from brands.factory import brand_for
+from camera_table import CameraTable
+from frame_pool import FramePool, resize_into
+from lazy_imports import lazy_module
+from overlay import overlays
+from playback_clock import ClockedCapture, PlaybackClock
+from sessions import LIVE, PLAYBACK, PRIORITY_NAMES, PROBE, host_of, open_capture, sessions
+from sinks import HighGuiSink
+from trickplay import PlaybackSource, TrickPlayer, play_window
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
 
 os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", "rtsp_transport;tcp")
 
 TARGET_CELL_W = 640
 TARGET_CELL_H = 360
 MAX_CHANNELS = 4
+SESSION_WAIT = 10.0
 
 
 def load_config(path: str) -> List[DVRInfo]:
@@ -22,58 +33,70 @@ def load_config(path: str) -> List[DVRInfo]:
     dvrs: List[DVRInfo] = []
     for d in cfg['dvrs']:
         dvrs.append(DVRInfo(
-            name=d['name'], ip=d['ip'], username=d['username'], password=d['password'], rtsp_url=d['rtsp_url']
+            name=d['name'], ip=d['ip'], username=d['username'], password=d['password'], rtsp_url=d['rtsp_url'],
+            brand=d.get('brand')
         ))
+        # Explicit max_sessions wins over the brand's default budget
+        limit = d.get('max_sessions') or brand_for(dvrs[-1]).capabilities.max_sessions
+        sessions.set_limit(host_of(d['rtsp_url']), limit)
     return dvrs
 
 
 def expand_all(dvrs: List[DVRInfo], use_substream: bool = True, max_channels: int = 16) -> List[DVRInfo]:
     out: List[DVRInfo] = []
     for d in dvrs:
-        brand = get_brand(d.name)
+        brand = brand_for(d)
         out.extend(brand.expand_channels(d, max_channels=max_channels, use_substream=use_substream))
     return out
 
 
+def expand_table(dvrs: List[DVRInfo], use_substream: bool = True, max_channels: int = 16) -> CameraTable:
+    """Compact equivalent of ``expand_all`` for large fleets (see camera_table)."""
+    return CameraTable.from_dvrs(dvrs, use_substream=use_substream, max_channels=max_channels)
+
+
 def playback_url(d: DVRInfo, start_time: datetime, duration: timedelta) -> str:
-    brand = get_brand(d.name)
+    brand = brand_for(d)
     return brand.build_playback_url(d, start_time, duration)
 
 
 def live_url(d: DVRInfo) -> str:
-    brand = get_brand(d.name)
+    brand = brand_for(d)
     return brand.build_live_url(d)
 
 
-def play_single_camera_at_timestamp(config_path: str, camera_name: str, ts: str, duration_minutes: int = 60):
-    """Play a single camera by name at a specific timestamp."""
+def playback_source(d: DVRInfo, start_time: datetime, duration: timedelta, archive_dir: str = None) -> str:
+    """Local archive playlist for the camera if it covers start_time, else the DVR playback URL."""
+    if archive_dir:
+        from archive_index import archive_source
+
+        local = archive_source(archive_dir, d.name, start_time.timestamp(), duration.total_seconds())
+        if local:
+            return local
+    return playback_url(d, start_time, duration)
+
+
+def play_single_camera_at_timestamp(config_path: str, camera_name: str, ts: str, duration_minutes: int = 60,
+                                    archive_dir: str = None, sink=None):
+    """Play a single camera by name at a specific timestamp.
+
+    With ``archive_dir`` the local recording is used when it covers ``ts``.
+    Fast-forward and scrubbing keys are described in trickplay.py.
+    """
     dvrs = load_config(config_path)
-    cams = expand_all(dvrs, use_substream=True)
-    target = None
-    for c in cams:
-        if c.name.lower() == camera_name.lower():
-            target = c
-            break
+    cams = expand_table(dvrs, use_substream=True)
+    target = cams.find(camera_name)
     if target is None:
-        print(f"Camera '{camera_name}' not found. Available: {[c.name for c in cams]}")
+        print(f"Camera '{camera_name}' not found. Available: {cams.names()}")
         return
     dt = datetime.fromisoformat(ts.replace('Z', '+00:00'))
-    url = playback_url(target, dt, timedelta(minutes=duration_minutes))
-    window = f"Playback - {target.name}"
-    cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
-    if not cap.isOpened():
+    source = PlaybackSource(target, dt, timedelta(minutes=duration_minutes), archive_dir)
+    url, _ = source(0.0)
+    cap, lease = open_capture(url, PLAYBACK, timeout=SESSION_WAIT)
+    if cap is None:
         print(f"Cannot open playback stream for {target.name}")
         return
-    cv2.namedWindow(window, cv2.WINDOW_AUTOSIZE)
-    while True:
-        ret, frame = cap.read()
-        if not ret or frame is None:
-            break
-        cv2.imshow(window, frame)
-        if (cv2.waitKey(1) & 0xFF) == ord('q'):
-            break
-    cap.release()
-    cv2.destroyWindow(window)
+    play_window(TrickPlayer(target.name, source, cap, lease), f"Playback - {target.name}", sink=sink)
 
 
 def run_playback_for_timestamps(config_path: str, timestamps: List[str], duration_minutes: int = 60):
@@ -89,99 +112,365 @@ def run_playback_for_timestamps(config_path: str, timestamps: List[str], duratio
     run_playback(config_path, ts, duration_minutes)
 
 
-def grid_play(urls_with_names: List[tuple]):
-    window_name = "All Cameras - Scalable Grid"
-    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-    cv2.resizeWindow(window_name, 1280, 720)
+def fit_tile(frame, name: str, cell_w: int = TARGET_CELL_W, cell_h: int = TARGET_CELL_H):
+    """Scale a frame into a padded, labelled grid cell."""
+    return fit_tile_into(np.empty((cell_h, cell_w, 3), dtype=np.uint8), frame, name)
+
+
+def fit_tile_into(dst, frame, name: str):
+    """``fit_tile`` written in place into ``dst`` (e.g. a view of the grid canvas)."""
+    resize_into(dst, frame)
+    return overlays.draw_label(dst, name)
+
+
+def placeholder_tile(name: str, cell_w: int = TARGET_CELL_W, cell_h: int = TARGET_CELL_H):
+    """Cached read-only "No Frame" cell (see ``overlay``)."""
+    return overlays.placeholder(name, cell_w, cell_h)
+
+
+def grid_shape(count: int) -> tuple:
+    cols = max(1, math.ceil(math.sqrt(count)))
+    rows = max(1, math.ceil(count / cols))
+    return rows, cols
+
+
+def grid_play(urls_with_names: List[tuple], workers: int = 0, max_channels: int = MAX_CHANNELS,
+              stages: Optional[List] = None, adaptive=None, priority: int = LIVE, clock=None, sink=None,
+              sources: Optional[Dict[str, PlaybackSource]] = None):
+    """Show streams in one grid window.
+
+    With ``workers`` > 0 decoding and tile scaling run in a pool of worker
+    processes (see ``decode_pool``) and this loop only composites.
+    ``stages`` are pipeline stages (see ``motion``) that receive every
+    iteration's frames via ``stage.process(names, frames)``.
+    ``adaptive`` is an ``adaptive_rate.AdaptiveRateScheduler`` that lowers
+    the decode rate of cameras without recent motion. Sessions are admitted
+    through the per-DVR budget at ``priority`` (see ``sessions``).
+    ``clock`` is a ``playback_clock.PlaybackClock`` that keeps recorded
+    streams on the same moment; keys 1/2/4/8 change speed, space pauses.
+    ``sources`` maps camera names to their ``trickplay.PlaybackSource`` so
+    a clocked stream can be reopened further on; without one, a DVR stream
+    (served at 1x) cannot keep up with faster speeds.
+    ``sink`` receives the composited grid instead of a window (see
+    ``sinks``); headless sinks run until Ctrl+C or until they end the run.
+    """
+    stages = list(stages or [])
+    if adaptive is not None and adaptive not in stages:
+        stages.append(adaptive)
+    sink = sink or HighGuiSink()
+    if workers > 0:
+        _grid_play_processes(urls_with_names, workers, max_channels, stages, priority, sink)
+        return
 
     caps = []
-    # Probe and include only working streams, up to MAX_CHANNELS
+    leases = []
+    # Probe and include only working streams, up to max_channels
     for name, url in urls_with_names:
-        if len(caps) >= MAX_CHANNELS:
+        if len(caps) >= max_channels:
             break
-        cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
-        if not cap.isOpened():
-            cap.release()
+        cap, lease = open_capture(url, priority, timeout=SESSION_WAIT)
+        if cap is None:
             continue
         # Read one frame to confirm
         ret, frame = cap.read()
         if not ret or frame is None:
             cap.release()
+            lease.release()
             continue
+        if adaptive is not None:
+            # The adaptive capture owns the lease: it may swap sessions
+            cap = adaptive.wrap(name, url, cap, lease, priority=priority)
+        else:
+            leases.append(lease)
+        if clock is not None:
+            cap = ClockedCapture(name, url, clock, cap=cap, keyframe_size=(TARGET_CELL_W, TARGET_CELL_H),
+                                 source_at=(sources or {}).get(name))
         caps.append((name, cap))
+    if clock is not None:
+        clock.start()
 
-    cols = math.ceil(math.sqrt(len(caps)))
-    rows = math.ceil(len(caps) / cols)
+    rows, cols = grid_shape(len(caps))
 
     print(f"Showing {len(caps)} cameras in a {rows}x{cols} grid. Press 'q' to quit.")
+    sink.open("All Cameras - Scalable Grid")
 
-    while True:
-        frames = []
-        for name, cap in caps:
-            ret, frame = cap.read()
-            if not ret or frame is None:
-                tile = np.zeros((TARGET_CELL_H, TARGET_CELL_W, 3), dtype=np.uint8)
-                cv2.putText(tile, f"No Frame: {name}", (10, TARGET_CELL_H // 2), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2, cv2.LINE_AA)
-                frames.append(tile)
-                continue
-            h, w = frame.shape[:2]
-            scale = min(TARGET_CELL_W / max(w, 1), TARGET_CELL_H / max(h, 1))
-            nw = max(1, int(w * scale)); nh = max(1, int(h * scale))
-            fr = cv2.resize(frame, (nw, nh))
-            top = (TARGET_CELL_H - nh) // 2; bottom = TARGET_CELL_H - nh - top
-            left = (TARGET_CELL_W - nw) // 2; right = TARGET_CELL_W - nw - left
-            fr = cv2.copyMakeBorder(fr, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(20, 20, 20))
-            cv2.putText(fr, name, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2, cv2.LINE_AA)
-            frames.append(fr)
-        while len(frames) < rows * cols:
-            frames.append(np.zeros((TARGET_CELL_H, TARGET_CELL_W, 3), dtype=np.uint8))
-        grid_rows = []
-        idx = 0
-        for r in range(rows):
-            row_frames = frames[idx:idx + cols]
-            idx += cols
-            grid_rows.append(cv2.hconcat(row_frames))
-        grid = cv2.vconcat(grid_rows)
-        cv2.imshow(window_name, grid)
-        if (cv2.waitKey(1) & 0xFF) == 'q':
-            break
+    names = [name for name, _ in caps]
+    pools = [FramePool(depth=2) for _ in caps]
+    # Tiles are scaled straight into their cell of one reusable canvas
+    grid = np.zeros((rows * TARGET_CELL_H, cols * TARGET_CELL_W, 3), dtype=np.uint8)
+    cells = [grid[r * TARGET_CELL_H:(r + 1) * TARGET_CELL_H, c * TARGET_CELL_W:(c + 1) * TARGET_CELL_W]
+             for r in range(rows) for c in range(cols)]
+    drawn = set()
+    try:
+        while True:
+            raw = []
+            for i, (name, cap) in enumerate(caps):
+                ret, frame = pools[i].read(cap)
+                if ret and frame is None and name in drawn:
+                    # Idle camera with no new frame this round: its cell keeps the last tile
+                    raw.append(None)
+                    continue
+                if not ret or frame is None:
+                    raw.append(None)
+                    cells[i][:] = placeholder_tile(name)
+                    drawn.add(name)
+                    continue
+                raw.append(frame)
+                fit_tile_into(cells[i], frame, name)
+                drawn.add(name)
+            for stage in stages:
+                stage.process(names, raw)
+            key = sink.show(grid)
+            if key == ord('q'):
+                break
+            if clock is not None:
+                clock.handle_key(key)
+    except KeyboardInterrupt:
+        pass
     for _, cap in caps:
         cap.release()
-    cv2.destroyWindow(window_name)
+    for lease in leases:
+        lease.release()
+    sink.close()
+
+
+def _admit(urls_with_names: List[tuple], priority: int, max_channels: int):
+    """Session leases for up to ``max_channels`` streams, as ([(name, url)], [lease]).
+
+    A DVR that had no free session is not waited on again.
+    """
+    admitted, leases, busy = [], [], set()
+    for name, url in urls_with_names:
+        if len(admitted) >= max_channels:
+            break
+        host = host_of(url)
+        if host in busy:
+            continue
+        lease = sessions.acquire(url, priority, timeout=SESSION_WAIT)
+        if lease is None:
+            print(f"No free {PRIORITY_NAMES[priority]} session on {host}; skipping its other cameras")
+            busy.add(host)
+            continue
+        admitted.append((name, url))
+        leases.append(lease)
+    return admitted, leases
+
+
+def _grid_play_processes(urls_with_names: List[tuple], workers: int, max_channels: int, stages: List,
+                         priority: int, sink):
+    from decode_pool import ProcessDecodePool
+
+    # Workers open their own captures, so their sessions are admitted here in the parent
+    urls_with_names, leases = _admit(urls_with_names, priority, max_channels)
+    if not urls_with_names:
+        print("No camera streams to show.")
+        return
+    rows, cols = grid_shape(len(urls_with_names))
+    print(f"Showing {len(urls_with_names)} cameras in a {rows}x{cols} grid "
+          f"across {workers} worker processes. Press 'q' to quit.")
+    sink.open("All Cameras - Scalable Grid")
+    names = [name for name, _ in urls_with_names]
+    with ProcessDecodePool(urls_with_names, workers, TARGET_CELL_W, TARGET_CELL_H) as pool:
+        try:
+            while True:
+                # Sleep until a worker has a new tile (or time out to keep the window responsive)
+                pool.wait(timeout=0.1)
+                canvas = pool.composite(rows, cols)
+                if stages and pool.updated:
+                    # Stages see the pre-scaled tiles as copied into the canvas, and only the ones that changed
+                    tiles = [pool.cell(i, cols) if i in pool.updated else None for i in range(len(names))]
+                    for stage in stages:
+                        stage.process(names, tiles)
+                lost = pool.check()
+                if lost:
+                    pool.mark_lost(rows, cols, lost)
+                if sink.show(canvas) == ord('q'):
+                    break
+        except KeyboardInterrupt:
+            pass
+    for lease in leases:
+        lease.release()
+    sink.close()
+
+
+def _motion_printer():
+    """Motion stage that reports when the set of active cameras changes."""
+    from motion import MotionDetector
+
+    state = {'active': set()}
+
+    def report(scores, regions):
+        active = {name for name, score in scores.items() if score >= 0.01}
+        if active != state['active']:
+            state['active'] = active
+            print(f"Motion: {', '.join(sorted(active)) or 'none'}")
+
+    return MotionDetector(on_scores=report)
 
 
-def run_live(config_path: str):
+def run_live(config_path: str, workers: int = 0, motion: bool = False, idle_fps: float = 0, layout: str = 'grid',
+             sink=None):
+    """Live grid. ``idle_fps`` > 0 slows cameras without motion to that rate.
+
+    ``layout`` '1+5' or '1+7' enlarges the most active camera on its main stream.
+    ``sink`` replaces the window (see ``sinks``).
+    """
     dvrs = load_config(config_path)
-    cams = expand_all(dvrs, use_substream=True)
+    cams = expand_table(dvrs, use_substream=True)
+    if layout != 'grid':
+        from focus import focus_play
+        focus_play(cams, layout=layout, sink=sink)
+        return
     urls = [(d.name, live_url(d)) for d in cams]
-    grid_play(urls)
+    stages = [_motion_printer()] if motion else []
+    adaptive = None
+    if idle_fps > 0 and not workers:
+        from adaptive_rate import AdaptiveRateScheduler
+        adaptive = AdaptiveRateScheduler(idle_fps=idle_fps, cell_size=(TARGET_CELL_W, TARGET_CELL_H))
+    grid_play(urls, workers=workers, max_channels=len(urls) if workers else MAX_CHANNELS, stages=stages,
+              adaptive=adaptive, sink=sink)
 
 
-def run_playback(config_path: str, ts: str, duration_minutes: int = 60):
+def run_playback(config_path: str, ts: str, duration_minutes: int = 60, workers: int = 0, archive_dir: str = None,
+                 sink=None):
     dvrs = load_config(config_path)
-    cams = expand_all(dvrs, use_substream=True)
+    cams = expand_table(dvrs, use_substream=True)
     dt = datetime.fromisoformat(ts.replace('Z', '+00:00'))
-    urls = [(d.name, playback_url(d, dt, timedelta(minutes=duration_minutes))) for d in cams]
-    grid_play(urls)
+    duration = timedelta(minutes=duration_minutes)
+    sources = {d.name: PlaybackSource(d, dt, duration, archive_dir) for d in cams}
+    urls = [(name, source(0.0)[0]) for name, source in sources.items()]
+    # The process pool decodes independently, so only the in-process grid is clocked
+    clock = PlaybackClock() if not workers else None
+    grid_play(urls, workers=workers, max_channels=len(urls) if workers else MAX_CHANNELS, priority=PLAYBACK,
+              clock=clock, sink=sink, sources=sources)
+
+
+def run_server(config_path: str, host: str = '0.0.0.0', port: int = 8080, hls_cache: str = 'hls_cache',
+               archive_dir: str = None):
+    """Serve live snapshots and MJPEG for every expanded camera over HTTP.
+
+    Recorded clips are served as HLS from ``/play/...`` and ``/hls/...``,
+    cached under ``hls_cache`` (see hls.py).
+    """
+    from hls import HlsCache, HlsSegmenter
+    from mjpeg_server import serve
+
+    dvrs = load_config(config_path)
+    cams = expand_table(dvrs, use_substream=True)
+    segmenter = HlsSegmenter(cams, HlsCache(hls_cache), archive_dir=archive_dir)
+    serve([(d.name, live_url(d)) for d in cams], host=host, port=port, hls=segmenter)
+
+
+def run_hls(config_path: str, camera_name: str, start: str, seconds: int = 60, hls_cache: str = 'hls_cache',
+            archive_dir: str = None):
+    """Remux one recorded clip into the HLS cache ahead of review and wait for it."""
+    from hls import HlsCache, HlsSegmenter, parse_start
+
+    dvrs = load_config(config_path)
+    cams = expand_table(dvrs, use_substream=True)
+    segmenter = HlsSegmenter(cams, HlsCache(hls_cache), archive_dir=archive_dir)
+    print(f"Remuxing {camera_name} from {start} (+{seconds}s)...")
+    try:
+        out_dir = segmenter.clip(camera_name, parse_start(start), seconds, complete=True)
+    except KeyError:
+        print(f"Camera '{camera_name}' not found. Available: {cams.names()}")
+        return None
+    except (RuntimeError, ValueError) as e:
+        print(e)
+        return None
+    print(f"HLS clip ready: {os.path.join(out_dir, 'index.m3u8')}")
+    return out_dir
+
+
+def run_health(config_path: str, interval: float = 5.0, once: bool = False, decode_probe: bool = True,
+               max_channels: int = 16):
+    """Watch every channel with RTSP OPTIONS/DESCRIBE; decode only on a change."""
+    from health import HealthMonitor, format_table
+
+    dvrs = load_config(config_path)
+    cams = expand_table(dvrs, use_substream=True, max_channels=max_channels)
+
+    def changed(h):
+        print(f"{time.strftime('%H:%M:%S')} {h.name}: {h.state}" + (f" ({h.error})" if h.error else ''))
 
+    monitor = HealthMonitor(cams, interval=interval, decode_probe=decode_probe, on_change=changed)
+    if once:
+        monitor.check_once()
+        monitor.settle()
+        print(format_table(monitor.table()))
+        monitor.stop()
+        return monitor.table()
+    print(f"Watching {len(cams)} channels every {interval:g}s (Ctrl+C to stop)")
+    monitor.check_once()
+    print(format_table(monitor.table()))
+    monitor.start()
+    try:
+        while True:
+            time.sleep(60)
+            print(f"{time.strftime('%H:%M:%S')} " + ', '.join(f"{n} {s}" for s, n in sorted(monitor.summary().items())))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        monitor.stop()
+    return monitor.table()
+
+
+def run_record(config_path: str, out_dir: str = 'recordings', segment_seconds: int = 300,
+               max_segment_mb: float = 0, fmt: str = 'ts', use_substream: bool = False):
+    """Archive every channel as passthrough segments until Ctrl+C."""
+    from recorder import record_cameras
 
-def run_list(config_path: str, use_substream: bool = True, max_channels: int = 16):
-    """List only connected cameras by probing RTSP quickly."""
     dvrs = load_config(config_path)
-    cams = expand_all(dvrs, use_substream=use_substream, max_channels=max_channels)
+    cams = expand_table(dvrs, use_substream=use_substream)
+    max_bytes = int(max_segment_mb * 1024 * 1024) if max_segment_mb else None
+    recorders = record_cameras([(d.name, live_url(d)) for d in cams], out_dir,
+                               segment_seconds=segment_seconds, max_segment_bytes=max_bytes, fmt=fmt)
+    print(f"Recording {len(recorders)} cameras to {out_dir}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    for r in recorders:
+        r.stop()
+
+
+def run_list(config_path: str, use_substream: bool = True, max_channels: int = 16, snapshots: bool = True):
+    """List only connected cameras by probing RTSP quickly.
+
+    With ``snapshots`` a camera whose HTTP snapshot decodes as a JPEG counts
+    as connected without opening an RTSP session; the rest are probed over
+    RTSP as before.
+    """
+    dvrs = load_config(config_path)
+    cams = expand_table(dvrs, use_substream=use_substream, max_channels=max_channels)
+    snapped = {}
+    if snapshots:
+        from snapshot import SnapshotFetcher, decode_jpeg
+
+        fetcher = SnapshotFetcher()
+        snapped = {name: decode_jpeg(jpeg) is not None for name, jpeg in fetcher.fetch_many(cams).items()}
+        fetcher.close()
     connected = []
     for c in cams:
+        if snapped.get(c.name):
+            connected.append(c)
+            continue
         url = live_url(c)
-        cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+        # Probes take the lowest priority and give way to live viewers
+        cap, lease = open_capture(url, PROBE, timeout=SESSION_WAIT)
         ok = False
-        if cap.isOpened():
+        if cap is not None:
             # Try to read a few frames to ensure the stream is actually usable
             for _ in range(3):
+                if lease.yield_requested:
+                    break
                 ret, frame = cap.read()
                 if ret and frame is not None:
                     ok = True
                     break
-        cap.release()
+            cap.release()
+            lease.release()
         if ok:
             connected.append(c)
     if not connected:
@@ -192,16 +481,140 @@ def run_list(config_path: str, use_substream: bool = True, max_channels: int = 1
         print(f"{idx}. {c.name} ({c.ip})")
 
 
+def run_thumbnails(config_path: str, out_dir: Optional[str] = None, max_channels: int = 16,
+                   refresh: float = 5.0, sink=None):
+    """Thumbnail wall from HTTP snapshots; no RTSP sessions are opened.
+
+    With ``out_dir`` each camera's JPEG is saved there once. Otherwise the
+    wall goes to ``sink`` (a window by default) and is refreshed every
+    ``refresh`` seconds until 'q'.
+    """
+    from snapshot import SnapshotFetcher, decode_jpeg
+
+    dvrs = load_config(config_path)
+    cams = expand_table(dvrs, use_substream=True, max_channels=max_channels)
+    fetcher = SnapshotFetcher(ttl=refresh)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        saved = 0
+        for name, jpeg in fetcher.fetch_many(cams).items():
+            if jpeg:
+                with open(os.path.join(out_dir, f"{name}.jpg"), 'wb') as f:
+                    f.write(jpeg)
+                saved += 1
+        fetcher.close()
+        print(f"Saved {saved}/{len(cams)} thumbnails to {out_dir}")
+        return
+    names = cams.names()
+    rows, cols = grid_shape(len(names))
+    cell_w, cell_h = TARGET_CELL_W // 2, TARGET_CELL_H // 2
+    sink = sink or HighGuiSink(size=None)
+    sink.open("Thumbnails")
+    print(f"Showing snapshots of {len(names)} cameras. Press 'q' to quit.")
+    while True:
+        snaps = fetcher.fetch_many(cams)
+        canvas = np.zeros((rows * cell_h, cols * cell_w, 3), dtype=np.uint8)
+        for i, name in enumerate(names):
+            frame = decode_jpeg(snaps.get(name))
+            tile = fit_tile(frame, name, cell_w, cell_h) if frame is not None else placeholder_tile(name, cell_w, cell_h)
+            r, c = divmod(i, cols)
+            canvas[r * cell_h:(r + 1) * cell_h, c * cell_w:(c + 1) * cell_w] = tile
+        try:
+            if sink.show(canvas, int(refresh * 1000)) == ord('q'):
+                break
+        except KeyboardInterrupt:
+            break
+    fetcher.close()
+    sink.close()
+
+
+def run_timeline(config_path: str, start: str, end: str, interval: int = 60, size: tuple = (160, 90),
+                 cache_dir: str = 'thumbnails', archive_dir: str = None, max_channels: int = 16):
+    """Build (or read from cache) timeline thumbnails for every camera over [start, end)."""
+    from timeline import ThumbnailCache, TimelineBuilder
+
+    dvrs = load_config(config_path)
+    cams = expand_table(dvrs, use_substream=True, max_channels=max_channels)
+    start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
+    end_dt = datetime.fromisoformat(end.replace('Z', '+00:00'))
+    builder = TimelineBuilder(ThumbnailCache(cache_dir), interval=interval, size=size, archive_dir=archive_dir)
+    strips = builder.build(cams, start_dt, end_dt)
+    for name, strip in strips.items():
+        have = sum(1 for _, path in strip if path)
+        print(f"{name}: {have}/{len(strip)} thumbnails")
+    print(f"Thumbnails cached under {cache_dir}")
+    return strips
+
+
+def _option(argv: List[str], flag: str, default=None):
+    """Return the value following ``flag`` in argv, or ``default``."""
+    if flag in argv:
+        idx = argv.index(flag)
+        if idx + 1 < len(argv):
+            return argv[idx + 1]
+    return default
+
+
 if __name__ == "__main__":
     import sys
+    from sinks import make_sink
+
+    workers = int(_option(sys.argv, '--workers', 0))
+    sink = make_sink(_option(sys.argv, '--sink'), headless='--headless' in sys.argv, output=_option(sys.argv, '--output'),
+                     fps=float(_option(sys.argv, '--output-fps', 15)), bitrate=_option(sys.argv, '--output-bitrate', '4M'))
     if len(sys.argv) > 1 and sys.argv[1] == 'live':
-        run_live('dvr_config.json')
+        run_live('dvr_config.json', workers=workers, motion='--motion' in sys.argv,
+                 idle_fps=float(_option(sys.argv, '--idle-fps', 0)), layout=_option(sys.argv, '--layout', 'grid'),
+                 sink=sink)
     elif len(sys.argv) > 2 and sys.argv[1] == 'timestamp':
-        run_playback('dvr_config.json', sys.argv[2])
+        run_playback('dvr_config.json', sys.argv[2], workers=workers, archive_dir=_option(sys.argv, '--archive'),
+                     sink=sink)
+    elif len(sys.argv) > 3 and sys.argv[1] == 'timeline':
+        size = tuple(int(v) for v in _option(sys.argv, '--size', '160x90').split('x'))
+        run_timeline('dvr_config.json', sys.argv[2], sys.argv[3], interval=int(_option(sys.argv, '--interval', 60)),
+                     size=size, cache_dir=_option(sys.argv, '--cache', 'thumbnails'),
+                     archive_dir=_option(sys.argv, '--archive'))
     elif len(sys.argv) > 1 and sys.argv[1] == 'list':
-        run_list('dvr_config.json')
+        run_list('dvr_config.json', snapshots='--no-snapshots' not in sys.argv)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'health':
+        run_health('dvr_config.json', interval=float(_option(sys.argv, '--interval', 5.0)), once='--once' in sys.argv,
+                   decode_probe='--no-decode' not in sys.argv)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'thumbnails':
+        run_thumbnails('dvr_config.json', out_dir=_option(sys.argv, '--out'),
+                       refresh=float(_option(sys.argv, '--refresh', 5.0)), sink=sink)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'record':
+        run_record('dvr_config.json', out_dir=_option(sys.argv, '--out', 'recordings'),
+                   segment_seconds=int(_option(sys.argv, '--segment-seconds', 300)),
+                   max_segment_mb=float(_option(sys.argv, '--max-segment-mb', 0)),
+                   fmt=_option(sys.argv, '--format', 'ts'))
+    elif len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        run_server('dvr_config.json', port=int(_option(sys.argv, '--port', 8080)),
+                   hls_cache=_option(sys.argv, '--hls-cache', 'hls_cache'), archive_dir=_option(sys.argv, '--archive'))
+    elif len(sys.argv) > 3 and sys.argv[1] == 'hls':
+        run_hls('dvr_config.json', sys.argv[2], sys.argv[3], seconds=int(_option(sys.argv, '--seconds', 60)),
+                hls_cache=_option(sys.argv, '--hls-cache', 'hls_cache'), archive_dir=_option(sys.argv, '--archive'))
     else:
         print("Usage:")
         print("  python scalable_player.py live")
         print("  python scalable_player.py timestamp 2025-10-10T10:00:00")
-        print("  python scalable_player.py list  # list expanded camera channels")
+        print("  python scalable_player.py timeline 2025-10-10T00:00:00 2025-10-11T00:00:00 [--interval 60] "
+              "[--size 160x90] [--cache DIR] [--archive DIR]")
+        print("  python scalable_player.py list [--no-snapshots]  # list expanded camera channels")
+        print("  python scalable_player.py health [--interval 5] [--once] [--no-decode]  "
+              "# up/down/latency via RTSP OPTIONS/DESCRIBE")
+        print("  python scalable_player.py thumbnails [--out DIR] [--refresh 5]  # HTTP snapshot wall, no RTSP")
+        print("  python scalable_player.py serve [--port 8080] [--hls-cache DIR] [--archive DIR]  "
+              "# /snapshot/<camera>, /mjpeg/<camera>, /play/<camera>/<start>/<seconds>")
+        print("  python scalable_player.py hls <camera> 2025-10-10T10:00:00 [--seconds 60] [--hls-cache DIR]  "
+              "# pre-build a browser clip")
+        print("  python scalable_player.py record [--out DIR] [--segment-seconds 300] [--max-segment-mb N] [--format ts|mkv|mp4]")
+        print("  add --motion to live to report cameras with motion")
+        print("  add --idle-fps 1 to live to decode cameras without motion at 1 fps")
+        print("  add --layout 1+5 (or 1+7) to live to enlarge the active camera on its main stream")
+        print("  add --archive DIR to timestamp to prefer locally recorded footage")
+        print("  during timestamp playback press 1/2/4/8 for speed and space to pause")
+        print("  add --workers N to live/timestamp to decode in N worker processes")
+        print("  add --headless to live/timestamp/thumbnails to run without a display")
+        print("  add --sink null|file:PATH|shm:NAME|http:PORT (comma-separated for several) to send the grid elsewhere")
+        print("  add --output wall.mp4|wall/index.m3u8|rtsp://... [--output-fps 15] [--output-bitrate 4M] "
+              "to encode the grid as one stream")
@@ -0,0 +1,166 @@
+"""Per-DVR admission control for RTSP sessions.
+
+DVRs cap simultaneous RTSP sessions and fail new ones unpredictably once
+the cap is hit. Every capture opens through a ``SessionBudget`` for its
+host. The budget is a priority semaphore: waiters are admitted in priority
+order (LIVE before PLAYBACK before RECORD before PROBE). When a
+higher-priority request is blocked, lower-priority holders are asked to
+yield through ``Lease.yield_requested``, which long-running probes, exports
+and recorders check.
+
+RECORD sits below the interactive classes: an archive that stops to let a
+viewer in loses a few seconds of footage, while a viewer locked out by bulk
+recording gets no picture at all. It sits above PROBE so health checks and
+thumbnails never interrupt a recording.
+"""
+import threading
+import time
+from typing import Dict, Optional, Set
+from urllib.parse import urlparse
+
+from lazy_imports import lazy_module
+
+cv2 = lazy_module('cv2')
+
+LIVE = 0
+PLAYBACK = 1
+RECORD = 2
+PROBE = 3
+PRIORITY_NAMES = {LIVE: 'live', PLAYBACK: 'playback', RECORD: 'record', PROBE: 'probe'}
+
+DEFAULT_MAX_SESSIONS = 8
+
+
+class Lease:
+    """One admitted session; release it when the capture is closed."""
+
+    def __init__(self, budget: 'SessionBudget', priority: int):
+        self.budget = budget
+        self.priority = priority
+        self._yield = threading.Event()
+        self._released = False
+
+    @property
+    def yield_requested(self) -> bool:
+        """True when a higher-priority request is waiting for this slot."""
+        return self._yield.is_set()
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.budget._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SessionBudget:
+    def __init__(self, host: str, limit: int = DEFAULT_MAX_SESSIONS):
+        self.host = host
+        self.limit = limit
+        self._cond = threading.Condition()
+        self._leases: Set[Lease] = set()
+        self._waiting: Dict[int, int] = {}
+
+    @property
+    def in_use(self) -> int:
+        return len(self._leases)
+
+    def _can_take(self, priority: int) -> bool:
+        if len(self._leases) >= self.limit:
+            return False
+        return not any(n for p, n in self._waiting.items() if p < priority)
+
+    def _request_yield(self, priority: int):
+        if len(self._leases) < self.limit:
+            return
+        candidates = [l for l in self._leases if l.priority > priority and not l.yield_requested]
+        if candidates:
+            max(candidates, key=lambda l: l.priority)._yield.set()
+
+    def acquire(self, priority: int = LIVE, timeout: Optional[float] = None) -> Optional[Lease]:
+        """Wait for a slot; returns None if ``timeout`` expires first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiting[priority] = self._waiting.get(priority, 0) + 1
+            try:
+                while not self._can_take(priority):
+                    self._request_yield(priority)
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+                lease = Lease(self, priority)
+                self._leases.add(lease)
+                return lease
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def _release(self, lease: Lease):
+        with self._cond:
+            self._leases.discard(lease)
+            self._cond.notify_all()
+
+
+class SessionManager:
+    """Session budgets keyed by DVR host."""
+
+    def __init__(self, default_limit: int = DEFAULT_MAX_SESSIONS):
+        self.default_limit = default_limit
+        self._budgets: Dict[str, SessionBudget] = {}
+        self._lock = threading.Lock()
+
+    def budget(self, host: str) -> SessionBudget:
+        with self._lock:
+            budget = self._budgets.get(host)
+            if budget is None:
+                # Local files (archive playback) are not a DVR and need no cap
+                limit = self.default_limit if host != 'local' else 1 << 30
+                budget = SessionBudget(host, limit)
+                self._budgets[host] = budget
+            return budget
+
+    def set_limit(self, host: str, limit: int):
+        budget = self.budget(host)
+        with budget._cond:
+            budget.limit = max(1, int(limit))
+            budget._cond.notify_all()
+
+    def budget_for_url(self, url: str) -> SessionBudget:
+        return self.budget(host_of(url))
+
+    def acquire(self, url: str, priority: int = LIVE, timeout: Optional[float] = None) -> Optional[Lease]:
+        return self.budget_for_url(url).acquire(priority, timeout)
+
+
+def host_of(url: str) -> str:
+    """DVR host for a URL; local files share the uncapped 'local' key."""
+    try:
+        return urlparse(url).hostname or 'local'
+    except ValueError:
+        return 'local'
+
+
+sessions = SessionManager()
+
+
+def open_capture(url: str, priority: int = LIVE, timeout: Optional[float] = None):
+    """Admit and open a capture; returns (cap, lease) or (None, None).
+
+    The lease is released here if the capture fails to open; otherwise the
+    caller releases it after ``cap.release()``.
+    """
+    lease = sessions.acquire(url, priority, timeout)
+    if lease is None:
+        print(f"No free {PRIORITY_NAMES.get(priority, priority)} session on {host_of(url)}")
+        return None, None
+    cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+    if not cap.isOpened():
+        cap.release()
+        lease.release()
+        return None, None
+    return cap, lease
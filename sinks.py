@@ -0,0 +1,409 @@
+"""Output sinks for the players' composited frames.
+
+Players hand every frame to a sink instead of calling ``cv2.namedWindow`` /
+``imshow`` / ``waitKey`` themselves, so the same capture and compositing
+loop also runs on machines without a display. A sink has three methods:
+
+* ``open(title)``: called once by the player with its window title.
+* ``show(frame, wait=1)``: takes the frame (None to only poll for keys) and
+  returns a key code like ``cv2.waitKey(wait) & 0xFF``, or ``NO_KEY``.
+  ``wait`` is the pause in ms the player asks for. Headless sinks only
+  honour waits longer than 1 ms, so grids run at full speed.
+* ``close()``: called when the player returns.
+
+Sinks:
+
+* ``HighGuiSink``: an OpenCV window (the default).
+* ``NullSink``: discards frames and counts them. Use it for benchmarks and
+  for headless analytics nodes where only the pipeline stages matter. It
+  can end the run after ``max_frames`` or ``duration`` seconds.
+* ``FileSink``: the newest frame as a JPEG, rewritten atomically at most
+  every ``interval`` seconds.
+* ``SharedMemorySink``: raw frames in a named shared memory block for
+  another local process (read with ``SharedFrameReader``).
+* ``HttpSink``: ``/snapshot/<name>`` and ``/mjpeg/<name>`` via
+  ``mjpeg_server``.
+* ``TeeSink``: several of the above at once.
+* ``video_encoder.EncoderSink``: one encoded stream to a file, HLS or RTSP.
+
+``make_sink`` builds sinks from command-line specs such as ``null``,
+``file:grid.jpg``, ``shm:dvr_grid``, ``http:8090`` or ``encode:wall.mp4``.
+"""
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from lazy_imports import lazy_module
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+NO_KEY = 0xFF
+
+
+class Sink:
+    """Base sink: ignores frames and never reports a key."""
+
+    def open(self, title: str):
+        pass
+
+    def show(self, frame, wait: int = 1) -> int:
+        if wait > 1:
+            time.sleep(wait / 1000.0)
+        return NO_KEY
+
+    def close(self):
+        pass
+
+
+class HighGuiSink(Sink):
+    """Show frames in an OpenCV window named ``window`` (default: the player's title)."""
+
+    def __init__(self, window: Optional[str] = None, size: Optional[Tuple[int, int]] = (1280, 720),
+                 autosize: bool = False):
+        self.window = window
+        self.size = size
+        self.autosize = autosize
+        self._open = False
+
+    def open(self, title: str):
+        self.window = self.window or title
+        cv2.namedWindow(self.window, cv2.WINDOW_AUTOSIZE if self.autosize else cv2.WINDOW_NORMAL)
+        if self.size and not self.autosize:
+            cv2.resizeWindow(self.window, *self.size)
+        self._open = True
+
+    def show(self, frame, wait: int = 1) -> int:
+        if frame is not None:
+            cv2.imshow(self.window, frame)
+        return cv2.waitKey(wait) & 0xFF
+
+    def close(self):
+        if self._open:
+            cv2.destroyWindow(self.window)
+            self._open = False
+
+
+class NullSink(Sink):
+    """Count frames and drop them; returns 'q' once ``max_frames`` or ``duration`` is reached."""
+
+    def __init__(self, max_frames: int = 0, duration: float = 0.0, report: float = 0.0):
+        self.max_frames = max_frames
+        self.duration = duration
+        self.report = report
+        self.frames = 0
+        self.started: Optional[float] = None
+        self._reported = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started if self.started is not None else 0.0
+
+    @property
+    def fps(self) -> float:
+        elapsed = self.elapsed
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+    def show(self, frame, wait: int = 1) -> int:
+        if frame is not None:
+            if self.started is None:
+                self.started = self._reported = time.monotonic()
+            self.frames += 1
+            if self.report and time.monotonic() - self._reported >= self.report:
+                self._reported = time.monotonic()
+                print(f"{self.frames} frames, {self.fps:.1f} fps")
+        if (self.max_frames and self.frames >= self.max_frames) or (self.duration and self.elapsed >= self.duration):
+            return ord('q')
+        return super().show(frame, wait)
+
+
+class FileSink(Sink):
+    """Keep ``path`` as a JPEG of the newest frame, rewritten at most every ``interval`` seconds."""
+
+    def __init__(self, path: str, interval: float = 1.0, quality: int = 85):
+        self.path = path
+        self.interval = interval
+        self.quality = quality
+        self._written = 0.0
+
+    def show(self, frame, wait: int = 1) -> int:
+        now = time.monotonic()
+        if frame is not None and now - self._written >= self.interval:
+            ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if ok:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                # Write-then-rename so readers never see a partial file
+                fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(buf.tobytes())
+                os.replace(tmp, self.path)
+                self._written = now
+        return super().show(frame, wait)
+
+
+# seq, height, width, channels; seq is odd while a frame is being written
+_SHM_HEADER = struct.Struct('<QIII')
+
+
+class SharedMemorySink(Sink):
+    """Publish raw frames in the shared memory block ``name``.
+
+    The block is created on the first frame, sized for that frame's shape.
+    It holds a small header and then the pixels. The header's sequence
+    number is odd while a frame is being copied in, so readers can detect
+    torn reads (see ``SharedFrameReader``).
+    """
+
+    def __init__(self, name: str = 'dvr_grid'):
+        self.name = name
+        self.seq = 0
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._pixels = None
+
+    def _create(self, frame):
+        h, w = frame.shape[:2]
+        c = frame.shape[2] if frame.ndim == 3 else 1
+        self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=_SHM_HEADER.size + h * w * c)
+        self._pixels = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shm.buf, offset=_SHM_HEADER.size)
+        _SHM_HEADER.pack_into(self._shm.buf, 0, 0, h, w, c)
+
+    def show(self, frame, wait: int = 1) -> int:
+        if frame is not None:
+            if self._shm is None:
+                self._create(frame)
+            if frame.shape != self._pixels.shape:
+                raise ValueError(f"Frame shape changed from {self._pixels.shape} to {frame.shape}")
+            h, w = frame.shape[:2]
+            c = frame.shape[2] if frame.ndim == 3 else 1
+            _SHM_HEADER.pack_into(self._shm.buf, 0, self.seq + 1, h, w, c)
+            np.copyto(self._pixels, frame)
+            self.seq += 2
+            _SHM_HEADER.pack_into(self._shm.buf, 0, self.seq, h, w, c)
+        return super().show(frame, wait)
+
+    def close(self):
+        if self._shm is not None:
+            self._pixels = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+class SharedFrameReader:
+    """Read frames published by a ``SharedMemorySink`` in another process."""
+
+    def __init__(self, name: str = 'dvr_grid'):
+        self._shm = shared_memory.SharedMemory(name=name)
+        _, h, w, c = _SHM_HEADER.unpack_from(self._shm.buf, 0)
+        shape = (h, w) if c == 1 else (h, w, c)
+        self._pixels = np.ndarray(shape, dtype=np.uint8, buffer=self._shm.buf, offset=_SHM_HEADER.size)
+
+    def read(self, last_seq: int = -1, retries: int = 5):
+        """(seq, frame copy) of the newest frame; frame is None if unchanged since ``last_seq`` or torn."""
+        for _ in range(retries):
+            seq = _SHM_HEADER.unpack_from(self._shm.buf, 0)[0]
+            if seq == last_seq or seq == 0:
+                return seq, None
+            if seq % 2:
+                time.sleep(0.001)
+                continue
+            frame = self._pixels.copy()
+            if _SHM_HEADER.unpack_from(self._shm.buf, 0)[0] == seq:
+                return seq, frame
+        return last_seq, None
+
+    def close(self):
+        self._pixels = None
+        self._shm.close()
+
+
+class _FrameSlot:
+    """The consumer side of ``CameraStream`` (``latest``/``wait_newer``/``hold``/``touch``) for pushed frames."""
+
+    def __init__(self, depth: int = 3):
+        self.seq = 0
+        self.frame = None
+        self.timestamp = 0.0
+        self._depth = depth
+        self._ring: List[object] = []
+        self._pinned: Dict[int, int] = {}
+        self._cond = threading.Condition()
+
+    def touch(self):
+        pass
+
+    def latest(self):
+        with self._cond:
+            return self.seq, self.frame, self.timestamp
+
+    def wait_newer(self, seq: int, timeout: float = 5.0):
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != seq, timeout=timeout)
+            return self.seq, self.frame, self.timestamp
+
+    @contextmanager
+    def hold(self):
+        with self._cond:
+            seq, frame, ts = self.seq, self.frame, self.timestamp
+            if frame is not None:
+                self._pinned[id(frame)] = self._pinned.get(id(frame), 0) + 1
+        try:
+            yield seq, frame, ts
+        finally:
+            if frame is not None:
+                with self._cond:
+                    count = self._pinned.pop(id(frame), 0) - 1
+                    if count > 0:
+                        self._pinned[id(frame)] = count
+
+    def publish(self, frame):
+        # Players reuse their canvas, so keep a copy; a ring of buffers lets
+        # a JPEG encode of the previous frame finish while the next arrives
+        with self._cond:
+            # A held buffer is left to its consumer
+            reuse = (len(self._ring) >= self._depth and self._ring[0].shape == frame.shape
+                     and id(self._ring[0]) not in self._pinned)
+        if not reuse:
+            self._ring.append(frame.copy())
+            self._ring = self._ring[-self._depth:]
+            buf = self._ring[-1]
+        else:
+            buf = self._ring.pop(0)
+            np.copyto(buf, frame)
+            self._ring.append(buf)
+        with self._cond:
+            self.frame = buf
+            self.seq += 1
+            self.timestamp = time.time()
+            self._cond.notify_all()
+
+
+class _SlotHub:
+    """Minimal ``StreamHub`` look-alike over a single ``_FrameSlot``."""
+
+    def __init__(self, name: str, slot: _FrameSlot):
+        self._name = name
+        self._slot = slot
+
+    def get(self, name: str) -> Optional[_FrameSlot]:
+        return self._slot if name == self._name else None
+
+    def names(self) -> List[str]:
+        return [self._name]
+
+    def stop_all(self):
+        pass
+
+
+class HttpSink(Sink):
+    """Serve frames as ``/snapshot/<name>`` and ``/mjpeg/<name>`` (see ``mjpeg_server``)."""
+
+    def __init__(self, port: int = 8090, host: str = '0.0.0.0', name: str = 'grid'):
+        self.port = port
+        self.host = host
+        self.name = name
+        self._slot = _FrameSlot()
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    def open(self, title: str):
+        from mjpeg_server import FrameServer
+
+        self._server = FrameServer((self.host, self.port), _SlotHub(self.name, self._slot))
+        self._thread = threading.Thread(target=self._server.serve_forever, name='http-sink')
+        self._thread.daemon = True
+        self._thread.start()
+        print(f"{title}: http://{self.host}:{self.port}/mjpeg/{self.name}")
+
+    def show(self, frame, wait: int = 1) -> int:
+        if frame is not None:
+            self._slot.publish(frame)
+        return super().show(frame, wait)
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class TeeSink(Sink):
+    """Forward every frame to several sinks; the first key any of them reports wins."""
+
+    def __init__(self, *sinks: Sink):
+        self.sinks = list(sinks)
+
+    def open(self, title: str):
+        for sink in self.sinks:
+            sink.open(title)
+
+    def show(self, frame, wait: int = 1) -> int:
+        # Only one sink should actually pause for the requested wait
+        pausing = next((s for s in self.sinks if isinstance(s, HighGuiSink)), self.sinks[-1] if self.sinks else None)
+        key = NO_KEY
+        for sink in self.sinks:
+            k = sink.show(frame, wait if sink is pausing else 1)
+            if key == NO_KEY:
+                key = k
+        return key
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def make_sink(spec: Optional[str] = None, headless: bool = False, output: Optional[str] = None,
+              fps: float = 15.0, bitrate: str = '4M') -> Optional[Sink]:
+    """Build a sink from a spec; None means the player's own window.
+
+    Specs: ``window``, ``null``, ``file:PATH``, ``shm:NAME``, ``http:PORT``,
+    ``http:HOST:PORT`` or ``encode:TARGET``. Several specs separated by ','
+    are combined in a ``TeeSink``. With ``headless`` and no spec the frames
+    go to a ``NullSink``, and a ``window`` spec is an error.
+
+    ``output`` adds an ``EncoderSink`` for that target at ``fps`` and
+    ``bitrate``. Unless ``headless`` or a spec is given, the window stays
+    open next to it.
+    """
+    if not spec:
+        if output and not headless:
+            spec = 'window'
+        elif not output:
+            return NullSink() if headless else None
+    sinks = []
+    for part in (spec.split(',') if spec else []):
+        kind, _, arg = part.strip().partition(':')
+        if kind == 'window':
+            if headless:
+                raise ValueError("A 'window' sink cannot be used in headless mode")
+            sinks.append(HighGuiSink(arg or None))
+        elif kind == 'null':
+            sinks.append(NullSink())
+        elif kind == 'file':
+            sinks.append(FileSink(arg or 'grid.jpg'))
+        elif kind == 'shm':
+            sinks.append(SharedMemorySink(arg or 'dvr_grid'))
+        elif kind == 'http':
+            host, _, port = arg.rpartition(':')
+            sinks.append(HttpSink(int(port or 8090), host or '0.0.0.0'))
+        elif kind == 'encode':
+            sinks.append(_encoder(arg, fps, bitrate))
+        else:
+            raise ValueError(f"Unknown sink '{part}', expected window, null, file:PATH, shm:NAME, http:PORT "
+                             f"or encode:TARGET")
+    if output:
+        sinks.append(_encoder(output, fps, bitrate))
+    return sinks[0] if len(sinks) == 1 else TeeSink(*sinks)
+
+
+def _encoder(target: str, fps: float, bitrate: str) -> Sink:
+    from video_encoder import EncoderSink
+
+    if not target:
+        raise ValueError("An encode sink needs a target, e.g. encode:wall.mp4")
+    return EncoderSink(target, fps=fps, bitrate=bitrate)
@@ -0,0 +1,189 @@
+"""Timeline thumbnail strips for picking a playback timestamp.
+
+``TimelineBuilder`` makes one thumbnail per camera every ``interval``
+seconds over a time range, decoding keyframes only:
+
+* Local archive footage (see ``archive_index``) is read once through a
+  ``KeyframeReader`` (I-frames only), and each bucket takes the first
+  keyframe at or after its start.
+* Everything else comes from the DVR. For each bucket the brand playback
+  URL is opened at the bucket's start and only its first frame, the
+  leading I-frame, is decoded. DVRs serve playback at 1x, so reading a
+  day of footage as a stream is not an option.
+
+Cameras run in parallel. Each one holds a PROBE-priority session from the
+per-DVR budget and gives it back between buckets when a viewer needs it.
+
+Thumbnails are kept in a content-addressed disk cache: the file name is a
+hash of (camera, bucket, size). Scrubbing a range that was already built
+reads JPEGs from disk and opens no RTSP session at all.
+"""
+import hashlib
+import math
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from frame_pool import resize_into
+from keyframe_reader import KeyframeReader, keyframes_available
+from lazy_imports import lazy_module
+from sessions import PROBE, sessions
+from trickplay import PlaybackSource, open_at
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+DEFAULT_INTERVAL = 60
+THUMB_SIZE = (160, 90)
+JPEG_QUALITY = 70
+SESSION_WAIT = 30.0
+
+
+class ThumbnailCache:
+    """JPEG thumbnails on disk, addressed by a hash of (camera, bucket, size)."""
+
+    def __init__(self, root: str = 'thumbnails'):
+        self.root = root
+
+    @staticmethod
+    def key(camera: str, bucket: int, size: Tuple[int, int]) -> str:
+        return hashlib.sha1(f"{camera}|{bucket}|{size[0]}x{size[1]}".encode()).hexdigest()
+
+    def path(self, camera: str, bucket: int, size: Tuple[int, int]) -> str:
+        key = self.key(camera, bucket, size)
+        # Two-level fan-out keeps directories small over long ranges
+        return os.path.join(self.root, key[:2], key[2:] + '.jpg')
+
+    def get(self, camera: str, bucket: int, size: Tuple[int, int]) -> Optional[str]:
+        path = self.path(camera, bucket, size)
+        return path if os.path.exists(path) else None
+
+    def put(self, camera: str, bucket: int, size: Tuple[int, int], jpeg: bytes) -> str:
+        path = self.path(camera, bucket, size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(jpeg)
+        os.replace(tmp, path)
+        return path
+
+
+class TimelineBuilder:
+    def __init__(self, cache: Optional[ThumbnailCache] = None, interval: int = DEFAULT_INTERVAL,
+                 size: Tuple[int, int] = THUMB_SIZE, archive_dir: Optional[str] = None, workers: int = 8):
+        self.cache = cache or ThumbnailCache()
+        self.interval = int(interval)
+        self.size = size
+        self.archive_dir = archive_dir
+        self.workers = workers
+
+    def buckets(self, start: float, end: float) -> List[int]:
+        """Bucket start times (epoch seconds, aligned to ``interval``) covering [start, end)."""
+        first = int(math.floor(start / self.interval)) * self.interval
+        return list(range(first, int(math.ceil(end)), self.interval))
+
+    def _encode(self, frame) -> Optional[bytes]:
+        w, h = self.size
+        tile = resize_into(np.empty((h, w, 3), dtype=np.uint8), frame)
+        ok, buf = cv2.imencode('.jpg', tile, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        return buf.tobytes() if ok else None
+
+    def _store(self, name: str, bucket: int, frame, on_thumb) -> Optional[str]:
+        jpeg = self._encode(frame)
+        if jpeg is None:
+            return None
+        path = self.cache.put(name, bucket, self.size, jpeg)
+        if on_thumb:
+            on_thumb(name, bucket, path)
+        return path
+
+    def _from_archive(self, camera, missing: List[int], on_thumb) -> Dict[int, str]:
+        """One keyframe-only pass over the archived range; returns bucket -> path."""
+        from archive_index import archive_source, release_source
+
+        first = missing[0]
+        span = missing[-1] + self.interval - first
+        playlist = archive_source(self.archive_dir, camera.name, first, span)
+        if not playlist:
+            return {}
+        found = {}
+        wanted = set(missing)
+        reader = KeyframeReader(playlist, self.size[0], self.size[1], drop=False, buffer=4)
+        try:
+            while wanted:
+                ok, frame = reader.read(timeout=10.0)
+                if not ok:
+                    break
+                bucket = first + int((reader.pts // self.interval) * self.interval)
+                if bucket in wanted:
+                    wanted.discard(bucket)
+                    path = self._store(camera.name, bucket, frame, on_thumb)
+                    if path:
+                        found[bucket] = path
+        finally:
+            reader.release()
+            release_source(playlist)
+        return found
+
+    def _from_dvr(self, camera, buckets: List[int], start_dt: datetime, start_ts: float, on_thumb) -> Dict[int, str]:
+        """Open the playback URL at each bucket and decode its leading keyframe."""
+        found = {}
+        source = PlaybackSource(camera, start_dt, timedelta(seconds=buckets[-1] + self.interval - start_ts))
+        lease = None
+        try:
+            for bucket in buckets:
+                # Hand the session back when a viewer is waiting for it
+                if lease is not None and lease.yield_requested:
+                    lease.release()
+                    lease = None
+                url, base = source(bucket - start_ts)
+                if lease is None:
+                    lease = sessions.acquire(url, PROBE, timeout=SESSION_WAIT)
+                    if lease is None:
+                        print(f"No free session for {camera.name}; timeline left incomplete")
+                        break
+                cap = open_at(url, base, bucket - start_ts)
+                ok, frame = cap.read() if cap.isOpened() else (False, None)
+                cap.release()
+                if ok and frame is not None:
+                    path = self._store(camera.name, bucket, frame, on_thumb)
+                    if path:
+                        found[bucket] = path
+        finally:
+            if lease is not None:
+                lease.release()
+        return found
+
+    def _build_camera(self, camera, buckets: List[int], start_dt: datetime, start_ts: float,
+                      on_thumb) -> List[Tuple[int, Optional[str]]]:
+        paths = {b: self.cache.get(camera.name, b, self.size) for b in buckets}
+        missing = [b for b in buckets if paths[b] is None]
+        if missing and self.archive_dir and keyframes_available():
+            paths.update(self._from_archive(camera, missing, on_thumb))
+            missing = [b for b in missing if paths[b] is None]
+        if missing:
+            paths.update(self._from_dvr(camera, missing, start_dt, start_ts, on_thumb))
+        return [(b, paths[b]) for b in buckets]
+
+    def build(self, cameras, start: datetime, end: datetime,
+              on_thumb: Optional[Callable[[str, int, str], None]] = None) -> Dict[str, List[Tuple[int, Optional[str]]]]:
+        """Thumbnails for every camera over [start, end).
+
+        Returns {camera name: [(bucket epoch seconds, jpeg path or None), ...]}.
+        ``on_thumb(name, bucket, path)`` is called as each new thumbnail is
+        written, so a UI can fill the strip progressively.
+        """
+        cameras = list(cameras)
+        start_ts = start.timestamp()
+        buckets = self.buckets(start_ts, end.timestamp())
+        if not cameras or not buckets:
+            return {}
+        # Bucket times are aligned, so playback URLs start from the aligned start
+        aligned = start - timedelta(seconds=start_ts - buckets[0])
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(cameras))) as pool:
+            futures = {c.name: pool.submit(self._build_camera, c, buckets, aligned, buckets[0], on_thumb)
+                       for c in cameras}
+            return {name: f.result() for name, f in futures.items()}
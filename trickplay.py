@@ -0,0 +1,294 @@
+"""Fast-forward and scrubbing for recorded playback of one camera.
+
+Up to 2x, playback runs through a ``ClockedCapture`` and decodes every
+frame. Above 2x it samples instead. Every ``sample_interval`` wall seconds
+the brand playback URL is reopened with ``starttime`` at the clock's
+position, and one frame is read. A stream starts on a keyframe, so each
+sample decodes a single I-frame. Samples are at least the brand's
+``keyframe_interval`` of footage apart, since a closer one would land on the
+same I-frame again. An hour at 60x becomes about 120 short
+requests rather than 90,000 decoded frames. The DVR serves playback at 1x,
+so reopening is also the only way to go faster than real time over RTSP.
+
+Opening an RTSP session costs a round trip or two. While one sample is
+shown, the next one (and, at normal speed, the next scrub step) is already
+being opened in the background on a spare session, when the DVR's session
+budget has one.
+
+Keys: 1/2/4/8 and 0 (60x) set the speed, space pauses, ',' and '.' jump
+back and forward by ``SCRUB_STEP`` seconds.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Tuple
+
+from brands.factory import brand_for
+from lazy_imports import lazy_module
+from playback_clock import KEYFRAME_SPEED, ClockedCapture, PlaybackClock
+from sessions import PLAYBACK, sessions
+
+cv2 = lazy_module('cv2')
+
+SCRUB_STEP = 30.0
+SAMPLE_INTERVAL = 0.5
+SCAN_SPEED = 60.0
+
+
+class PlaybackSource:
+    """``source_at`` for one camera: its recording reopened at a new starttime.
+
+    Local archive footage is used when ``archive_dir`` covers the position,
+    otherwise the brand playback URL for the rest of ``duration``.
+    """
+
+    def __init__(self, camera, start_time: datetime, duration: timedelta, archive_dir: Optional[str] = None):
+        self.camera = camera
+        self.start_time = start_time
+        self.duration = duration
+        self.archive_dir = archive_dir
+
+    @property
+    def keyframe_interval(self) -> float:
+        return brand_for(self.camera).capabilities.keyframe_interval
+
+    def __call__(self, position: float) -> Tuple[str, float]:
+        start = self.start_time + timedelta(seconds=position)
+        remaining = max(self.duration - timedelta(seconds=position), timedelta(seconds=SCRUB_STEP))
+        if self.archive_dir:
+            from archive_index import archive_source
+
+            local = archive_source(self.archive_dir, self.camera.name, start.timestamp(), remaining.total_seconds())
+            if local:
+                return local, position
+        return brand_for(self.camera).build_playback_url(self.camera, start, remaining), position
+
+
+def open_at(url: str, base: float, position: float):
+    """Open ``url`` (whose PTS 0 is media ``base``) and seek to ``position``."""
+    cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+    if cap.isOpened() and position - base > 0.5:
+        cap.set(cv2.CAP_PROP_POS_MSEC, (position - base) * 1000.0)
+    return cap
+
+
+class _Prefetch:
+    """A capture being opened in the background at a media position."""
+
+    def __init__(self, source_at: Callable[[float], Tuple[str, float]], position: float):
+        self.position = position
+        self.cap = None
+        self.lease = None
+        self._thread = threading.Thread(target=self._open, args=(source_at,), name=f"prefetch-{position:.0f}")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _open(self, source_at):
+        url, base = source_at(self.position)
+        # Only use a spare session; never wait for (or evict) another viewer
+        self.lease = sessions.acquire(url, PLAYBACK, timeout=0)
+        if self.lease is None:
+            return
+        cap = open_at(url, base, self.position)
+        if cap.isOpened():
+            self.cap = cap
+        else:
+            cap.release()
+            self.lease.release()
+            self.lease = None
+
+    def take(self, timeout: float = 5.0):
+        """(cap, lease) once opened, or (None, None)."""
+        self._thread.join(timeout)
+        if self._thread.is_alive() or self.cap is None:
+            self.discard()
+            return None, None
+        cap, lease = self.cap, self.lease
+        self.cap = self.lease = None
+        return cap, lease
+
+    def discard(self, wait: bool = False):
+        """Close the capture once opened; in the background unless ``wait``."""
+        def drop():
+            self._thread.join()
+            if self.cap is not None:
+                self.cap.release()
+            if self.lease is not None:
+                self.lease.release()
+        if wait:
+            drop()
+        else:
+            threading.Thread(target=drop, daemon=True).start()
+
+
+class TrickPlayer:
+    """Variable-speed playback of one camera with keyframe sampling above 2x.
+
+    ``cap`` and ``lease`` are the already opened capture at position 0 and
+    its session lease (as returned by ``sessions.open_capture``). The player
+    takes ownership of both. Without them a session is admitted on the
+    first read. ``keyframe_interval`` defaults to the source's
+    (see ``PlaybackSource``).
+    """
+
+    def __init__(self, name: str, source_at: Callable[[float], Tuple[str, float]], cap=None, lease=None,
+                 clock: Optional[PlaybackClock] = None, sample_interval: float = SAMPLE_INTERVAL,
+                 keyframe_interval: Optional[float] = None):
+        self.name = name
+        self.source_at = source_at
+        self.clock = clock or PlaybackClock()
+        self.sample_interval = sample_interval
+        if keyframe_interval is None:
+            keyframe_interval = getattr(source_at, 'keyframe_interval', 0.0)
+        self.keyframe_interval = keyframe_interval
+        self.position = 0.0
+        self.samples = 0
+        self._lease = lease
+        self._clocked: Optional[ClockedCapture] = None
+        self._prefetch: Optional[_Prefetch] = None
+        self._last_sample = 0.0
+        if cap is not None:
+            self._clocked = self._clocked_capture(cap, 0.0)
+        self.clock.start()
+
+    def _clocked_capture(self, cap, position: float) -> ClockedCapture:
+        url, _ = self.source_at(position)
+        return ClockedCapture(self.name, url, self.clock, cap=cap, source_at=self.source_at, position=position)
+
+    def _prefetch_at(self, position: float):
+        if self._prefetch is not None:
+            if abs(self._prefetch.position - position) < 1.0:
+                return
+            self._prefetch.discard()
+        self._prefetch = _Prefetch(self.source_at, position)
+
+    def _take_prefetch(self, position: float, tolerance: float):
+        """Prefetched capture if it was opened near ``position``."""
+        prefetch, self._prefetch = self._prefetch, None
+        if prefetch is None:
+            return None, None, position
+        if abs(prefetch.position - position) > tolerance:
+            prefetch.discard()
+            return None, None, position
+        cap, lease = prefetch.take()
+        return cap, lease, prefetch.position
+
+    def _admitted(self, position: float) -> bool:
+        """Hold the lease that the player's own opens run under; False while the DVR has none free."""
+        if self._lease is None:
+            url, _ = self.source_at(position)
+            self._lease = sessions.acquire(url, PLAYBACK, timeout=0)
+        return self._lease is not None
+
+    # -- playback ----------------------------------------------------------
+
+    def read(self):
+        """(ok, frame); frame is None while the current one should stay on screen."""
+        if self.clock.speed > KEYFRAME_SPEED:
+            return self._sample()
+        if self._clocked is None:
+            if not self._admitted(self.clock.now()):
+                return True, None
+            self._clocked = self._clocked_capture(None, self.clock.now())
+        ok, frame = self._clocked.read()
+        if frame is not None:
+            self.position = self._clocked.position
+        return ok, frame
+
+    def _sample(self):
+        if self._clocked is not None:
+            # The sampler reuses this session for its reopens
+            self._clocked.release()
+            self._clocked = None
+        now = time.monotonic()
+        # Never closer than one GOP of footage: the sample would decode the same I-frame
+        interval = max(self.sample_interval, self.keyframe_interval / self.clock.speed)
+        if self.clock.paused or now - self._last_sample < interval:
+            return True, None
+        self._last_sample = now
+        target = self.clock.now()
+        step = self.clock.speed * interval
+        cap, lease, position = self._take_prefetch(target, step)
+        if cap is None:
+            if not self._admitted(target):
+                return True, None
+            url, base = self.source_at(target)
+            cap = open_at(url, base, target)
+        ok, frame = cap.read() if cap.isOpened() else (False, None)
+        cap.release()
+        if lease is not None:
+            lease.release()
+        self._prefetch_at(target + step)
+        if not ok or frame is None:
+            # Gap in the recording: keep the last sample and move on
+            return True, None
+        self.position = position
+        self.samples += 1
+        return True, frame
+
+    def seek(self, position: float):
+        position = max(0.0, position)
+        self.clock.seek(position)
+        self.position = position
+        if self.clock.speed > KEYFRAME_SPEED:
+            self._last_sample = 0.0
+            return
+        cap, lease, position = self._take_prefetch(position, 1.0)
+        if self._clocked is not None:
+            self._clocked.release()
+            self._clocked = None
+        if cap is not None:
+            # Hand the session over to the prefetched capture
+            if self._lease is not None:
+                self._lease.release()
+            self._lease = lease
+            self._clocked = self._clocked_capture(cap, position)
+        elif self._admitted(position):
+            self._clocked = self._clocked_capture(None, position)
+        self._prefetch_at(position + SCRUB_STEP)
+
+    def handle_key(self, key: int) -> bool:
+        if key == ord('.'):
+            self.seek(self.clock.now() + SCRUB_STEP)
+            return True
+        if key == ord(','):
+            self.seek(self.clock.now() - SCRUB_STEP)
+            return True
+        if key == ord('0'):
+            self.clock.set_speed(SCAN_SPEED)
+            return True
+        return self.clock.handle_key(key)
+
+    def release(self):
+        if self._clocked is not None:
+            self._clocked.release()
+            self._clocked = None
+        if self._prefetch is not None:
+            self._prefetch.discard(wait=True)
+            self._prefetch = None
+        if self._lease is not None:
+            self._lease.release()
+            self._lease = None
+
+
+def play_window(player: TrickPlayer, window: str, title: Optional[str] = None, sink=None):
+    """Show a ``TrickPlayer`` in ``window`` (or ``sink``) until 'q' or the end of the recording."""
+    from sinks import HighGuiSink
+
+    sink = sink or HighGuiSink(autosize=True)
+    sink.open(window)
+    print(f"{title or window}: 1/2/4/8/0 speed, space pause, ',' '.' jump {SCRUB_STEP:.0f}s, 'q' quit")
+    try:
+        while True:
+            ok, frame = player.read()
+            if not ok:
+                print("Playback ended.")
+                break
+            key = sink.show(frame)
+            if key == ord('q'):
+                break
+            player.handle_key(key)
+    except KeyboardInterrupt:
+        pass
+    player.release()
+    sink.close()
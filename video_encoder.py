@@ -0,0 +1,212 @@
+"""Encode a player's composited grid as one video stream.
+
+A video wall showing 16 cameras would otherwise open 16 RTSP sessions and
+run 16 decoders. ``EncoderSink`` takes the mosaic the grid player already
+composites and publishes it as one encoded stream:
+
+* a file (``wall.mp4``, ``wall.mkv``, ``wall.ts``)
+* a local HLS stand-in (``wall/index.m3u8``, rolling segments)
+* an RTSP/RTMP/UDP/SRT push target (e.g. an ``rtsp://`` URL served by an
+  RTSP server)
+
+Encoding runs in its own thread at a fixed target ``fps``. The player's
+``show()`` only copies a frame when the encoder is due for one, so a grid
+running at 200 fps does not pay for 200 copies a second. When the encoder
+falls behind, the ticks it missed are skipped rather than queued, so
+latency does not build up. With FFmpeg the input is stamped with wall-clock
+time, so skipped ticks do not speed up the output's timeline.
+
+FFmpeg (``libx264``, ``bitrate``) is used when available. Without it, file
+targets fall back to ``cv2.VideoWriter``, which has no bitrate control.
+"""
+import os
+import subprocess
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from lazy_imports import lazy_module
+from recorder import find_ffmpeg
+from sinks import Sink
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+DEFAULT_FPS = 15.0
+DEFAULT_BITRATE = '4M'
+HLS_SEGMENT_SECONDS = 2
+HLS_LIST_SIZE = 6
+# Network targets -> FFmpeg muxer
+PUSH_FORMATS = {'rtsp': 'rtsp', 'rtmp': 'flv', 'udp': 'mpegts', 'srt': 'mpegts', 'tcp': 'mpegts'}
+
+
+class EncoderSink(Sink):
+    """Sink that encodes frames to ``target`` at ``fps`` and ``bitrate``.
+
+    ``size`` (width, height) scales the output, e.g. a 2560x1440 4x4 grid
+    down to 1920x1080 for the wall. ``frames`` and ``skipped`` count
+    encoded frames and missed ticks.
+    """
+
+    def __init__(self, target: str, fps: float = DEFAULT_FPS, bitrate: str = DEFAULT_BITRATE,
+                 size: Optional[Tuple[int, int]] = None, codec: str = 'libx264', preset: str = 'veryfast',
+                 gop: Optional[int] = None, ffmpeg: Optional[str] = None):
+        self.target = target
+        self.fps = fps
+        self.bitrate = bitrate
+        self.size = size
+        self.codec = codec
+        self.preset = preset
+        self.gop = gop or max(1, int(round(fps * 2)))
+        self.ffmpeg = ffmpeg
+        self.frames = 0
+        self.skipped = 0
+        self.failed = False
+        self._interval = 1.0 / fps
+        self._due = 0.0
+        self._front = None
+        self._back = None
+        self._pending = False
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._proc: Optional[subprocess.Popen] = None
+        self._writer = None
+
+    # -- output --------------------------------------------------------------
+
+    def _output_args(self) -> List[str]:
+        scheme = self.target.split('://', 1)[0] if '://' in self.target else None
+        if scheme in PUSH_FORMATS:
+            args = ['-f', PUSH_FORMATS[scheme]]
+            if scheme == 'rtsp':
+                args += ['-rtsp_transport', 'tcp']
+            return args + [self.target]
+        if self.target.endswith('.m3u8'):
+            return ['-f', 'hls', '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_list_size', str(HLS_LIST_SIZE),
+                    '-hls_flags', 'delete_segments+omit_endlist', self.target]
+        if self.target.endswith('.mp4'):
+            # Fragmented so the file stays playable if the process is killed
+            return ['-movflags', '+frag_keyframe+empty_moov+default_base_moof', self.target]
+        return [self.target]
+
+    def command(self, binary: str, width: int, height: int) -> List[str]:
+        cmd = [binary, '-hide_banner', '-loglevel', 'error', '-y',
+               '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f"{width}x{height}", '-framerate', f"{self.fps:g}",
+               '-use_wallclock_as_timestamps', '1', '-i', 'pipe:0', '-an']
+        if self.size:
+            cmd += ['-vf', f"scale={self.size[0]}:{self.size[1]}"]
+        cmd += ['-c:v', self.codec, '-preset', self.preset, '-pix_fmt', 'yuv420p',
+                '-b:v', self.bitrate, '-maxrate', self.bitrate, '-bufsize', self.bitrate,
+                '-g', str(self.gop), '-r', f"{self.fps:g}", '-vsync', 'cfr']
+        if self.codec == 'libx264':
+            cmd += ['-tune', 'zerolatency']
+        return cmd + self._output_args()
+
+    def _open_output(self, width: int, height: int):
+        if '://' not in self.target:
+            directory = os.path.dirname(os.path.abspath(self.target))
+            os.makedirs(directory, exist_ok=True)
+        binary = find_ffmpeg(self.ffmpeg)
+        if binary is not None:
+            self._proc = subprocess.Popen(self.command(binary, width, height), stdin=subprocess.PIPE,
+                                          stderr=subprocess.PIPE)
+            return
+        if '://' in self.target or self.target.endswith('.m3u8'):
+            raise RuntimeError("ffmpeg not found on PATH (set FFMPEG_BINARY to override); "
+                               "streaming targets need it")
+        print(f"ffmpeg not found; encoding {self.target} with OpenCV (no bitrate control)")
+        w, h = self.size or (width, height)
+        fourcc = 'MJPG' if self.target.endswith('.avi') else 'mp4v'
+        self._writer = cv2.VideoWriter(self.target, cv2.VideoWriter_fourcc(*fourcc), self.fps, (w, h))
+        if not self._writer.isOpened():
+            raise RuntimeError(f"Cannot open {self.target} for writing")
+
+    def _write(self, frame) -> bool:
+        if self._proc is not None:
+            try:
+                self._proc.stdin.write(memoryview(frame).cast('B'))
+                return True
+            except (BrokenPipeError, ValueError):
+                err = self._proc.stderr.read().decode('utf-8', 'replace').strip()
+                print(f"Encoder for {self.target} stopped: {err or 'ffmpeg exited'}")
+                return False
+        if self.size and (frame.shape[1], frame.shape[0]) != tuple(self.size):
+            frame = cv2.resize(frame, tuple(self.size), interpolation=cv2.INTER_AREA)
+        self._writer.write(frame)
+        return True
+
+    # -- encoder thread ------------------------------------------------------
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            with self._cond:
+                self._due = next_tick
+                # Take the newest frame if one arrived; otherwise repeat the last one
+                self._cond.wait_for(lambda: self._pending or not self._running,
+                                    timeout=max(0.0, next_tick + self._interval - time.monotonic()))
+                if not self._running:
+                    break
+                if self._pending:
+                    self._front, self._back = self._back, self._front
+                    self._pending = False
+            if self._front is not None:
+                if not self._write(self._front):
+                    self.failed = True
+                    break
+                self.frames += 1
+            next_tick += self._interval
+            now = time.monotonic()
+            if now > next_tick + self._interval:
+                # Behind: skip the missed ticks instead of queueing them
+                missed = int((now - next_tick) / self._interval)
+                self.skipped += missed
+                next_tick += missed * self._interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    # -- sink ----------------------------------------------------------------
+
+    def open(self, title: str):
+        print(f"{title}: encoding to {self.target} at {self.fps:g} fps, {self.bitrate}")
+
+    def show(self, frame, wait: int = 1) -> int:
+        if frame is not None and not self.failed and time.monotonic() >= self._due:
+            if self._thread is None:
+                h, w = frame.shape[:2]
+                self._open_output(w, h)
+                self._front = np.empty_like(frame)
+                self._back = np.empty_like(frame)
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name='grid-encoder')
+                self._thread.daemon = True
+                self._thread.start()
+            with self._cond:
+                np.copyto(self._back, frame)
+                self._pending = True
+                # Until the encoder picks this one up, later frames would be wasted copies
+                self._due = float('inf')
+                self._cond.notify_all()
+        return super().show(frame, wait)
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=10)
+            except (BrokenPipeError, subprocess.TimeoutExpired):
+                self._proc.kill()
+                self._proc.wait()
+            self._proc = None
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+        print(f"Encoded {self.frames} frames to {self.target} ({self.skipped} skipped)")